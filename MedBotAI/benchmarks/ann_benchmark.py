@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ANN Index Benchmark
+- Compares flat, HNSW and IVF indexes from vector_index.create_index
+- Compares vector encodings (float32, float16, int8, PQ, PCA) with and
+  without exact rescoring
+- Reports recall@k against the exact flat baseline, p50/p99 search latency
+  and memory per million vectors
+- Runs at several corpus sizes, on synthetic clustered vectors or a saved .npy matrix
+
+Usage:
+    python benchmarks/ann_benchmark.py --sizes 1000 10000 50000 --k 5
+    python benchmarks/ann_benchmark.py --sizes 20000 --encodings float32 int8 pq --rescore-factor 4
+    python benchmarks/ann_benchmark.py --vectors embeddings.npy --json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import ENCODINGS, INDEX_TYPES, create_index, index_memory, set_search_params  # noqa: E402
+
+def synthetic_vectors(num_vectors, dim, seed=0, num_clusters=64):
+    """Clustered unit vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim)).astype("float32")
+    labels = rng.integers(0, num_clusters, size=num_vectors)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(num_vectors, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def recall_at_k(found, expected):
+    """Fraction of the exact top-k neighbours that the index returned"""
+    hits = sum(len(set(f) & set(e)) for f, e in zip(found, expected))
+    return hits / expected.size
+
+def time_queries(index, queries, k):
+    """Search one query at a time, as the request handlers do
+
+    Returns:
+        (neighbour ids, per-query latencies in milliseconds)
+    """
+    ids = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = found[0]
+    return ids, np.array(latencies)
+
+def mb_per_million(num_bytes, num_vectors):
+    return round(num_bytes / num_vectors * 1e6 / 2 ** 20, 1)
+
+def run(corpus, queries, k, kinds, encodings, rescore_factors, ef_search, nprobe):
+    """Benchmark every index kind and encoding on one corpus"""
+    results = []
+    baseline_ids, _ = time_queries(create_index(corpus, kind="flat", encoding="float32"), queries, k)
+    for kind in kinds:
+        for encoding in encodings:
+            # Rescoring makes no difference to full-precision vectors
+            for rescore_factor in (rescore_factors if encoding != "float32" else [0]):
+                start = time.perf_counter()
+                index = create_index(corpus, kind=kind, encoding=encoding, rescore_factor=rescore_factor)
+                build_seconds = time.perf_counter() - start
+                set_search_params(index, ef_search=ef_search, nprobe=nprobe)
+
+                ids, latencies = time_queries(index, queries, k)
+                memory = index_memory(index)
+                results.append({
+                    "index": kind,
+                    "encoding": encoding,
+                    "rescore_factor": rescore_factor,
+                    # Small corpora fall back from IVF to a flat index and
+                    # from PQ/PCA to full precision
+                    "faiss_type": type(faiss.downcast_index(index)).__name__,
+                    "corpus_size": len(corpus),
+                    "build_s": round(build_seconds, 3),
+                    "recall_at_k": round(recall_at_k(ids, baseline_ids), 4),
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+                    "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+                    "search_mb_per_1m": mb_per_million(memory["search_bytes"], len(corpus)),
+                    "rescore_mb_per_1m": mb_per_million(memory["rescore_bytes"], len(corpus)),
+                })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+                        help="Corpus sizes to benchmark")
+    parser.add_argument("--dim", type=int, default=1536, help="Vector dimension for synthetic data")
+    parser.add_argument("--vectors", help="Optional .npy matrix of real embeddings to sample from")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries per run")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query")
+    parser.add_argument("--ef-search", type=int, default=None, help="Override HNSW efSearch")
+    parser.add_argument("--nprobe", type=int, default=None, help="Override IVF nprobe")
+    parser.add_argument("--kinds", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES,
+                        help="Index types to benchmark")
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS), choices=ENCODINGS,
+                        help="Vector encodings to benchmark")
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[0, 4],
+                        help="Shortlist multipliers for exact rescoring (0 = none)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.vectors:
+        pool = np.load(args.vectors).astype("float32")
+    else:
+        pool = synthetic_vectors(max(args.sizes) + args.queries, args.dim)
+
+    all_results = []
+    print(f"{'index':<6} {'encoding':<8} {'rescore':>7} {'faiss type':<24} {'size':>8} {'build s':>9} "
+          f"{'recall@' + str(args.k):>9} {'p50 ms':>9} {'p99 ms':>9} {'MB/1M':>9} {'+rescore':>9}")
+    for size in args.sizes:
+        if size + args.queries > len(pool):
+            print(f"Skipping size {size}: only {len(pool)} vectors available")
+            continue
+        corpus = pool[:size]
+        queries = pool[-args.queries:]
+        for row in run(corpus, queries, args.k, args.kinds, args.encodings, args.rescore_factor,
+                       args.ef_search, args.nprobe):
+            all_results.append(row)
+            print(f"{row['index']:<6} {row['encoding']:<8} {row['rescore_factor']:>7} {row['faiss_type']:<24} "
+                  f"{row['corpus_size']:>8} {row['build_s']:>9} {row['recall_at_k']:>9} {row['p50_ms']:>9} "
+                  f"{row['p99_ms']:>9} {row['search_mb_per_1m']:>9} {row['rescore_mb_per_1m']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"k": args.k, "results": all_results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Chunking Benchmark
+- Compares the single-pass chunker in chunking.py with the old per-word
+  tokenizer loop on the course material PDFs
+- Reports time per run, chunks produced and tokens per chunk
+
+Usage:
+    python benchmarks/chunking_benchmark.py --repeat 5
+    python benchmarks/chunking_benchmark.py --max-tokens 500 --overlap 50 --json results.json
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+
+import numpy as np
+import tiktoken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import SNAP_MODES, chunk_text  # noqa: E402
+from embeddings import get_encoding  # noqa: E402
+from extraction import extract_pages  # noqa: E402
+
+DEFAULT_PDFS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "coursematerial", "*.pdf")
+
+def legacy_chunk_text(text, max_tokens=300):
+    """The chunker this benchmark replaces: one tokenizer call per word"""
+    encoding = tiktoken.get_encoding("cl100k_base")
+    words = text.split()
+    chunks = []
+    chunk = []
+    token_count = 0
+
+    for word in words:
+        word_tokens = len(encoding.encode(word))
+        if token_count + word_tokens > max_tokens:
+            chunks.append(" ".join(chunk))
+            chunk = []
+            token_count = 0
+        chunk.append(word)
+        token_count += word_tokens
+
+    if chunk:
+        chunks.append(" ".join(chunk))
+
+    return chunks
+
+def time_chunker(name, chunk_fn, texts, repeat):
+    """Chunk every text ``repeat`` times and summarise the last run"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = [chunk for text in texts for chunk in chunk_fn(text)]
+        timings.append((time.perf_counter() - start) * 1000)
+
+    encoding = get_encoding()
+    lengths = np.array([len(encoding.encode_ordinary(chunk)) for chunk in chunks])
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "best_ms": round(min(timings), 2),
+        "median_ms": round(float(np.median(timings)), 2),
+        "mean_tokens": round(float(lengths.mean()), 1) if len(lengths) else 0.0,
+        "max_tokens": int(lengths.max()) if len(lengths) else 0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document chunkers")
+    parser.add_argument("--pdfs", default=DEFAULT_PDFS, help="Glob of PDFs to chunk")
+    parser.add_argument("--max-tokens", type=int, default=300, help="Chunk size in tokens")
+    parser.add_argument("--overlap", type=int, default=0, help="Overlap for the new chunker")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per chunker")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.pdfs))
+    texts = ["\n".join(extract_pages(path)) for path in paths]
+    total_chars = sum(len(text) for text in texts)
+    print(f"{len(paths)} documents, {total_chars} characters, "
+          f"{sum(len(get_encoding().encode_ordinary(text)) for text in texts)} tokens")
+
+    chunkers = [("legacy", lambda text: legacy_chunk_text(text, args.max_tokens))]
+    for snap in SNAP_MODES:
+        chunkers.append((f"single-pass/{snap}",
+                         lambda text, snap=snap: chunk_text(text, args.max_tokens, args.overlap, snap)))
+
+    results = []
+    print(f"{'chunker':<22} {'chunks':>7} {'best ms':>9} {'median ms':>10} {'mean tok':>9} {'max tok':>8}")
+    for name, chunk_fn in chunkers:
+        row = time_chunker(name, chunk_fn, texts, args.repeat)
+        results.append(row)
+        print(f"{row['chunker']:<22} {row['chunks']:>7} {row['best_ms']:>9} {row['median_ms']:>10} "
+              f"{row['mean_tokens']:>9} {row['max_tokens']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"documents": len(paths), "characters": total_chars,
+                       "max_tokens": args.max_tokens, "overlap": args.overlap,
+                       "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Retrieval Benchmark
+- Runs the real ingestion and retrieval code (RAGPipeline,
+  flashcard.search_relevant_chunks, exam.retrieve_practice_exam) with a
+  deterministic hashed n-gram embedder in place of the OpenAI API, so it
+  makes no API calls and gives the same numbers on every run
+- Synthetic corpora of configurable size, laid out as
+  <university>/<course>/<file>, with generated fact queries
+- A labelled query set over the course PDFs (retrieval_queries.json)
+- Reports ingest throughput, p50/p99 search latency, peak memory and
+  recall@k per retrieval mode, and writes JSON that --compare can diff
+  against a run from another commit
+- --provider benchmarks a real embedding provider instead, such as the
+  local sentence-transformers backend
+
+Every cache and index lives in a temporary directory, so ingestion is
+measured cold and the real caches are never touched. Peak RSS is the
+process high-water mark, so run sizes in ascending order.
+
+Chunking and context packing need tiktoken's cl100k_base encoding, which
+tiktoken downloads on first use and caches. To run without network, copy
+a cache populated on another machine and point TIKTOKEN_CACHE_DIR at it;
+the benchmark stops with an error if the encoding cannot be loaded, or if
+ingestion indexes nothing.
+
+Usage:
+    python benchmarks/retrieval_benchmark.py --sizes 100 1000 --k 5
+    python benchmarks/retrieval_benchmark.py --no-pdfs --sizes 5000 --json after.json --compare before.json
+    python benchmarks/retrieval_benchmark.py --provider local:all-MiniLM-L6-v2
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import random
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, APP_DIR)
+
+# Keep every cache out of the real cache directory; set before the app modules read them
+WORK_DIR = tempfile.mkdtemp(prefix="medbot-retrieval-benchmark-")
+os.environ["MEDBOT_EMBEDDING_CACHE"] = os.path.join(WORK_DIR, "embeddings.sqlite3")
+os.environ["MEDBOT_PAGE_CACHE"] = os.path.join(WORK_DIR, "pages.sqlite3")
+# Nothing here calls OpenAI, but the blueprints refuse to import without a key
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+# exam.py creates an uploads folder in the working directory
+ORIGINAL_CWD = os.getcwd()
+os.chdir(WORK_DIR)
+
+import corpus  # noqa: E402
+import embeddings  # noqa: E402
+import exam  # noqa: E402
+import flashcard  # noqa: E402
+from query_cache import get_query_cache  # noqa: E402
+from rag import RAGPipeline  # noqa: E402
+from retrieval import RETRIEVAL_MODES, tokenize  # noqa: E402
+
+DEFAULT_QUERIES = os.path.join(BENCHMARK_DIR, "retrieval_queries.json")
+COURSE_MATERIAL = os.path.join(APP_DIR, "coursematerial")
+
+class HashedNgramEmbedder:
+    """Deterministic stand-in for the embedding API
+
+    Each word and its character n-grams are hashed into a signed bucket;
+    texts sharing words or word pieces get similar unit vectors.
+    """
+
+    def __init__(self, dim=embeddings.EMBEDDING_DIM, n=3):
+        self.dim = dim
+        self.n = n
+        self.calls = 0
+        self._features = {}
+
+    def _word_features(self, word):
+        features = self._features.get(word)
+        if features is None:
+            padded = f"<{word}>"
+            grams = [word] + [padded[i:i + self.n] for i in range(max(1, len(padded) - self.n + 1))]
+            hashes = np.array([zlib.crc32(gram.encode("utf-8")) for gram in grams], dtype="int64")
+            features = (hashes % self.dim, np.where(hashes & (1 << 31), -1.0, 1.0).astype("float32"))
+            self._features[word] = features
+        return features
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype="float32")
+        for word in tokenize(text):
+            buckets, signs = self._word_features(word)
+            np.add.at(vector, buckets, signs)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def request(self, inputs, model, num_tokens=0, dimensions=None):
+        """Drop-in replacement for embeddings._request_embeddings"""
+        self.calls += 1
+        vectors = np.vstack([self.embed(text) for text in inputs])
+        if dimensions:
+            # Shortened like the text-embedding-3 models: truncate and renormalise
+            vectors = vectors[:, :dimensions]
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms, norms, 1)
+        return vectors
+
+# ------------------------------------------------------------------------------
+# Corpora and query sets
+# ------------------------------------------------------------------------------
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "xe", "zu", "bra", "cor", "dil", "fen", "gar", "hul"]
+
+def pseudo_word(rng, syllables=3):
+    return "".join(rng.choice(SYLLABLES) for _ in range(syllables))
+
+def write_synthetic_corpus(directory, exams_directory, num_docs, words_per_doc=800,
+                           num_courses=10, facts_per_doc=2, seed=0):
+    """Write num_docs text files spread over num_courses courses
+
+    Each document mixes course-specific and shared filler vocabulary with
+    a few unique facts ("The <property> of <entity> is <value>."); every
+    fact becomes a labelled query. Each course also gets one past exam.
+
+    Returns:
+        (fact queries, exam queries)
+    """
+    rng = random.Random(seed)
+    shared = [pseudo_word(rng) for _ in range(500)]
+    courses = []
+    for number in range(num_courses):
+        university = f"University {number % 3}"
+        course = f"SYN {101 + number}"
+        vocabulary = [pseudo_word(rng, 4) for _ in range(200)]
+        courses.append((university, course, vocabulary))
+        os.makedirs(os.path.join(directory, university, course), exist_ok=True)
+
+    fact_queries = []
+    for doc_number in range(num_docs):
+        university, course, vocabulary = courses[doc_number % num_courses]
+        sentences = []
+        for _ in range(words_per_doc // 10):
+            words = [rng.choice(vocabulary if rng.random() < 0.4 else shared) for _ in range(10)]
+            sentences.append(" ".join(words).capitalize() + ".")
+        for _ in range(facts_per_doc):
+            prop, entity, value = pseudo_word(rng, 4), pseudo_word(rng, 4), pseudo_word(rng, 5)
+            sentences.insert(rng.randrange(len(sentences) + 1), f"The {prop} of {entity} is {value}.")
+            fact_queries.append({"query": f"What is the {prop} of {entity}?", "answer": value,
+                                 "university": university, "course": course})
+        with open(os.path.join(directory, university, course, f"notes_{doc_number:06d}.txt"), "w") as f:
+            f.write("\n".join(sentences))
+
+    exam_queries = []
+    os.makedirs(exams_directory, exist_ok=True)
+    for university, course, vocabulary in courses:
+        marker = f"Exam reference {course}."
+        questions = [f"Question {i + 1}: Explain {' '.join(rng.sample(vocabulary, 6))}." for i in range(20)]
+        with open(os.path.join(exams_directory, f"{course.replace(' ', '_')}_midterm.txt"), "w") as f:
+            f.write(marker + "\n" + "\n".join(questions))
+        exam_queries.append({"query": course, "course": course, "answer": marker})
+    return fact_queries, exam_queries
+
+def load_labelled_queries(path):
+    """Read the labelled course PDF queries"""
+    with open(path) as f:
+        data = json.load(f)
+    for query in data["queries"]:
+        query.setdefault("university", data["university"])
+        query.setdefault("course", data["course"])
+    return data["queries"]
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+# ------------------------------------------------------------------------------
+# Measurement
+# ------------------------------------------------------------------------------
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+def percentiles(latencies):
+    return {"p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3)}
+
+def time_queries(queries, search_fn, is_hit, warm):
+    """Run every query once and score it
+
+    Args:
+        queries: Labelled queries
+        search_fn: Callable(query) returning the retrieved results
+        is_hit: Callable(query, results) -> bool
+        warm: Keep the query cache between queries; otherwise every
+            query pays for embedding and search
+    """
+    latencies, hits = [], 0
+    for query in queries:
+        if not warm:
+            get_query_cache().embeddings.clear()
+            get_query_cache().results.clear()
+        start = time.perf_counter()
+        results = search_fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += bool(is_hit(query, results))
+    row = percentiles(latencies)
+    row.update({"queries": len(queries), "recall": round(hits / len(queries), 4) if queries else None})
+    return row
+
+def run_corpus(name, course_dir, exams_dir, fact_queries, exam_queries, k, modes, warm):
+    """Ingest one corpus through the app's own entry points and query it"""
+    corpus_dir = os.path.join(WORK_DIR, name, "corpus")
+    corpus.COLLECTIONS["coursematerial"]["directory"] = course_dir
+    corpus.COLLECTIONS["exams"]["directory"] = exams_dir
+    corpus._corpus = corpus.Corpus(corpus_dir)
+    files = [os.path.join(root, f) for root, _, names in os.walk(course_dir) for f in names
+             if os.path.splitext(f)[1].lower() in corpus.SUPPORTED_EXTENSIONS]
+    size_mb = sum(os.path.getsize(path) for path in files) / 1e6
+
+    start = time.perf_counter()
+    pipeline = RAGPipeline()
+    flashcard.initialize_course_materials()
+    ingest_seconds = time.perf_counter() - start
+    shared = corpus.get_corpus()
+    exam_view = None
+    if exam_queries:
+        shared.ensure_synced("exams")
+        exam_view = corpus.CorpusView(shared, ["exams"], name="exam")
+
+    if files and not len(shared.store):
+        raise RuntimeError(f"{name}: ingestion indexed no chunks from {len(files)} files; "
+                           f"see the errors logged above")
+
+    row = {
+        "corpus": name,
+        "documents": len(files),
+        "chunks": len(shared.store),
+        "partitions": len(shared.partitions.partitions),
+        "ingest_seconds": round(ingest_seconds, 3),
+        "docs_per_second": round(len(files) / ingest_seconds, 1),
+        "chunks_per_second": round(len(shared.store) / ingest_seconds, 1),
+        "mb_per_second": round(size_mb / ingest_seconds, 3),
+        "ingest_peak_rss_mb": peak_rss_mb(),
+        "searches": []
+    }
+
+    def chunk_hit(query, chunks):
+        # Labelled PDF queries also name the file the answer must come from
+        return any(normalize(query["answer"]) in normalize(chunk["text"])
+                   and query.get("file") in (None, chunk["file_name"])
+                   for chunk in chunks)
+
+    for mode in modes:
+        searches = [
+            ("rag", fact_queries,
+             lambda q: pipeline.get_relevant_context(q["query"], top_k=k, mode=mode),
+             lambda q, context: normalize(q["answer"]) in normalize(context)),
+            ("flashcard", fact_queries,
+             lambda q: flashcard.search_relevant_chunks(q["query"], top_k=k, mode=mode,
+                                                        university=q["university"], course=q["course"]),
+             chunk_hit),
+        ]
+        if exam_view is not None:
+            searches.append(
+                ("exam", exam_queries,
+                 lambda q: exam.retrieve_practice_exam(q["query"], view=exam_view, mode=mode, course=q["course"]),
+                 lambda q, text: normalize(q["answer"]) in normalize(text)))
+        for endpoint, queries, search_fn, is_hit in searches:
+            result = time_queries(queries, search_fn, is_hit, warm)
+            result.update({"endpoint": endpoint, "mode": mode, "k": 1 if endpoint == "exam" else k})
+            row["searches"].append(result)
+
+    row["peak_rss_mb"] = peak_rss_mb()
+    return row
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_row(row):
+    print(f"\n{row['corpus']}: {row['documents']} documents, {row['chunks']} chunks, "
+          f"{row['partitions']} partitions")
+    print(f"  ingest {row['ingest_seconds']}s: {row['docs_per_second']} docs/s, "
+          f"{row['chunks_per_second']} chunks/s, {row['mb_per_second']} MB/s; "
+          f"peak RSS {row['peak_rss_mb']} MB")
+    print(f"  {'endpoint':<10} {'mode':<8} {'queries':>7} {'recall@k':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for search in row["searches"]:
+        print(f"  {search['endpoint']:<10} {search['mode']:<8} {search['queries']:>7} "
+              f"{search['recall']:>9} {search['p50_ms']:>9} {search['p99_ms']:>9}")
+
+def compare(results, baseline_path):
+    """Print the change of every metric against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(row["corpus"], s["endpoint"], s["mode"]): (row, s)
+              for row in baseline["runs"] for s in row["searches"]}
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"  {'corpus':<16} {'endpoint':<10} {'mode':<8} {'recall':>8} {'p50':>9} {'p99':>9} {'ingest':>9}")
+    for row in results["runs"]:
+        for search in row["searches"]:
+            match = before.get((row["corpus"], search["endpoint"], search["mode"]))
+            if match is None:
+                continue
+            old_row, old = match
+            print(f"  {row['corpus']:<16} {search['endpoint']:<10} {search['mode']:<8} "
+                  f"{search['recall'] - old['recall']:>+8.3f} "
+                  f"{search['p50_ms'] / old['p50_ms'] - 1:>+9.1%} "
+                  f"{search['p99_ms'] / old['p99_ms'] - 1:>+9.1%} "
+                  f"{row['ingest_seconds'] / old_row['ingest_seconds'] - 1:>+9.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion and retrieval offline")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[100, 1000],
+                        help="Synthetic corpus sizes, in documents")
+    parser.add_argument("--words-per-doc", type=int, default=800, help="Words per synthetic document")
+    parser.add_argument("--courses", type=int, default=10, help="Courses per synthetic corpus")
+    parser.add_argument("--queries", type=int, default=200, help="Synthetic fact queries per corpus")
+    parser.add_argument("--labelled", default=DEFAULT_QUERIES, help="Labelled queries over the course PDFs")
+    parser.add_argument("--no-pdfs", action="store_true", help="Skip the course PDF corpus")
+    parser.add_argument("--k", type=int, default=5, help="Chunks retrieved per query")
+    parser.add_argument("--modes", nargs="+", default=list(RETRIEVAL_MODES), choices=RETRIEVAL_MODES)
+    parser.add_argument("--warm", action="store_true", help="Keep the query cache between queries")
+    parser.add_argument("--provider", help="Embedding provider to use instead of the hashed stand-in")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    # Ingestion logs and skips every file it cannot chunk, which would
+    # report an empty corpus; fail up front instead
+    try:
+        embeddings.get_encoding()
+    except Exception as e:
+        sys.exit(f"Could not load the cl100k_base tokenizer ({e}). It is downloaded on first use; "
+                 f"run once with network access, or set TIKTOKEN_CACHE_DIR to a cache that holds it.")
+
+    if args.provider:
+        embedder_name = embeddings.get_provider(args.provider).name
+        for config in corpus.COLLECTIONS.values():
+            config["embedding"] = args.provider
+    else:
+        embedder = HashedNgramEmbedder()
+        embeddings._request_embeddings = embedder.request
+        embedder_name = f"hashed-{embedder.n}gram-{embedder.dim}"
+
+    results = {"commit": git_commit(), "embedder": embedder_name,
+               "k": args.k, "warm": args.warm, "runs": []}
+    try:
+        if not args.no_pdfs:
+            queries = load_labelled_queries(args.labelled)
+            row = run_corpus("coursematerial", COURSE_MATERIAL, os.path.join(WORK_DIR, "no-exams"),
+                             queries, [], args.k, args.modes, args.warm)
+            results["runs"].append(row)
+            print_row(row)
+
+        for size in sorted(args.sizes):
+            name = f"synthetic-{size}"
+            course_dir = os.path.join(WORK_DIR, name, "coursematerial")
+            exams_dir = os.path.join(WORK_DIR, name, "exams")
+            # A different seed per size, so no corpus reuses another's cached embeddings
+            fact_queries, exam_queries = write_synthetic_corpus(
+                course_dir, exams_dir, size, args.words_per_doc, args.courses, seed=args.seed + size)
+            fact_queries = random.Random(args.seed).sample(fact_queries, min(args.queries, len(fact_queries)))
+            row = run_corpus(name, course_dir, exams_dir, fact_queries, exam_queries,
+                             args.k, args.modes, args.warm)
+            results["runs"].append(row)
+            print_row(row)
+    except RuntimeError as e:
+        sys.exit(f"Benchmark aborted: {e}")
+    finally:
+        os.chdir(ORIGINAL_CWD)
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
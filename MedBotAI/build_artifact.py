@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Corpus Artifact Builder for MedBot AI
+- Extracts, chunks and embeds course material and exams offline, into a
+  fresh corpus that shares nothing with the server's saved one
+- Writes the result as a versioned artifact directory: document text,
+  chunk table, metadata, FAISS and BM25 indexes, and a manifest recording
+  the code settings and source files it was built from
+- The server loads the artifact at boot when it has no saved corpus, so new
+  instances serve queries without extracting or embedding anything
+- Extracted pages and embeddings are cached as usual, so rebuilding after
+  a small change only embeds the changed files
+
+Usage:
+    python build_artifact.py
+    python build_artifact.py --output /srv/medbot/corpus --collections coursematerial
+"""
+
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from typing import Any, Dict, List
+
+from corpus import ARTIFACT_DIR, COLLECTIONS, Corpus
+
+# Initialize logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Collections read from a directory; uploads only exist on a running server
+ARTIFACT_COLLECTIONS = [collection for collection, config in COLLECTIONS.items() if config["directory"]]
+
+def build_artifact(output: str, collections: List[str] = ARTIFACT_COLLECTIONS) -> Dict[str, Any]:
+    """Index the collections from scratch and write them as an artifact
+
+    Raises:
+        RuntimeError: If any chunk could not be embedded; an artifact is
+            never shipped with chunks missing from its indexes
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus = Corpus(work_dir)
+        for collection in collections:
+            corpus.sync_collection(collection)
+        if corpus.pending_count():
+            corpus.embed_pending()
+        if corpus.pending_count():
+            raise RuntimeError(f"{corpus.pending_count()} chunks could not be embedded")
+        return corpus.save_artifact(output, collections)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the prebuilt corpus artifact loaded at server boot")
+    parser.add_argument("--output", default=ARTIFACT_DIR, help="Artifact directory to write or replace")
+    parser.add_argument("--collections", nargs="+", default=ARTIFACT_COLLECTIONS, choices=ARTIFACT_COLLECTIONS)
+    args = parser.parse_args()
+
+    start = time.time()
+    try:
+        manifest = build_artifact(args.output, args.collections)
+    except Exception as e:
+        logger.error(f"Error building artifact: {str(e)}")
+        sys.exit(1)
+    print(f"Wrote {args.output}: {manifest['documents']} documents, {manifest['chunks']} chunks "
+          f"in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,7 @@ from werkzeug.utils import secure_filename
 
 # Import RAG pipeline
 from rag import initialize_rag, get_rag_pipeline
+from ingestion import get_ingestion_queue, QueueFullError
 
 # Initialize logger
 logging.basicConfig(level=logging.INFO)
@@ -88,16 +89,53 @@ def initialize_chatbot():
 def index():
     return render_template('chat.html')
 
+def _remove_upload(job):
+    """Clean up an uploaded file whose ingestion failed"""
+    if os.path.exists(job.filepath):
+        os.remove(job.filepath)
+
+def _replacing(rag_pipeline, old_filepath):
+    """Ingest function that indexes a new upload in place of an earlier one"""
+    def ingest(filepath, progress):
+        rag_pipeline.add_document(filepath, progress, replaces=old_filepath)
+        if os.path.exists(old_filepath):
+            os.remove(old_filepath)
+    return ingest
+
 @chatbot_routes.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    """Accept one or more files and queue them for background ingestion.
+    
+    Returns immediately with a job per file; poll /upload/<job_id> for progress.
+    A single file may name an earlier upload in the 'replaces' form field
+    (its returned filename); the earlier version is removed once the new
+    one is indexed.
+    """
+    files = request.files.getlist('files') + request.files.getlist('file')
+    if not files:
         return jsonify({'error': 'No file part'}), 400
     
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    rag_pipeline = get_rag_pipeline()
+    if not rag_pipeline:
+        return jsonify({'error': 'Document processing is not available'}), 503
+    
+    ingest_fn = rag_pipeline.add_document
+    replaces = request.form.get('replaces')
+    if replaces:
+        old_filepath = os.path.join(UPLOAD_FOLDER, secure_filename(replaces))
+        if len(files) != 1:
+            return jsonify({'error': 'Only one file can replace an earlier upload'}), 400
+        if not os.path.exists(old_filepath):
+            return jsonify({'error': f'Unknown upload: {replaces}'}), 404
+        ingest_fn = _replacing(rag_pipeline, old_filepath)
     
-    if file and allowed_file(file.filename):
+    jobs = []
+    rejected = []
+    for file in files:
+        if file.filename == '' or not allowed_file(file.filename):
+            rejected.append({'filename': file.filename, 'error': 'Invalid file type'})
+            continue
+        
         # Generate a unique filename
         original_filename = secure_filename(file.filename)
         file_extension = original_filename.rsplit('.', 1)[1].lower()
@@ -107,35 +145,75 @@ def upload_file():
         file.save(filepath)
         
         try:
-            # Process file with RAG pipeline
-            rag_pipeline = get_rag_pipeline()
-            if rag_pipeline:
-                rag_pipeline.add_document(filepath)
-            
-            return jsonify({
-                'message': 'File uploaded successfully',
-                'filename': unique_filename
-            }), 200
-            
-        except Exception as e:
-            logger.error(f"Error processing file: {str(e)}")
-            # Clean up the file if processing failed
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            return jsonify({'error': 'Error processing file'}), 500
+            # Process file with RAG pipeline in the background
+            job = get_ingestion_queue().submit(
+                unique_filename, filepath, ingest_fn, on_failure=_remove_upload
+            )
+        except QueueFullError as e:
+            logger.warning(f"Rejected upload {original_filename}: {str(e)}")
+            os.remove(filepath)
+            rejected.append({'filename': file.filename, 'error': 'Server is busy, try again later'})
+            continue
+        
+        jobs.append({
+            'job_id': job.id,
+            'filename': unique_filename,
+            'status': job.status,
+            'status_url': url_for('chatbot.upload_status', job_id=job.id)
+        })
+    
+    if not jobs:
+        if rejected and all(r['error'] == 'Invalid file type' for r in rejected):
+            return jsonify({'error': 'Invalid file type', 'rejected': rejected}), 400
+        return jsonify({'error': 'No files were accepted', 'rejected': rejected}), 503
     
-    return jsonify({'error': 'Invalid file type'}), 400
+    response = {
+        'message': f'{len(jobs)} file(s) accepted for processing',
+        'jobs': jobs,
+        'rejected': rejected
+    }
+    if len(jobs) == 1:
+        # Keep the single-file response shape
+        response['job_id'] = jobs[0]['job_id']
+        response['filename'] = jobs[0]['filename']
+    return jsonify(response), 202
+
+@chatbot_routes.route('/upload/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """Report the progress of a background ingestion job."""
+    job = get_ingestion_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(job.to_dict()), 200
 
 @chatbot_routes.route('/uploads/<filename>')
 def get_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename)
 
+@chatbot_routes.route('/uploads/<filename>', methods=['DELETE'])
+def delete_file(filename):
+    """Remove an uploaded file and its chunks from the index."""
+    rag_pipeline = get_rag_pipeline()
+    if not rag_pipeline:
+        return jsonify({'error': 'Document processing is not available'}), 503
+    
+    filepath = os.path.join(UPLOAD_FOLDER, secure_filename(filename))
+    removed = rag_pipeline.remove_document(filepath)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+        removed = True
+    if not removed:
+        return jsonify({'error': 'Unknown upload'}), 404
+    return jsonify({'message': f'{filename} removed'}), 200
+
 @chatbot_routes.route('/chat', methods=['POST'])
 def chat():
     try:
         data = request.get_json()
         user_input = data.get('message', '')
         conversation_history = data.get('history', [])
+        # "overview" answers broad questions from document and section summaries
+        scope = data.get('scope', 'detail')
         
         if not user_input:
             return jsonify({'error': 'No message provided'}), 400
@@ -147,7 +225,10 @@ def chat():
                 context = ""
                 if rag_pipeline:
                     try:
-                        context = rag_pipeline.get_relevant_context(user_input)
+                        if scope == 'overview':
+                            context = rag_pipeline.get_overview_context(user_input)
+                        else:
+                            context = rag_pipeline.get_relevant_context(user_input)
                     except Exception as e:
                         logger.warning(f"Warning: RAG pipeline error - {str(e)}")
                         # Continue without context if RAG fails
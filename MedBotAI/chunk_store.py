@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compact Chunk Store for MedBot AI
+- Each document's text is held once, in a __slots__ record
+- Chunks are (document, start, end) character offsets in columnar numpy arrays;
+  chunk text is sliced from the document on demand
+- Embeddings are not stored here; they live only in the vector index
+- Chunk ids are stable; removed chunks become tombstones until compaction
+- Chunks whose embedding failed stay on their document as pending spans
+  until they are re-embedded and appended
+- Documents may carry a summary tree: a document summary and section
+  summaries over ranges of chunk indexes (see summaries)
+"""
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+class Document:
+    """One indexed document and its metadata
+
+    ``pending`` lists [start, end, chunk_index] for chunks that are not
+    indexed yet because their embedding failed. ``sections`` lists
+    [first chunk index, end chunk index, summary] when the document was
+    summarised; ``summary`` then summarises the whole document.
+    """
+
+    __slots__ = ("doc_id", "collection", "source", "sha256", "params", "metadata", "text", "pending",
+                 "summary", "sections")
+
+    def __init__(self,
+                 doc_id: str,
+                 collection: str,
+                 source: str,
+                 sha256: str,
+                 params: Dict[str, Any],
+                 metadata: Dict[str, Any],
+                 text: str,
+                 pending: Optional[List[List[int]]] = None,
+                 summary: Optional[str] = None,
+                 sections: Optional[List[List[Any]]] = None):
+        self.doc_id = doc_id
+        self.collection = collection
+        self.source = source
+        self.sha256 = sha256
+        self.params = params
+        self.metadata = metadata
+        self.text = text
+        self.pending = pending or []
+        self.summary = summary
+        self.sections = sections or []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Document":
+        return cls(**data)
+
+class ChunkStore:
+    """Documents plus the chunk table the indexes refer to
+
+    A chunk's position in the table is its chunk id. Ids are stable: removing
+    a document only marks its chunks dead (tombstones), so the ids of every
+    other chunk, and the vectors indexed under them, stay valid. compact
+    drops dead rows and renumbers the rest when tombstones build up.
+    """
+
+    def __init__(self):
+        # doc_id -> Document
+        self.documents = {}
+        # Chunk columns; doc_number indexes into _doc_ids
+        self.doc_number = np.zeros(0, dtype="int32")
+        self.starts = np.zeros(0, dtype="int64")
+        self.ends = np.zeros(0, dtype="int64")
+        self.chunk_index = np.zeros(0, dtype="int32")
+        # False for chunks of removed documents
+        self.alive = np.zeros(0, dtype=bool)
+        # Removed documents leave None here until compaction
+        self._doc_ids = []
+        self._doc_numbers = {}
+        # doc_id -> ids of its live chunks
+        self._chunk_ids = {}
+
+    def __len__(self) -> int:
+        """Number of chunk ids allocated, dead ones included"""
+        return len(self.starts)
+
+    @property
+    def num_dead(self) -> int:
+        return len(self.alive) - int(np.count_nonzero(self.alive))
+
+    def copy(self) -> "ChunkStore":
+        """Return a draft to apply changes to
+
+        Document records and chunk arrays are shared: writes replace the
+        arrays rather than modifying them, so the original stays valid for
+        its readers.
+        """
+        store = ChunkStore()
+        store.documents = dict(self.documents)
+        store.doc_number = self.doc_number
+        store.starts = self.starts
+        store.ends = self.ends
+        store.chunk_index = self.chunk_index
+        store.alive = self.alive
+        store._doc_ids = list(self._doc_ids)
+        store._doc_numbers = dict(self._doc_numbers)
+        store._chunk_ids = dict(self._chunk_ids)
+        return store
+
+    # --------------------------------------------------------------------------
+    # Reads
+    # --------------------------------------------------------------------------
+    def doc_id(self, position: int) -> str:
+        return self._doc_ids[self.doc_number[position]]
+
+    def document(self, position: int) -> Document:
+        return self.documents[self.doc_id(position)]
+
+    def text(self, position: int) -> str:
+        """Slice a chunk's text out of its document"""
+        return self.document(position).text[self.starts[position]:self.ends[position]]
+
+    def texts(self) -> Iterator[str]:
+        """Yield the text of every live chunk in position order"""
+        for position in np.flatnonzero(self.alive).tolist():
+            yield self.text(position)
+
+    def chunk_ids(self, doc_id: str) -> np.ndarray:
+        """Return the ids of a document's live chunks"""
+        return self._chunk_ids.get(doc_id, np.zeros(0, dtype="int64"))
+
+    def positions_for(self, doc_ids: Set[str]) -> np.ndarray:
+        """Return the sorted ids of every live chunk belonging to the given documents"""
+        ids = [self._chunk_ids[doc_id] for doc_id in doc_ids if doc_id in self._chunk_ids]
+        return np.sort(np.concatenate(ids)) if ids else np.zeros(0, dtype="int64")
+
+    # --------------------------------------------------------------------------
+    # Writes
+    # --------------------------------------------------------------------------
+    def add_document(self,
+                     document: Document,
+                     spans: List[Tuple[int, int]],
+                     chunk_index: Optional[List[int]] = None) -> np.ndarray:
+        """Add a document and append its chunks, given as (start, end) offsets into its text
+
+        Args:
+            document: The document; replaces any record with the same doc_id
+            spans: Chunk offsets to append
+            chunk_index: Index of each chunk within the document; defaults to
+                0..len(spans) - 1. Chunks appended later, such as re-embedded
+                pending chunks, pass their original indexes.
+
+        Returns:
+            Ids of the new chunks
+        """
+        self.documents[document.doc_id] = document
+        if document.doc_id not in self._doc_numbers:
+            self._doc_numbers[document.doc_id] = len(self._doc_ids)
+            self._doc_ids.append(document.doc_id)
+        if not spans:
+            return np.zeros(0, dtype="int64")
+
+        spans = np.asarray(spans, dtype="int64").reshape(-1, 2)
+        number = self._doc_numbers[document.doc_id]
+        ids = np.arange(len(self), len(self) + len(spans), dtype="int64")
+        self.doc_number = np.concatenate([self.doc_number, np.full(len(spans), number, dtype="int32")])
+        self.starts = np.concatenate([self.starts, spans[:, 0]])
+        self.ends = np.concatenate([self.ends, spans[:, 1]])
+        if chunk_index is None:
+            chunk_index = np.arange(len(spans))
+        self.chunk_index = np.concatenate([self.chunk_index, np.asarray(chunk_index, dtype="int32")])
+        self.alive = np.concatenate([self.alive, np.ones(len(spans), dtype=bool)])
+        self._chunk_ids[document.doc_id] = np.concatenate([self.chunk_ids(document.doc_id), ids])
+        return ids
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """Remove documents, leaving their chunks as tombstones
+
+        Returns:
+            Ids of the chunks that died
+        """
+        dead = [np.zeros(0, dtype="int64")]
+        for doc_id in set(doc_ids):
+            if self.documents.pop(doc_id, None) is not None:
+                self._doc_ids[self._doc_numbers.pop(doc_id)] = None
+                dead.append(self._chunk_ids.pop(doc_id, dead[0]))
+        dead = np.concatenate(dead)
+        if len(dead):
+            self.alive = self.alive.copy()
+            self.alive[dead] = False
+        return dead
+
+    def compact(self) -> np.ndarray:
+        """Drop dead chunks and removed documents, renumbering what is left
+
+        Returns:
+            New id of each old id, -1 for dead chunks
+        """
+        keep = self.alive
+        renumber = np.full(len(keep), -1, dtype="int64")
+        renumber[keep] = np.arange(int(np.count_nonzero(keep)), dtype="int64")
+
+        old_ids = self._doc_ids
+        self._doc_ids = [doc_id for doc_id in old_ids if doc_id is not None]
+        self._doc_numbers = {doc_id: number for number, doc_id in enumerate(self._doc_ids)}
+        numbers = np.array([self._doc_numbers.get(doc_id, -1) for doc_id in old_ids], dtype="int32")
+
+        self.doc_number = numbers[self.doc_number[keep]]
+        self.starts = self.starts[keep]
+        self.ends = self.ends[keep]
+        self.chunk_index = self.chunk_index[keep]
+        self.alive = np.ones(len(self.starts), dtype=bool)
+        self._chunk_ids = {doc_id: renumber[ids] for doc_id, ids in self._chunk_ids.items()}
+        return renumber
+
+    def _index_documents(self) -> None:
+        """Rebuild the doc_id -> chunk ids registry from the chunk table"""
+        ids = np.flatnonzero(self.alive).astype("int64")
+        numbers = self.doc_number[ids]
+        order = np.argsort(numbers, kind="stable")
+        ids, numbers = ids[order], numbers[order]
+        bounds = np.flatnonzero(np.diff(numbers)) + 1
+        self._chunk_ids = {self._doc_ids[int(group_numbers[0])]: group
+                           for group, group_numbers in zip(np.split(ids, bounds), np.split(numbers, bounds))
+                           if len(group)}
+
+    # --------------------------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------------------------
+    def to_state(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """Split the store into JSON-serialisable documents and chunk arrays"""
+        documents = {"doc_ids": self._doc_ids,
+                     "documents": [self.documents[doc_id].to_dict() for doc_id in self._doc_ids
+                                   if doc_id is not None]}
+        arrays = {"doc_number": self.doc_number, "starts": self.starts,
+                  "ends": self.ends, "chunk_index": self.chunk_index, "alive": self.alive}
+        return documents, arrays
+
+    @classmethod
+    def from_state(cls, documents: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "ChunkStore":
+        """Rebuild a store saved with to_state"""
+        store = cls()
+        store._doc_ids = list(documents["doc_ids"])
+        store._doc_numbers = {doc_id: number for number, doc_id in enumerate(store._doc_ids)
+                              if doc_id is not None}
+        store.documents = {data["doc_id"]: Document.from_dict(data) for data in documents["documents"]}
+        store.doc_number = np.asarray(arrays["doc_number"], dtype="int32")
+        store.starts = np.asarray(arrays["starts"], dtype="int64")
+        store.ends = np.asarray(arrays["ends"], dtype="int64")
+        store.chunk_index = np.asarray(arrays["chunk_index"], dtype="int32")
+        # Stores saved before tombstones had none
+        store.alive = np.asarray(arrays.get("alive", np.ones(len(store.starts), dtype=bool)), dtype=bool)
+        if set(store.documents) != set(store._doc_numbers):
+            raise ValueError("document table and chunk table are out of step")
+        store._index_documents()
+        return store
+
+    def nbytes(self) -> int:
+        """Approximate memory held by document text and the chunk table"""
+        text = sum(len(doc.text) for doc in self.documents.values())
+        return text + self.doc_number.nbytes + self.starts.nbytes + self.ends.nbytes + self.chunk_index.nbytes
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Text Chunking for MedBot AI
+- Encodes each document once with the tiktoken 'cl100k_base' tokenizer
+  and cuts chunks on token offsets
+- Configurable overlap between consecutive chunks
+- Optional snapping of chunk ends to sentence or paragraph boundaries
+- Deterministic: the same text and settings always give the same chunks,
+  so embedding cache keys stay stable
+"""
+
+import os
+import re
+import bisect
+from typing import List, Tuple
+
+from embeddings import get_encoding
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+# Bump whenever a change here would cut the same text differently
+CHUNKER_VERSION = 2
+
+SNAP_MODES = ("none", "sentence", "paragraph")
+# Tokens shared by consecutive chunks
+CHUNK_OVERLAP = int(os.getenv("MEDBOT_CHUNK_OVERLAP", 0))
+CHUNK_SNAP = os.getenv("MEDBOT_CHUNK_SNAP", "sentence")
+# Fraction of a chunk the end may move back to reach a boundary
+SNAP_WINDOW = float(os.getenv("MEDBOT_CHUNK_SNAP_WINDOW", 0.25))
+
+_PARAGRAPH_END = re.compile(r"\n[ \t]*\n")
+# A full stop after a list marker at the start of a line ("4.", "c.") is not a sentence end
+_SENTENCE_END = re.compile(r"(?<!\n\w)(?<!\n\d\d)[.!?][\"')\]]*(?=\s)|\n[ \t]*\n")
+# Fallbacks when no sentence ends inside the window: a line break, then any word break
+_LINE_END = re.compile(r"\n")
+_WORD_END = re.compile(r"\s")
+
+def _last_boundary(pattern: re.Pattern, text: str, start: int, end: int) -> int:
+    """Return the character position after the last boundary in text[start:end], or -1"""
+    position = -1
+    for match in pattern.finditer(text, start, end):
+        position = match.end()
+    return position
+
+def _snap_end(text: str, offsets: List[int], start: int, end: int, window: int, snap: str) -> int:
+    """Move a chunk end (a token index) back to the nearest boundary within the window"""
+    lowest = max(start + 1, end - window)
+    patterns = [_SENTENCE_END, _LINE_END, _WORD_END]
+    if snap == "paragraph":
+        patterns.insert(0, _PARAGRAPH_END)
+    for pattern in patterns:
+        boundary = _last_boundary(pattern, text, offsets[lowest], offsets[end])
+        if boundary != -1:
+            # Cut at the start of the token containing the boundary when only
+            # whitespace lies between them, otherwise at the next token
+            snapped = bisect.bisect_right(offsets, boundary, lowest, end) - 1
+            if text[offsets[snapped]:boundary].strip():
+                snapped = bisect.bisect_left(offsets, boundary, lowest, end)
+            if snapped > start:
+                return snapped
+    return end
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def chunk_spans(text: str,
+                max_tokens: int = 300,
+                overlap: int = CHUNK_OVERLAP,
+                snap: str = CHUNK_SNAP) -> List[Tuple[int, int]]:
+    """Split text into chunks of at most max_tokens tokens
+
+    Args:
+        text: Document text
+        max_tokens: Largest chunk, in tokens
+        overlap: Tokens repeated at the start of the next chunk
+        snap: "none", "sentence" or "paragraph"; where to prefer ending
+            chunks. Snapping falls back to line and then word breaks, so
+            only "none" cuts through words
+
+    Returns:
+        (start, end) character offsets into text of each non-empty chunk,
+        with surrounding whitespace trimmed
+    """
+    if snap not in SNAP_MODES:
+        raise ValueError(f"Unknown snap mode: {snap}")
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("overlap must be at least 0 and smaller than max_tokens")
+
+    encoding = get_encoding()
+    tokens = encoding.encode_ordinary(text)
+    if not tokens:
+        return []
+    # Character offset of each token, plus the end of the text
+    _, offsets = encoding.decode_with_offsets(tokens)
+    offsets = list(offsets) + [len(text)]
+    num_tokens = len(tokens)
+    window = int(max_tokens * SNAP_WINDOW)
+
+    spans = []
+    start = 0
+    while start < num_tokens:
+        end = min(start + max_tokens, num_tokens)
+        if end < num_tokens and snap != "none" and window:
+            end = _snap_end(text, offsets, start, end, window, snap)
+
+        span_start, span_end = _strip_span(text, offsets[start], offsets[end])
+        if span_start < span_end:
+            spans.append((span_start, span_end))
+        if end == num_tokens:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+def chunk_text(text, max_tokens=300, overlap=CHUNK_OVERLAP, snap=CHUNK_SNAP):
+    """
+    Splits text into chunks, ensuring each chunk is <= max_tokens tokens,
+    based on the tiktoken 'cl100k_base' tokenizer.
+    """
+    return [text[start:end] for start, end in chunk_spans(text, max_tokens, overlap, snap)]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Context Packing for MedBot AI
+- Turns retrieved chunks into the context block of a prompt
+- Merges overlapping or adjacent chunks of the same document into one span
+- Drops spans that mostly repeat text already packed (repeated boilerplate,
+  the same file uploaded twice)
+- Fills a per-endpoint token budget, measured with the tokenizer the
+  chat models use, best-ranked spans first
+"""
+
+import os
+import re
+import logging
+from typing import Any, Callable, Dict, List, Set
+
+from embeddings import get_encoding
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+# Context tokens per endpoint
+CONTEXT_BUDGETS = {
+    "chat": int(os.getenv("MEDBOT_CONTEXT_TOKENS_CHAT", 1500)),
+    "flashcards": int(os.getenv("MEDBOT_CONTEXT_TOKENS_FLASHCARDS", 2000))
+}
+SEPARATOR = "\n\n"
+# Spans sharing at least this fraction of their word shingles with packed text are dropped
+DUPLICATE_THRESHOLD = float(os.getenv("MEDBOT_CONTEXT_DUPLICATE_THRESHOLD", 0.8))
+SHINGLE_WORDS = 5
+# A span cut to fit the budget must keep at least this many tokens
+MIN_PARTIAL_TOKENS = 50
+
+_WORD = re.compile(r"\w+")
+
+def _shingles(text: str) -> Set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def merge_spans(chunks: List[Dict[str, Any]], document_text: Callable[[str], str]) -> List[Dict[str, Any]]:
+    """Merge chunks of the same document that overlap or are separated only by whitespace
+
+    Args:
+        chunks: Chunk records, best first, with doc_id, start and end
+        document_text: Callable returning a document's full text
+
+    Returns:
+        Spans as {"doc_id", "start", "end", "rank"}, ordered by the best
+        rank of the chunks they contain
+    """
+    by_document = {}
+    for rank, chunk in enumerate(chunks):
+        by_document.setdefault(chunk["doc_id"], []).append((chunk["start"], chunk["end"], rank))
+
+    spans = []
+    for doc_id, pieces in by_document.items():
+        text = document_text(doc_id)
+        pieces.sort()
+        start, end, rank = pieces[0]
+        for next_start, next_end, next_rank in pieces[1:]:
+            if next_start <= end or not text[end:next_start].strip():
+                end = max(end, next_end)
+                rank = min(rank, next_rank)
+            else:
+                spans.append({"doc_id": doc_id, "start": start, "end": end, "rank": rank})
+                start, end, rank = next_start, next_end, next_rank
+        spans.append({"doc_id": doc_id, "start": start, "end": end, "rank": rank})
+    spans.sort(key=lambda span: span["rank"])
+    return spans
+
+def pack_context(chunks: List[Dict[str, Any]],
+                 document_text: Callable[[str], str],
+                 max_tokens: int) -> str:
+    """Build a prompt context from retrieved chunks within a token budget
+
+    Args:
+        chunks: Chunk records, best first, as returned by CorpusView.chunk
+        document_text: Callable returning a document's full text
+        max_tokens: Token budget for the whole context
+
+    Returns:
+        The packed spans joined by blank lines
+    """
+    encoding = get_encoding()
+    separator_tokens = len(encoding.encode_ordinary(SEPARATOR))
+    packed = []
+    seen = set()
+    used = 0
+    skipped = 0
+
+    for span in merge_spans(chunks, document_text):
+        text = document_text(span["doc_id"])[span["start"]:span["end"]]
+        shingles = _shingles(text)
+        if shingles and len(shingles & seen) >= DUPLICATE_THRESHOLD * len(shingles):
+            skipped += 1
+            continue
+
+        remaining = max_tokens - used - (separator_tokens if packed else 0)
+        tokens = encoding.encode_ordinary(text)
+        if len(tokens) > remaining:
+            if remaining < MIN_PARTIAL_TOKENS:
+                break
+            # Keep the beginning of the span, cut on a token boundary
+            _, offsets = encoding.decode_with_offsets(tokens[:remaining + 1])
+            text = text[:offsets[remaining]].rstrip()
+            tokens = tokens[:remaining]
+
+        packed.append(text)
+        seen |= shingles
+        used += len(tokens) + (separator_tokens if len(packed) > 1 else 0)
+
+    logger.debug(f"Packed {len(chunks)} chunks into {len(packed)} spans, {used} tokens "
+                 f"({skipped} near-duplicates dropped)")
+    return SEPARATOR.join(packed)
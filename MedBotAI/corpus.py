@@ -0,0 +1,1245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared Document Corpus for MedBot AI
+- One document store for the chatbot, flashcards and exams
+- Chunks are tagged with their source collection and document metadata
+- Vectors are partitioned by collection, university and course (see
+  partitions); each blueprint queries the corpus through a CorpusView that
+  searches only the partitions it needs
+- Course material laid out as coursematerial/<university>/<course>/<file>
+  is tagged with that university and course
+- Persisted to disk with a per-file content hash, so restarts only
+  re-extract and re-embed files that were added, changed or removed
+- Document text is held once; chunks are offsets into it (see chunk_store)
+- Chunk ids are stable: replacing or removing a document touches only its
+  own chunks, and tombstones are compacted away once they build up
+- Chunks whose embedding fails are kept as pending on their document and
+  re-embedded in the background; they are never indexed with a placeholder
+- Readers search an immutable snapshot of the store and partitions; writers
+  build the next snapshot beside it and publish it with one reference swap,
+  so queries never wait for indexing and never see a half-applied change
+- A fresh instance with no saved corpus starts from a prebuilt artifact
+  (see build_artifact.py), checked against this code; its FAISS indexes
+  and chunk table are memory mapped and shared between processes
+- Each collection records the embedding space its index is in; changing
+  its provider migrates it online (see migration) instead of re-indexing
+- Collections can opt into summary trees over long documents (see
+  summaries); search_tree then narrows chunk search to the best sections
+"""
+
+import os
+import json
+import time
+import uuid
+import zlib
+import pickle
+import shutil
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from chunk_store import ChunkStore, Document
+from chunking import CHUNK_OVERLAP, CHUNK_SNAP, CHUNKER_VERSION, chunk_spans
+from embeddings import EMBEDDING_PROVIDER, EmbeddingError, embed_text, embed_texts, try_embed_texts
+from extraction import extract_many, extract_pages
+from migration import EmbeddingMigration
+from page_cache import file_sha256
+from partitions import PARTITION_FIELDS, TOMBSTONE_RATIO, PartitionedIndex, partition_key
+from query_cache import get_query_cache
+from retrieval import RETRIEVAL_MODE, hybrid_rank, reciprocal_rank_fusion
+from summaries import SUMMARIZER_VERSION, TREE_DOCUMENTS, TREE_SECTIONS, build_tree
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "cache", "corpus")
+STORE_FILE = "store.json"
+CHUNKS_FILE = "chunks.npz"
+
+SUPPORTED_EXTENSIONS = {".txt", ".pdf"}
+# Chunks are embedded in slices of this size so ingestion progress can be reported
+EMBED_PROGRESS_BATCH = 256
+# Seconds between background attempts to embed pending chunks
+REEMBED_INTERVAL = float(os.getenv("MEDBOT_REEMBED_INTERVAL", 60))
+
+# Prebuilt corpus loaded at boot when no corpus has been saved yet
+ARTIFACT_DIR = os.getenv("MEDBOT_ARTIFACT_DIR", os.path.join(os.path.dirname(__file__), "artifacts", "corpus"))
+ARTIFACT_MANIFEST = "manifest.json"
+ARTIFACT_ARRAYS_DIR = "chunks"
+ARTIFACT_LEXICAL_FILE = "lexical.pkl"
+# Bump when the artifact layout, chunk store or BM25 index format changes;
+# artifacts built for another format are ignored
+ARTIFACT_FORMAT = 1
+
+# Collections and how their documents are extracted, chunked and embedded.
+# Changing "max_tokens", "ocr" or the chunker settings re-indexes a
+# collection on the next sync; changing "embedding" re-embeds it in the
+# background while queries keep using the old vectors. "embedding" is a
+# provider name from embeddings.py, e.g. "local:all-MiniLM-L6-v2" or
+# "openai:text-embedding-3-small@512"; set it per collection with
+# MEDBOT_EMBEDDING_PROVIDER_<COLLECTION>. Local MiniLM models read at most
+# 256 word pieces, so pair them with smaller chunks. "summaries" builds a
+# summary tree over each long document at ingestion (one chat request per
+# section); enable it with MEDBOT_SUMMARIES_<COLLECTION>=1.
+COLLECTIONS = {
+    "coursematerial": {
+        "directory": os.path.join(os.path.dirname(__file__), "coursematerial"),
+        "max_tokens": 300,
+        "ocr": False,
+        "embedding": os.getenv("MEDBOT_EMBEDDING_PROVIDER_COURSEMATERIAL", EMBEDDING_PROVIDER),
+        "summaries": os.getenv("MEDBOT_SUMMARIES_COURSEMATERIAL", "0") == "1",
+        "metadata": {"university": "Computer Science"}
+    },
+    "exams": {
+        # Relative to the working directory, like the exam generator always used
+        "directory": "exams",
+        "max_tokens": 500,
+        "ocr": True,
+        "embedding": os.getenv("MEDBOT_EMBEDDING_PROVIDER_EXAMS", EMBEDDING_PROVIDER),
+        "summaries": os.getenv("MEDBOT_SUMMARIES_EXAMS", "0") == "1",
+        "metadata": {}
+    },
+    "uploads": {
+        # Files uploaded through the chatbot; they stay indexed while the file exists
+        "directory": None,
+        "max_tokens": 300,
+        "ocr": False,
+        "embedding": os.getenv("MEDBOT_EMBEDDING_PROVIDER_UPLOADS", EMBEDDING_PROVIDER),
+        "summaries": os.getenv("MEDBOT_SUMMARIES_UPLOADS", "0") == "1",
+        "metadata": {}
+    }
+}
+
+# Global corpus instance
+_corpus = None
+_corpus_lock = threading.Lock()
+
+def _chunking_params(collection: str) -> Dict[str, Any]:
+    config = COLLECTIONS[collection]
+    params = {
+        "max_tokens": config["max_tokens"],
+        "ocr": config["ocr"],
+        "embedding": config["embedding"],
+        "overlap": CHUNK_OVERLAP,
+        "snap": CHUNK_SNAP,
+        "chunker": CHUNKER_VERSION
+    }
+    # Only present when enabled, so documents indexed before summary trees
+    # existed still match
+    if config["summaries"]:
+        params["summaries"] = SUMMARIZER_VERSION
+    return params
+
+def _same_chunking(params: Dict[str, Any], other: Dict[str, Any]) -> bool:
+    """Whether two sets of chunking params give the same chunks
+
+    The embedding provider is left out; a collection moves to a new one
+    through an embedding migration, not by re-indexing.
+    """
+    return ({name: value for name, value in params.items() if name != "embedding"}
+            == {name: value for name, value in other.items() if name != "embedding"})
+
+def _layout_metadata(collection: str, file_path: str) -> Dict[str, str]:
+    """Read university and course from a <university>/<course>/<file> layout
+
+    A file one directory deep only gets a course; files at the top of the
+    collection directory keep the collection defaults.
+    """
+    directory = COLLECTIONS[collection]["directory"]
+    if not directory:
+        return {}
+    folders = Path(os.path.relpath(file_path, directory)).parts[:-1]
+    if not folders or folders[0] == os.pardir:
+        return {}
+    if len(folders) == 1:
+        return {"course": folders[0]}
+    return {"university": folders[0], "course": folders[1]}
+
+def artifact_fingerprint() -> Dict[str, Any]:
+    """Settings an artifact must have been built with to be loaded by this code"""
+    return {"format": ARTIFACT_FORMAT, "partition_fields": list(PARTITION_FIELDS)}
+
+class IndexSnapshot:
+    """One published version of the corpus
+
+    Partitions map their local FAISS and BM25 ids to chunk positions in
+    ``store``. A snapshot is never modified once published; readers keep a
+    reference for the length of a request, and an old snapshot is freed
+    when its last reader drops it.
+    """
+
+    __slots__ = ("store", "partitions", "version", "spaces")
+
+    def __init__(self, store: ChunkStore, partitions: PartitionedIndex, version: int,
+                 spaces: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.store = store
+        self.partitions = partitions
+        # Bumped on every change so views and cached results are never stale
+        self.version = version
+        # collection -> {"provider", "dimension", "version"} of the embedding
+        # space its vectors are in; the version is bumped by each migration
+        self.spaces = spaces or {}
+
+    def draft(self) -> "IndexSnapshot":
+        """Return the next version, sharing everything a change does not replace"""
+        return IndexSnapshot(self.store.copy(), self.partitions.copy(), self.version + 1, dict(self.spaces))
+
+    def embedding(self, collection: str) -> str:
+        """Return the provider a collection's vectors, and queries against them, are embedded with"""
+        space = self.spaces.get(collection)
+        return space["provider"] if space else COLLECTIONS[collection]["embedding"]
+
+    def document_text(self, doc_id: str) -> str:
+        """Return the full extracted text of a document"""
+        return self.store.documents[doc_id].text
+
+def _recorded_spaces(documents: Dict[str, Any], store: ChunkStore,
+                     partitions: PartitionedIndex) -> Dict[str, Dict[str, Any]]:
+    """Read the embedding spaces saved with a corpus
+
+    A collection with indexed vectors but no recorded space (saved before
+    spaces were recorded, or whose space was lost) gets one from the
+    provider its documents were embedded with and the size of its vectors.
+    """
+    spaces = dict(documents.get("spaces", {}))
+    providers = {doc.collection: doc.params.get("embedding", COLLECTIONS[doc.collection]["embedding"])
+                 for doc in store.documents.values()}
+    for key, partition in partitions.partitions.items():
+        collection = key[0]
+        if collection not in spaces and collection in providers and partition.segments:
+            spaces[collection] = {"provider": providers[collection],
+                                  "dimension": int(partition.segments[0].index.d), "version": 1}
+    return spaces
+
+class Corpus:
+    """Document store and partitioned indexes shared by every blueprint"""
+
+    def __init__(self, corpus_dir: str = CORPUS_DIR):
+        self.corpus_dir = corpus_dir
+        # The published snapshot; replaced, never modified
+        self.snapshot = IndexSnapshot(ChunkStore(), PartitionedIndex(), 0)
+        # The next snapshot while a change is being applied
+        self._draft = None
+        self._synced = set()
+        # Serializes changes; extraction and embedding happen outside it
+        self._write_lock = threading.RLock()
+        self._pending_worker = None
+        self._stop = threading.Event()
+        # collection -> its latest EmbeddingMigration
+        self._migrations = {}
+
+    @property
+    def store(self) -> ChunkStore:
+        return self.snapshot.store
+
+    @property
+    def partitions(self) -> PartitionedIndex:
+        return self.snapshot.partitions
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    # --------------------------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------------------------
+    def load(self) -> None:
+        """Load the persisted corpus, if there is one"""
+        store_path = os.path.join(self.corpus_dir, STORE_FILE)
+        if not os.path.exists(store_path):
+            logger.info("No saved corpus found, building from scratch")
+            return
+
+        try:
+            with open(store_path, "r") as f:
+                documents = json.load(f)
+            with np.load(os.path.join(self.corpus_dir, CHUNKS_FILE)) as arrays:
+                store = ChunkStore.from_state(documents, dict(arrays))
+            if documents.get("partition_fields") != list(PARTITION_FIELDS):
+                raise ValueError("corpus was partitioned on different fields")
+            partitions = PartitionedIndex.load(self.corpus_dir, documents["partitions"], store)
+            spaces = _recorded_spaces(documents, store, partitions)
+
+            self.snapshot = IndexSnapshot(store, partitions, self.version + 1, spaces)
+            logger.info(f"Loaded corpus with {len(store.documents)} documents, "
+                        f"{len(store)} chunks and {len(partitions.partitions)} partitions "
+                        f"from {self.corpus_dir}")
+
+        except Exception as e:
+            logger.warning(f"Could not load saved corpus, rebuilding: {str(e)}")
+            self.snapshot = IndexSnapshot(ChunkStore(), PartitionedIndex(), self.version + 1)
+
+    def save(self) -> None:
+        """Persist the corpus to disk"""
+        with self._write_lock:
+            try:
+                snapshot = self.snapshot
+                os.makedirs(self.corpus_dir, exist_ok=True)
+                chunks_path = os.path.join(self.corpus_dir, CHUNKS_FILE)
+                store_path = os.path.join(self.corpus_dir, STORE_FILE)
+                manifest = snapshot.partitions.save(self.corpus_dir)
+
+                documents, arrays = snapshot.store.to_state()
+                documents["partition_fields"] = list(PARTITION_FIELDS)
+                documents["partitions"] = manifest
+                documents["spaces"] = snapshot.spaces
+                with open(chunks_path + ".tmp", "wb") as f:
+                    np.savez(f, **arrays)
+                os.replace(chunks_path + ".tmp", chunks_path)
+
+                # Write the store last and atomically so a crash mid-save
+                # never leaves a store describing an index that was not written
+                with open(store_path + ".tmp", "w") as f:
+                    json.dump(documents, f)
+                os.replace(store_path + ".tmp", store_path)
+                PartitionedIndex.remove_unused(self.corpus_dir, manifest)
+
+            except Exception as e:
+                logger.error(f"Error saving corpus: {str(e)}")
+
+    def save_artifact(self, path: str, collections: Iterable[str]) -> Dict[str, Any]:
+        """Write the corpus as a self-contained artifact directory
+
+        Holds the document text, chunk table, FAISS and BM25 indexes of
+        directory collections, with sources stored relative to each
+        collection's directory so the artifact can be built on another
+        machine. An existing artifact at ``path`` is replaced.
+
+        Returns:
+            The artifact manifest
+        """
+        snapshot = self.snapshot
+        collections = list(collections)
+        building = f"{path}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(os.path.join(building, ARTIFACT_ARRAYS_DIR))
+
+        documents, arrays = snapshot.store.to_state()
+        for data in documents["documents"]:
+            if data["collection"] not in collections or not COLLECTIONS[data["collection"]]["directory"]:
+                raise ValueError(f"{data['source']} is not in an artifact collection")
+            data["source"] = os.path.relpath(data["source"], COLLECTIONS[data["collection"]]["directory"])
+        documents["partition_fields"] = list(PARTITION_FIELDS)
+        documents["partitions"] = snapshot.partitions.save(building)
+        documents["spaces"] = snapshot.spaces
+        with open(os.path.join(building, STORE_FILE), "w") as f:
+            json.dump(documents, f)
+        # Separate .npy files, unlike the saved corpus, so they can be memory mapped
+        for name, array in arrays.items():
+            np.save(os.path.join(building, ARTIFACT_ARRAYS_DIR, name + ".npy"), array)
+        lexical_indexes = {segment.name: segment.lexical_index
+                           for partition in snapshot.partitions.partitions.values()
+                           for segment in partition.segments}
+        with open(os.path.join(building, ARTIFACT_LEXICAL_FILE), "wb") as f:
+            pickle.dump(lexical_indexes, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        manifest = {
+            "fingerprint": artifact_fingerprint(),
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "documents": len(snapshot.store.documents),
+            "chunks": len(snapshot.store) - snapshot.store.num_dead,
+            "collections": {collection: {"params": _chunking_params(collection),
+                                         "files": self._file_hashes(collection)}
+                            for collection in collections}
+        }
+        with open(os.path.join(building, ARTIFACT_MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Directories cannot be renamed over each other; move the old one aside first
+        previous = f"{path}.old-{uuid.uuid4().hex}"
+        if os.path.exists(path):
+            os.replace(path, previous)
+        os.replace(building, path)
+        shutil.rmtree(previous, ignore_errors=True)
+        return manifest
+
+    def load_artifact(self, path: str = ARTIFACT_DIR) -> bool:
+        """Load a corpus artifact written by save_artifact
+
+        The chunk table and FAISS indexes are memory mapped, so processes
+        loading the same artifact share one page-cache copy of them. Document
+        text, segment ids and the BM25 indexes, unpickled rather than rebuilt,
+        are read into each process. Loading takes about as long as reading
+        the document text. A collection whose files match
+        the ones the artifact was built from, by path and content hash, is
+        marked synced; any other is re-synced incrementally.
+
+        Returns:
+            bool: True if the artifact was loaded
+        """
+        manifest_path = os.path.join(path, ARTIFACT_MANIFEST)
+        if not os.path.exists(manifest_path):
+            return False
+
+        start = time.perf_counter()
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("fingerprint") != artifact_fingerprint():
+                logger.warning(f"Ignoring corpus artifact at {path}: built for {manifest.get('fingerprint')}, "
+                               f"this code expects {artifact_fingerprint()}")
+                return False
+
+            with open(os.path.join(path, STORE_FILE), "r") as f:
+                documents = json.load(f)
+            for data in documents["documents"]:
+                data["source"] = os.path.join(COLLECTIONS[data["collection"]]["directory"], data["source"])
+            arrays_dir = os.path.join(path, ARTIFACT_ARRAYS_DIR)
+            arrays = {file_name[:-len(".npy")]: np.load(os.path.join(arrays_dir, file_name), mmap_mode="r")
+                      for file_name in os.listdir(arrays_dir) if file_name.endswith(".npy")}
+            store = ChunkStore.from_state(documents, arrays)
+            with open(os.path.join(path, ARTIFACT_LEXICAL_FILE), "rb") as f:
+                lexical_indexes = pickle.load(f)
+            partitions = PartitionedIndex.load(path, documents["partitions"], store, lexical_indexes)
+            spaces = _recorded_spaces(documents, store, partitions)
+
+        except Exception as e:
+            logger.warning(f"Could not load corpus artifact at {path}: {str(e)}")
+            return False
+
+        with self._write_lock:
+            self.snapshot = IndexSnapshot(store, partitions, self.version + 1, spaces)
+            for collection, built in manifest["collections"].items():
+                if not _same_chunking(built["params"], _chunking_params(collection)):
+                    logger.warning(f"Artifact collection '{collection}' was built with other settings; "
+                                   f"it will be re-indexed")
+                elif built["files"] != self._file_hashes(collection):
+                    logger.info(f"Files of '{collection}' changed since the artifact was built; "
+                                f"syncing them")
+                else:
+                    self._synced.add(collection)
+        logger.info(f"Loaded corpus artifact built {manifest['built_at']} with {manifest['documents']} "
+                    f"documents and {manifest['chunks']} chunks in "
+                    f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        return True
+
+    # --------------------------------------------------------------------------
+    # Ingestion
+    # --------------------------------------------------------------------------
+    def _collection_files(self, collection: str) -> List[Path]:
+        """List the supported files in a collection's directory"""
+        directory = COLLECTIONS[collection]["directory"]
+        if not directory or not os.path.isdir(directory):
+            return []
+        return [file_path for file_path in Path(directory).rglob("*")
+                if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS]
+
+    def _scan_directory(self, collection: str) -> Dict[str, str]:
+        """Map each supported file in a collection's directory to its content hash"""
+        return {str(file_path): file_sha256(str(file_path)) for file_path in self._collection_files(collection)}
+
+    def _file_hashes(self, collection: str) -> Dict[str, str]:
+        """Map each supported file in a collection's directory, relative to it, to its content hash"""
+        directory = COLLECTIONS[collection]["directory"]
+        return {os.path.relpath(file_path, directory): digest
+                for file_path, digest in self._scan_directory(collection).items()}
+
+    def _documents_in(self, collection: str) -> Dict[str, str]:
+        """Map each indexed source of a collection to its document id"""
+        return {doc.source: doc_id for doc_id, doc in self.store.documents.items()
+                if doc.collection == collection}
+
+    def sync_collection(self, collection: str) -> bool:
+        """Bring a collection in line with its directory
+
+        Only files that were added, changed or removed since they were
+        indexed (or whose chunking parameters changed) are processed.
+
+        Returns:
+            bool: True if the corpus was modified
+        """
+        params = _chunking_params(collection)
+        indexed = self._documents_in(collection)
+
+        if COLLECTIONS[collection]["directory"] is None:
+            current = {source: self.store.documents[doc_id].sha256
+                       for source, doc_id in indexed.items() if os.path.exists(source)}
+        else:
+            current = self._scan_directory(collection)
+
+        stale = [doc_id for source, doc_id in indexed.items()
+                 if source not in current
+                 or self.store.documents[doc_id].sha256 != current[source]
+                 or not _same_chunking(self.store.documents[doc_id].params, params)]
+        stale_sources = {self.store.documents[doc_id].source for doc_id in stale}
+        pending = [source for source in current
+                   if source not in indexed or source in stale_sources]
+
+        if not stale and not pending:
+            logger.info(f"Collection '{collection}' is up to date ({len(indexed)} documents)")
+            return False
+
+        with self._write_lock:
+            self._remove_documents(stale)
+            self._on_changed()
+        # Files are extracted in parallel; each is indexed as its pages arrive
+        for source, pages, error in extract_many(pending, ocr=params["ocr"], digests=current):
+            logger.info(f"Loading {source}")
+            try:
+                if error is not None:
+                    raise error
+                self.add_file(collection, source, digest=current[source], pages=pages)
+            except Exception as e:
+                logger.error(f"Error indexing {source}: {str(e)}")
+        with self._write_lock:
+            # Files were indexed one segment at a time; leave one per course
+            self._edit().partitions.merge(collection)
+            self._on_changed()
+
+        logger.info(f"Collection '{collection}' synced: {len(pending)} files indexed, "
+                    f"{len(stale)} stale documents removed")
+        return True
+
+    def ensure_synced(self, collection: str) -> None:
+        """Sync a collection once per process and persist any changes
+
+        Also starts migrating the collection to its configured embedding
+        provider if its index is in another space.
+        """
+        with self._write_lock:
+            if collection not in self._synced:
+                if self.sync_collection(collection):
+                    self.save()
+                self._synced.add(collection)
+        self.start_migration(collection)
+
+    def add_file(self,
+                 collection: str,
+                 file_path: str,
+                 metadata: Optional[Dict[str, Any]] = None,
+                 digest: Optional[str] = None,
+                 progress: Optional[Callable[..., None]] = None,
+                 pages: Optional[List[str]] = None,
+                 replaces: Optional[str] = None) -> int:
+        """Extract, chunk, embed and index a file, replacing any earlier version
+
+        Safe to call from several threads at once. The old version is
+        swapped for the new one in a single publish, so searches see one or
+        the other, never both or neither.
+
+        Args:
+            collection: Collection the document belongs to
+            file_path: File to index; also identifies the document
+            metadata: Extra document metadata
+            digest: Content hash, if already computed
+            progress: Optional callback, called with pages=, chunks= and
+                embedded= counts as ingestion proceeds
+            pages: Page texts, if the file was already extracted
+            replaces: Another file of the collection this one supersedes,
+                such as an earlier upload of the same handout
+
+        Returns:
+            Number of chunks added
+        """
+        prepared = self._prepare_file(collection, file_path, metadata, digest, progress, pages)
+        if prepared is None:
+            return 0
+        with self._write_lock:
+            self._commit_file(prepared, replaces)
+            self._on_changed()
+        document, spans = prepared[:2]
+        return len(spans) + len(document.pending)
+
+    def apply_changes(self, collection: str, file_paths: Iterable[str]) -> bool:
+        """Re-index only the given files of a collection and publish the result once
+
+        Files that no longer exist are removed, new and modified files are
+        extracted and embedded, and unchanged files are skipped. A directory
+        stands for every file under it, so moving a folder in or out works.
+        The work is done beside the published snapshot, which keeps serving
+        queries until every file of the batch is indexed.
+
+        Args:
+            collection: Collection the files belong to
+            file_paths: Changed paths, in the form sync_collection indexes
+                them (the collection directory joined with the relative path)
+
+        Returns:
+            bool: True if the corpus was modified
+        """
+        params = _chunking_params(collection)
+        indexed = self._documents_in(collection)
+        changed_paths = set(file_paths)
+        removed = [source for source in indexed if not os.path.isfile(source)
+                   and any(source == path or source.startswith(path.rstrip(os.sep) + os.sep)
+                           for path in changed_paths)]
+
+        files = set()
+        for path in changed_paths:
+            if os.path.isdir(path):
+                files.update(str(file_path) for file_path in Path(path).rglob("*") if file_path.is_file())
+            else:
+                files.add(path)
+
+        digests = {}
+        for path in sorted(files):
+            if os.path.isfile(path) and Path(path).suffix.lower() in SUPPORTED_EXTENSIONS:
+                try:
+                    digests[path] = file_sha256(path)
+                except OSError as e:
+                    # Deleted or still being replaced; the next event covers it
+                    logger.warning(f"Skipping {path}: {str(e)}")
+        changed = [path for path, digest in digests.items()
+                   if path not in indexed
+                   or self.store.documents[indexed[path]].sha256 != digest
+                   or not _same_chunking(self.store.documents[indexed[path]].params, params)]
+        if not removed and not changed:
+            return False
+
+        prepared = []
+        for source, pages, error in extract_many(changed, ocr=params["ocr"], digests=digests):
+            logger.info(f"Loading {source}")
+            try:
+                if error is not None:
+                    raise error
+                prepared.append(self._prepare_file(collection, source, digest=digests[source], pages=pages))
+            except Exception as e:
+                logger.error(f"Error indexing {source}: {str(e)}")
+
+        with self._write_lock:
+            # Files deleted since they were extracted are dropped, not indexed
+            prepared = [item for item in prepared if item is not None and os.path.isfile(item[0].source)]
+            indexed = self._documents_in(collection)
+            self._remove_documents([indexed[source] for source in removed
+                                    if source in indexed and not os.path.isfile(source)])
+            for item in prepared:
+                self._commit_file(item)
+            self._on_changed()
+
+        logger.info(f"Collection '{collection}' updated: {len(prepared)} files indexed, "
+                    f"{len(removed)} removed")
+        return True
+
+    def _prepare_file(self,
+                      collection: str,
+                      file_path: str,
+                      metadata: Optional[Dict[str, Any]] = None,
+                      digest: Optional[str] = None,
+                      progress: Optional[Callable[..., None]] = None,
+                      pages: Optional[List[str]] = None) -> Optional[Tuple[Document, List[Tuple[int, int]],
+                                                                           np.ndarray, List[int]]]:
+        """Extract, chunk and embed a file without touching the corpus
+
+        Returns:
+            (document, embedded spans, their vectors, their chunk indexes),
+            or None if this version of the file is already indexed
+        """
+        config = COLLECTIONS[collection]
+        digest = digest or file_sha256(file_path)
+        existing = self._documents_in(collection).get(file_path)
+        if existing and self.store.documents[existing].sha256 == digest \
+                and _same_chunking(self.store.documents[existing].params, _chunking_params(collection)):
+            logger.info(f"{file_path} is already indexed")
+            return None
+
+        if pages is None:
+            pages = extract_pages(file_path, ocr=config["ocr"], digest=digest)
+        text = "\n".join(pages)
+        if progress:
+            progress(pages=len(pages))
+        spans = chunk_spans(text, max_tokens=config["max_tokens"])
+        texts = [text[start:end] for start, end in spans]
+        if progress:
+            progress(chunks=len(texts))
+
+        # Embedded into the space the collection is served from, which is
+        # not the configured one while a migration is under way
+        provider = self.snapshot.embedding(collection)
+        vectors = np.zeros((len(texts), 0), dtype="float32")
+        slices = []
+        failed = []
+        for start in range(0, len(texts), EMBED_PROGRESS_BATCH):
+            slice_vectors, slice_failed = try_embed_texts(texts[start:start + EMBED_PROGRESS_BATCH], provider)
+            slices.append(slice_vectors)
+            failed.extend(start + position for position in slice_failed)
+            if progress:
+                progress(embedded=min(start + EMBED_PROGRESS_BATCH, len(texts)))
+        if slices:
+            vectors = np.vstack(slices)
+
+        # Only chunks with a real embedding are indexed; the rest wait as pending
+        embedded = np.setdiff1d(np.arange(len(texts)), np.asarray(failed, dtype="int64"))
+        if failed:
+            logger.warning(f"{len(failed)} of {len(texts)} chunks of {file_path} could not be embedded; "
+                           f"queued for re-embedding")
+
+        summary, sections = None, []
+        if config["summaries"]:
+            summary, sections = build_tree(text, spans)
+            if summary:
+                # Warms the embedding cache the tree search reads from
+                try_embed_texts([summary] + [section[2] for section in sections], provider)
+
+        doc_metadata = dict(config["metadata"])
+        doc_metadata.update({
+            "file_name": os.path.basename(file_path),
+            "course": os.path.splitext(os.path.basename(file_path))[0]
+        })
+        doc_metadata.update(_layout_metadata(collection, file_path))
+        doc_metadata.update(metadata or {})
+
+        params = _chunking_params(collection)
+        params["embedding"] = provider
+        document = Document(
+            doc_id=uuid.uuid4().hex,
+            collection=collection,
+            source=file_path,
+            sha256=digest,
+            params=params,
+            metadata=doc_metadata,
+            text=text,
+            pending=[[spans[i][0], spans[i][1], i] for i in failed],
+            summary=summary,
+            sections=sections
+        )
+        if not texts:
+            logger.warning(f"No content extracted from {file_path}")
+        return document, [spans[i] for i in embedded], vectors[embedded], embedded.tolist()
+
+    def _commit_file(self,
+                     prepared: Tuple[Document, List[Tuple[int, int]], np.ndarray, List[int]],
+                     replaces: Optional[str] = None) -> None:
+        """Index a prepared file in place of its earlier version (caller holds the write lock)"""
+        document, spans, vectors, chunk_index = prepared
+        collection = document.collection
+        indexed = self._documents_in(collection)
+        self._remove_documents([indexed[source] for source in (document.source, replaces) if source in indexed])
+
+        draft = self._edit()
+        provider = draft.embedding(collection)
+        if document.params["embedding"] != provider:
+            # The collection switched embedding spaces while the file was
+            # being embedded; its chunks are re-embedded as pending chunks
+            logger.info(f"{document.source} was embedded with {document.params['embedding']}; "
+                        f"queued for re-embedding with {provider}")
+            document.pending = sorted(document.pending + [[start, end, index] for (start, end), index
+                                                          in zip(spans, chunk_index)], key=lambda span: span[2])
+            document.params["embedding"] = provider
+            spans, vectors, chunk_index = [], vectors[:0], []
+        self._add_document(document, spans, vectors, chunk_index)
+
+    def _add_document(self,
+                      document: Document,
+                      spans: List[Tuple[int, int]],
+                      vectors: np.ndarray,
+                      chunk_index: Optional[List[int]] = None) -> None:
+        """Add a document and append its chunk vectors to its partition (caller holds the write lock)
+
+        The first vectors indexed for a collection record its embedding
+        space, whether they come from a new file or from pending chunks.
+        """
+        draft = self._edit()
+        ids = draft.store.add_document(document, spans, chunk_index)
+        if len(ids):
+            draft.partitions.add(partition_key(document.collection, document.metadata), vectors, ids)
+            if document.collection not in draft.spaces:
+                draft.spaces[document.collection] = {"provider": document.params["embedding"],
+                                                     "dimension": int(vectors.shape[1]), "version": 1}
+
+    def _remove_documents(self, doc_ids: Iterable[str]) -> None:
+        """Remove documents, marking their chunks dead in the store and their partition
+
+        The caller must hold the write lock and call _on_changed afterwards.
+        Only the removed documents' chunks are touched; their vectors are
+        dropped when the partition is next compacted.
+        """
+        doc_ids = set(doc_ids)
+        if not doc_ids:
+            return
+        draft = self._edit()
+        for doc_id in doc_ids:
+            document = draft.store.documents[doc_id]
+            logger.info(f"Removing {document.source} from corpus")
+            dead = draft.store.remove_documents([doc_id])
+            draft.partitions.remove(partition_key(document.collection, document.metadata), dead)
+
+    def remove_file(self, collection: str, file_path: str) -> bool:
+        """Remove a file's document from the corpus
+
+        Returns:
+            bool: True if the file was indexed
+        """
+        with self._write_lock:
+            doc_id = self._documents_in(collection).get(file_path)
+            if doc_id is None:
+                return False
+            self._remove_documents([doc_id])
+            self._on_changed()
+        return True
+
+    # --------------------------------------------------------------------------
+    # Pending chunks
+    # --------------------------------------------------------------------------
+    def pending_count(self) -> int:
+        """Number of chunks waiting to be re-embedded"""
+        return sum(len(doc.pending) for doc in list(self.store.documents.values()))
+
+    def embed_pending(self) -> int:
+        """Embed pending chunks and append the ones that succeed to the index
+
+        Chunks that fail again stay pending for the next attempt. Documents
+        replaced or removed in the meantime are skipped.
+
+        Returns:
+            Number of chunks indexed
+        """
+        with self._write_lock:
+            work = [(doc, [list(span) for span in doc.pending])
+                    for doc in self.store.documents.values() if doc.pending]
+        if not work:
+            return 0
+
+        results = []
+        for doc, pending in work:
+            provider = doc.params.get("embedding", self.snapshot.embedding(doc.collection))
+            vectors, failed = try_embed_texts([doc.text[start:end] for start, end, _ in pending], provider)
+            embedded = np.setdiff1d(np.arange(len(pending)), np.asarray(failed, dtype="int64"))
+            if len(embedded):
+                results.append((doc, [pending[i] for i in embedded], vectors[embedded]))
+
+        indexed = 0
+        with self._write_lock:
+            for doc, done, vectors in results:
+                if self.store.documents.get(doc.doc_id) is not doc:
+                    continue
+                # Records are shared with the published snapshot, so a changed copy replaces it
+                done_index = {index for _, _, index in done}
+                data = doc.to_dict()
+                data["pending"] = [span for span in doc.pending if span[2] not in done_index]
+                self._add_document(Document.from_dict(data), [(start, end) for start, end, _ in done], vectors,
+                                   [index for _, _, index in done])
+                indexed += len(done)
+            if indexed:
+                self._on_changed()
+
+        logger.info(f"Re-embedded {indexed} pending chunks; {self.pending_count()} still pending")
+        return indexed
+
+    def start_pending_worker(self) -> None:
+        """Start the background thread that retries pending chunks every REEMBED_INTERVAL seconds"""
+        with self._write_lock:
+            if self._pending_worker is not None:
+                return
+            self._pending_worker = threading.Thread(target=self._pending_loop, name="corpus-reembed",
+                                                    daemon=True)
+            self._pending_worker.start()
+
+    def stop_pending_worker(self) -> None:
+        self._stop.set()
+
+    def _pending_loop(self) -> None:
+        while not self._stop.wait(REEMBED_INTERVAL):
+            try:
+                if self.pending_count() and self.embed_pending():
+                    self.save()
+            except Exception as e:
+                logger.error(f"Error re-embedding pending chunks: {str(e)}")
+
+    # --------------------------------------------------------------------------
+    # Embedding migration
+    # --------------------------------------------------------------------------
+    def start_migration(self, collection: str) -> Optional[EmbeddingMigration]:
+        """Start re-embedding a collection into its configured embedding space, if it is in another
+
+        Returns:
+            The running migration, or None if the collection is already in
+            the configured space
+        """
+        target = COLLECTIONS[collection]["embedding"]
+        with self._write_lock:
+            source = self.snapshot.embedding(collection)
+            migration = self._migrations.get(collection)
+            if migration is not None and migration.state == "running":
+                if migration.target == target:
+                    return migration
+                migration.stop()
+            if source == target:
+                return None
+            migration = self._migrations[collection] = EmbeddingMigration(self, collection, source, target)
+            migration.start()
+            return migration
+
+    def switch_embedding(self, collection: str, provider: str, dimension: int,
+                         migration: EmbeddingMigration) -> bool:
+        """Move a collection to a new embedding space in one publish
+
+        Every live chunk of the collection must have a vector in the new
+        space; the partitions are rebuilt from them and the documents are
+        marked as embedded with ``provider``. Queries see the old index or
+        the new one, never a mix.
+
+        Returns:
+            bool: False if chunks indexed since the migration's last pass
+                still lack a vector
+        """
+        with self._write_lock:
+            snapshot = self.snapshot
+            if migration.missing(snapshot):
+                return False
+            store = snapshot.store
+            groups = {}
+            documents = {}
+            for doc_id, doc in store.documents.items():
+                if doc.collection != collection:
+                    continue
+                ids = store.chunk_ids(doc_id)
+                if len(ids):
+                    vectors, chunk_ids = groups.setdefault(partition_key(collection, doc.metadata), ([], []))
+                    vectors.append(migration.vectors_for(doc_id, store.chunk_index[ids]))
+                    chunk_ids.append(ids)
+                # Records are shared with the published snapshot, so changed copies replace them
+                data = doc.to_dict()
+                data["params"] = dict(doc.params, embedding=provider)
+                documents[doc_id] = Document.from_dict(data)
+
+            draft = self._edit()
+            draft.store.documents.update(documents)
+            draft.partitions.replace_collection(collection, {key: (np.vstack(vectors), np.concatenate(chunk_ids))
+                                                             for key, (vectors, chunk_ids) in groups.items()})
+            previous = draft.spaces.get(collection, {})
+            draft.spaces[collection] = {"provider": provider, "dimension": dimension,
+                                        "version": previous.get("version", 0) + 1}
+            self._on_changed()
+        self.save()
+
+        logger.info(f"Collection '{collection}' now served from {provider} "
+                    f"(space version {draft.spaces[collection]['version']}, {dimension} dimensions)")
+        return True
+
+    def migration_status(self) -> Dict[str, Any]:
+        """Embedding space of each collection and progress of each migration"""
+        return {"spaces": dict(self.snapshot.spaces),
+                "migrations": [migration.status() for migration in list(self._migrations.values())]}
+
+    def _edit(self) -> IndexSnapshot:
+        """Return the draft of the next snapshot, starting one if needed (caller holds the write lock)"""
+        if self._draft is None:
+            self._draft = self.snapshot.draft()
+        return self._draft
+
+    def _on_changed(self) -> None:
+        """Refresh derived state of the draft and publish it (caller holds the write lock)"""
+        draft, self._draft = self._draft, None
+        if draft is None:
+            return
+        if draft.store.num_dead > TOMBSTONE_RATIO * len(draft.store):
+            logger.info(f"Compacting corpus: dropping {draft.store.num_dead} dead chunks")
+            draft.partitions.renumber(draft.store.compact())
+        draft.partitions.refresh(draft.store)
+        # A single reference assignment; requests already running keep the old snapshot
+        self.snapshot = draft
+        get_query_cache().invalidate(draft.version)
+
+def get_corpus() -> Corpus:
+    """Get the process-wide corpus, loading it from disk on first use"""
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            corpus = Corpus()
+            # A corpus saved by this instance wins; a fresh instance, such as
+            # a newly scaled-out container, starts from the prebuilt artifact
+            if os.path.exists(os.path.join(corpus.corpus_dir, STORE_FILE)) or not corpus.load_artifact():
+                corpus.load()
+            corpus.start_pending_worker()
+            _corpus = corpus
+    return _corpus
+
+class CorpusView:
+    """Read access to the chunks of some collections, optionally filtered by metadata
+
+    Every method reads the corpus snapshot it is given, or the current one.
+    Pass one snapshot to all calls serving a request so positions returned
+    by search still refer to the same chunks when they are read.
+    """
+
+    def __init__(self, corpus: Corpus, collections: List[str], name: str):
+        """
+        Args:
+            corpus: Shared corpus
+            collections: Collections visible through this view
+            name: Name used for the view's query cache entries
+        """
+        self.corpus = corpus
+        self.collections = set(collections)
+        self.name = name
+        # (snapshot version, {where key: positions})
+        self._positions = (None, {})
+        # (snapshot version, {provider: {doc_id: (summary vector, section vectors)}})
+        self._trees = (None, {})
+
+    def snapshot(self) -> IndexSnapshot:
+        """Return the corpus snapshot currently published"""
+        return self.corpus.snapshot
+
+    def positions(self, where: Optional[Dict[str, Any]] = None,
+                  snapshot: Optional[IndexSnapshot] = None) -> np.ndarray:
+        """Return the corpus positions visible through this view
+
+        Args:
+            where: Optional document metadata that must match exactly
+            snapshot: Snapshot to read; defaults to the current one
+        """
+        snapshot = snapshot or self.corpus.snapshot
+        version, cache = self._positions
+        if version != snapshot.version:
+            cache = {}
+            self._positions = (snapshot.version, cache)
+
+        key = tuple(sorted((where or {}).items()))
+        if key not in cache:
+            store = snapshot.store
+            visible = {
+                doc_id for doc_id, doc in store.documents.items()
+                if doc.collection in self.collections
+                and all(doc.metadata.get(field) == value for field, value in key)
+            }
+            cache[key] = store.positions_for(visible)
+        return cache[key]
+
+    def __len__(self) -> int:
+        return len(self.positions())
+
+    def search(self,
+               query: str,
+               top_k: int,
+               mode: Optional[str] = None,
+               where: Optional[Dict[str, Any]] = None,
+               fallback: bool = False,
+               snapshot: Optional[IndexSnapshot] = None,
+               positions: Optional[np.ndarray] = None) -> List[int]:
+        """Return positions of the chunks most relevant to a query
+
+        Only the partitions matching the partition fields of ``where``
+        (university and course by default) are searched, in parallel when
+        there are several. Other ``where`` fields must match exactly.
+
+        Args:
+            query: Query text
+            top_k: Number of chunks to return
+            mode: "dense", "lexical" or "hybrid" retrieval
+            where: Optional document metadata filter
+            fallback: Widen the search when no partition matches the
+                requested university and course, instead of returning nothing
+            snapshot: Snapshot to search; defaults to the current one
+            positions: Optional sorted chunk ids the results must come from
+        """
+        snapshot = snapshot or self.corpus.snapshot
+        index = snapshot.partitions
+        where = where or {}
+        partitions = index.select(self.collections, where, fallback=fallback)
+        if not partitions:
+            return []
+        rest = {field: value for field, value in where.items() if field not in PARTITION_FIELDS}
+        allowed = self.positions(rest, snapshot) if rest else None
+        if positions is not None:
+            allowed = positions if allowed is None else np.intersect1d(allowed, positions, assume_unique=True)
+        if allowed is not None and not len(allowed):
+            return []
+
+        # Collections embedded by different providers live in different
+        # vector spaces; each is searched with its own query vector and the
+        # rankings are fused, since their distances are not comparable
+        by_provider = {}
+        for partition in partitions:
+            by_provider.setdefault(snapshot.embedding(partition.key[0]), []).append(partition)
+
+        def dense_search(text, k):
+            rankings = []
+            for provider, group in by_provider.items():
+                query_vector = get_query_cache().embed_query(
+                    text, lambda t, provider=provider: embed_text(t, provider), provider).reshape(1, -1)
+                rankings.append(index.dense_search(group, query_vector, k, allowed))
+            if len(rankings) == 1:
+                return rankings[0]
+            return reciprocal_rank_fusion(rankings)[:k]
+
+        cache_name = f"{self.name}:{sorted(where.items())}:{fallback}"
+        if positions is not None:
+            cache_name += f":{zlib.crc32(np.asarray(positions, dtype='int64').tobytes()):08x}"
+        lexical_index = index.lexical(partitions)
+        try:
+            return get_query_cache().search(
+                cache_name, snapshot.version, query, top_k, mode or RETRIEVAL_MODE,
+                lambda: hybrid_rank(query, top_k, dense_search, lexical_index, mode=mode, positions=allowed)
+            )
+        except EmbeddingError as e:
+            # Degrade to BM25 for this query only; the result is not cached
+            logger.warning(f"Could not embed query, using lexical retrieval: {str(e)}")
+            return hybrid_rank(query, top_k, dense_search, lexical_index, mode="lexical", positions=allowed)
+
+    def _documents(self, where: Dict[str, Any], fallback: bool, snapshot: IndexSnapshot) -> List[Document]:
+        """Return the documents search would read for a filter"""
+        keys = {partition.key for partition in snapshot.partitions.select(self.collections, where, fallback=fallback)}
+        rest = {field: value for field, value in where.items() if field not in PARTITION_FIELDS}
+        return [
+            doc for doc in snapshot.store.documents.values()
+            if doc.collection in self.collections
+            and partition_key(doc.collection, doc.metadata) in keys
+            and all(doc.metadata.get(field) == value for field, value in rest.items())
+        ]
+
+    def _tree_vectors(self, provider: str, snapshot: IndexSnapshot) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Return {doc_id: (summary vector, section vectors)} for summarised documents in one space
+
+        Summaries were embedded at ingestion, so this reads the embedding
+        cache; it only calls the provider after the cache was cleared.
+
+        Raises:
+            EmbeddingError: If a summary could not be embedded
+        """
+        version, cache = self._trees
+        if version != snapshot.version:
+            cache = {}
+            self._trees = (snapshot.version, cache)
+
+        if provider not in cache:
+            docs = [doc for doc in snapshot.store.documents.values()
+                    if doc.collection in self.collections and doc.summary
+                    and snapshot.embedding(doc.collection) == provider]
+            texts = [text for doc in docs for text in [doc.summary] + [section[2] for section in doc.sections]]
+            vectors = embed_texts(texts, provider)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            trees = {}
+            offset = 0
+            for doc in docs:
+                trees[doc.doc_id] = (vectors[offset], vectors[offset + 1:offset + 1 + len(doc.sections)])
+                offset += 1 + len(doc.sections)
+            cache[provider] = trees
+        return cache[provider]
+
+    def _descend(self, query: str, docs: List[Document],
+                 snapshot: IndexSnapshot) -> Tuple[List[Document], List[Tuple[Document, int]]]:
+        """Rank summarised documents, then the sections of the best ones
+
+        Summaries in different embedding spaces are not comparable, so the
+        best TREE_DOCUMENTS are kept per space.
+
+        Returns:
+            (kept documents, best first; their best TREE_SECTIONS sections
+            as (document, section number), best first)
+
+        Raises:
+            EmbeddingError: If the query or a summary could not be embedded
+        """
+        by_provider = {}
+        for doc in docs:
+            if doc.summary:
+                by_provider.setdefault(snapshot.embedding(doc.collection), []).append(doc)
+
+        kept = []
+        sections = []
+        for provider, group in by_provider.items():
+            trees = self._tree_vectors(provider, snapshot)
+            query_vector = get_query_cache().embed_query(
+                query, lambda t, provider=provider: embed_text(t, provider), provider)
+            query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+            scores = [float(trees[doc.doc_id][0] @ query_vector) for doc in group]
+            for i in np.argsort(scores)[::-1][:TREE_DOCUMENTS]:
+                doc = group[i]
+                kept.append((scores[i], doc))
+                section_scores = trees[doc.doc_id][1] @ query_vector
+                sections.extend((float(score), doc, number) for number, score in enumerate(section_scores))
+
+        kept.sort(key=lambda item: -item[0])
+        sections.sort(key=lambda item: -item[0])
+        return [doc for _, doc in kept], [(doc, number) for _, doc, number in sections[:TREE_SECTIONS]]
+
+    def search_tree(self,
+                    query: str,
+                    top_k: int,
+                    mode: Optional[str] = None,
+                    where: Optional[Dict[str, Any]] = None,
+                    fallback: bool = False,
+                    snapshot: Optional[IndexSnapshot] = None) -> List[int]:
+        """Return positions of the most relevant chunks, descending document -> section -> chunk
+
+        Summarised documents are ranked by their summaries and only the
+        chunks of the best-matching sections are searched; documents without
+        a summary tree are searched whole. Takes the same arguments as
+        search, and is search when no matching document has a tree or the
+        query cannot be embedded.
+        """
+        snapshot = snapshot or self.corpus.snapshot
+        where = where or {}
+        docs = self._documents(where, fallback, snapshot)
+        if not any(doc.summary for doc in docs):
+            return self.search(query, top_k, mode, where, fallback, snapshot)
+        try:
+            _, sections = self._descend(query, docs, snapshot)
+        except EmbeddingError as e:
+            logger.warning(f"Could not search summaries, searching all chunks: {str(e)}")
+            return self.search(query, top_k, mode, where, fallback, snapshot)
+
+        store = snapshot.store
+        candidates = [store.positions_for({doc.doc_id for doc in docs if not doc.summary})]
+        for doc, number in sections:
+            first, end, _ = doc.sections[number]
+            ids = store.chunk_ids(doc.doc_id)
+            index = store.chunk_index[ids]
+            candidates.append(ids[(index >= first) & (index < end)])
+        positions = np.unique(np.concatenate(candidates))
+        return self.search(query, top_k, mode, where, fallback, snapshot, positions=positions)
+
+    def summaries(self,
+                  query: str,
+                  where: Optional[Dict[str, Any]] = None,
+                  fallback: bool = False,
+                  snapshot: Optional[IndexSnapshot] = None) -> List[Dict[str, Any]]:
+        """Return the summaries best matching a query, for broad questions
+
+        Each of the best-matching documents contributes its summary, followed
+        by its best-matching section summaries.
+
+        Returns:
+            Records with the document's metadata, doc_id, collection,
+            "section" (None for the document summary) and "text"; empty
+            when no matching document has a tree or the query cannot be
+            embedded
+        """
+        snapshot = snapshot or self.corpus.snapshot
+        docs = self._documents(where or {}, fallback, snapshot)
+        if not any(doc.summary for doc in docs):
+            return []
+        try:
+            kept, sections = self._descend(query, docs, snapshot)
+        except EmbeddingError as e:
+            logger.warning(f"Could not search summaries: {str(e)}")
+            return []
+
+        records = []
+        for doc in kept:
+            texts = [(None, doc.summary)]
+            texts.extend((number, doc.sections[number][2]) for section_doc, number in sections if section_doc is doc)
+            for section, text in texts:
+                record = dict(doc.metadata)
+                record.update({"doc_id": doc.doc_id, "collection": doc.collection,
+                               "section": section, "text": text})
+                records.append(record)
+        return records
+
+    def chunk(self, position: int, snapshot: Optional[IndexSnapshot] = None) -> Dict[str, Any]:
+        """Return a chunk's text together with its document's metadata"""
+        store = (snapshot or self.corpus.snapshot).store
+        doc = store.document(position)
+        record = dict(doc.metadata)
+        record.update({
+            "doc_id": doc.doc_id,
+            "chunk_id": int(store.chunk_index[position]),
+            "collection": doc.collection,
+            "start": int(store.starts[position]),
+            "end": int(store.ends[position]),
+            "text": store.text(position)
+        })
+        return record
+
+    def document_text(self, doc_id: str, snapshot: Optional[IndexSnapshot] = None) -> str:
+        """Return the full extracted text of a document"""
+        return (snapshot or self.corpus.snapshot).document_text(doc_id)
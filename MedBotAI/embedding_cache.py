@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent Embedding Cache for MedBot AI
+- Content-addressed: keyed by (model name, SHA-256 of the normalized text)
+- Stored in SQLite so it survives restarts and is shared between workers
+- LRU eviction once the cache grows past a configurable number of entries
+- Hit/miss counters for monitoring
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+CACHE_PATH = os.getenv(
+    "MEDBOT_EMBEDDING_CACHE",
+    os.path.join(os.path.dirname(__file__), "cache", "embeddings.sqlite3")
+)
+MAX_ENTRIES = int(os.getenv("MEDBOT_EMBEDDING_CACHE_ENTRIES", 200000))
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+# Global cache instance
+_embedding_cache = None
+
+def normalize_text(text: str) -> str:
+    """Collapse runs of whitespace so formatting-only differences share a key"""
+    return " ".join(text.split())
+
+def text_key(text: str) -> str:
+    """Return the cache key for a text"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache with LRU eviction"""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MAX_ENTRIES):
+        """Open (or create) the cache
+
+        Args:
+            path: SQLite database file
+            max_entries: Number of entries kept before least recently used ones are evicted
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings for a list of texts
+
+        Returns:
+            One entry per text: the cached vector, or None on a miss
+        """
+        keys = [text_key(text) for text in texts]
+        found = {}
+        conn = self._connection()
+        unique_keys = list(set(keys))
+        for start in range(0, len(unique_keys), _LOOKUP_BATCH):
+            batch = unique_keys[start:start + _LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                [model] + batch
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype="float32")
+
+        if found:
+            # Refresh recency for LRU eviction
+            now = time.time()
+            with conn:
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                    [(now, model, key) for key in found]
+                )
+
+        results = [found.get(key) for key in keys]
+        hits = sum(1 for vector in results if vector is not None)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, model: str, texts: List[str], vectors: np.ndarray) -> None:
+        """Store embeddings for a list of texts"""
+        if not len(texts):
+            return
+        now = time.time()
+        vectors = np.asarray(vectors, dtype="float32")
+        rows = [
+            (model, text_key(text), vectors.shape[1], vectors[i].tobytes(), now)
+            for i, text in enumerate(texts)
+        ]
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used entries beyond ``max_entries``
+
+        Returns:
+            Number of entries evicted
+        """
+        conn = self._connection()
+        count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        with conn:
+            conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+        with self._lock:
+            self.evictions += excess
+        logger.info(f"Evicted {excess} embeddings from cache")
+        return excess
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size of the cache"""
+        conn = self._connection()
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_entries": self.max_entries
+        }
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get the process-wide embedding cache, opening it on first use"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
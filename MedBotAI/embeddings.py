@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared Embedding Service for MedBot AI
+- Pluggable providers named "<backend>:<model>":
+  - "openai:<model>" packs many inputs into each /v1/embeddings request, up
+    to a token budget, with a bounded number of requests in flight;
+    "openai:<model>@<dimensions>" asks text-embedding-3 models for shorter
+    vectors
+  - "local:<model>" encodes in batches on the CPU with a sentence-transformers
+    model loaded once per process, so no network round-trip is needed
+- Returns vectors in input order as a float32 NumPy array
+- Reads through the persistent embedding cache, so only misses are computed
+- OpenAI requests pass a requests/tokens-per-minute limiter and are retried
+  with exponential backoff, honouring Retry-After on 429s
+- Texts that still fail are reported to the caller, never returned as
+  placeholder vectors
+- Used by the RAG pipeline, the flashcard generator and the exam generator
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from abc import ABC, abstractmethod
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
+import tiktoken
+from dotenv import load_dotenv
+
+from embedding_cache import get_embedding_cache
+from rate_limit import get_rate_limiter
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+EMBEDDINGS_URL = "https://api.openai.com/v1/embeddings"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_DIM = 1536
+# Output sizes of the OpenAI embedding models
+OPENAI_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072
+}
+# Default provider; collections can choose their own (see corpus.COLLECTIONS)
+EMBEDDING_PROVIDER = os.getenv("MEDBOT_EMBEDDING_PROVIDER", f"openai:{EMBEDDING_MODEL}")
+
+# The sentence-transformers model study_calendar already uses; a local path also works
+LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+LOCAL_BATCH_SIZE = int(os.getenv("MEDBOT_LOCAL_EMBED_BATCH", 64))
+LOCAL_DEVICE = os.getenv("MEDBOT_LOCAL_EMBED_DEVICE", "cpu")
+
+# Per-input limit of the embedding model; longer inputs are truncated
+MAX_INPUT_TOKENS = 8191
+# Upper bounds for a single request
+MAX_BATCH_TOKENS = int(os.getenv("MEDBOT_EMBED_BATCH_TOKENS", 100000))
+MAX_BATCH_INPUTS = int(os.getenv("MEDBOT_EMBED_BATCH_INPUTS", 2048))
+# Number of embedding requests allowed in flight at once
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MEDBOT_EMBED_CONCURRENCY", 4))
+REQUEST_TIMEOUT = 60
+# Account limits the client paces itself to (per model)
+REQUESTS_PER_MINUTE = int(os.getenv("MEDBOT_EMBED_RPM", 3000))
+TOKENS_PER_MINUTE = int(os.getenv("MEDBOT_EMBED_TPM", 1000000))
+# Retries for rate limits, server errors and dropped connections
+MAX_RETRIES = int(os.getenv("MEDBOT_EMBED_MAX_RETRIES", 6))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_encoding = None
+_session = requests.Session()
+
+# Provider instances by name
+_providers = {}
+_providers_lock = threading.Lock()
+
+def get_encoding():
+    """Return the cl100k_base tokenizer, loading it once per process"""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+def _prepare_input(text: str) -> Tuple[str, int]:
+    """Return the text to send for one input and its token count
+
+    The API rejects empty strings and inputs over the model's token limit,
+    so empty inputs become a single space and long inputs are truncated.
+    """
+    if not text or not text.strip():
+        return " ", 1
+    tokens = get_encoding().encode(text, disallowed_special=())
+    if len(tokens) > MAX_INPUT_TOKENS:
+        tokens = tokens[:MAX_INPUT_TOKENS]
+        return get_encoding().decode(tokens), len(tokens)
+    return text, len(tokens)
+
+def make_batches(token_counts: List[int]) -> List[List[int]]:
+    """Group input positions into batches that respect the request limits
+
+    Args:
+        token_counts: Token count of each input
+
+    Returns:
+        List of batches, each a list of input positions
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for position, num_tokens in enumerate(token_counts):
+        if batch and (batch_tokens + num_tokens > MAX_BATCH_TOKENS or len(batch) >= MAX_BATCH_INPUTS):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(position)
+        batch_tokens += num_tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+class EmbeddingError(Exception):
+    """Raised when some texts could not be embedded"""
+
+    def __init__(self, message: str, failed: List[int]):
+        super().__init__(message)
+        self.failed = failed
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    """Seconds the server asked us to wait, from retry-after-ms or Retry-After"""
+    value = resp.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        # HTTP-date form
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+def _request_embeddings(inputs: List[str], model: str, num_tokens: int = 0,
+                        dimensions: Optional[int] = None) -> Optional[np.ndarray]:
+    """Send one /v1/embeddings request and return its vectors in input order
+
+    Every attempt first takes a request and ``num_tokens`` tokens from the
+    model's rate limiter. Rate limits, server errors and connection errors
+    are retried up to MAX_RETRIES times; a 429 with Retry-After pauses every
+    thread using the model for that long.
+
+    Returns:
+        The vectors, or None if the request failed
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"
+    }
+    payload = {
+        "input": inputs,
+        "model": model
+    }
+    if dimensions:
+        payload["dimensions"] = dimensions
+    limiter = get_rate_limiter(model, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire(num_tokens)
+        try:
+            resp = _session.post(EMBEDDINGS_URL, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error, delay = str(e), _backoff(attempt)
+        else:
+            if resp.status_code == 200:
+                try:
+                    data = resp.json()["data"]
+                    # The API tags every vector with the position of its input
+                    data.sort(key=lambda item: item["index"])
+                    return np.array([item["embedding"] for item in data], dtype="float32")
+                except Exception as e:
+                    logger.error(f"Malformed embeddings response for {len(inputs)} inputs: {str(e)}")
+                    return None
+            error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+            if resp.status_code not in RETRYABLE_STATUS:
+                logger.error(f"Failed to get embeddings for a batch of {len(inputs)} inputs: {error}")
+                return None
+            delay = _retry_after(resp)
+            if delay is None:
+                delay = _backoff(attempt)
+            elif resp.status_code == 429:
+                limiter.pause(delay)
+
+        if attempt < MAX_RETRIES:
+            logger.warning(f"Embedding request failed ({error}); retry {attempt + 1}/{MAX_RETRIES} "
+                           f"in {delay:.1f}s")
+            time.sleep(delay)
+
+    logger.error(f"Failed to get embeddings for a batch of {len(inputs)} inputs after "
+                 f"{MAX_RETRIES} retries: {error}")
+    return None
+
+class EmbeddingProvider(ABC):
+    """An embedding backend and model
+
+    Subclasses implement dimension and embed_batches; caching and input
+    ordering are handled by embed_texts.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def name(self) -> str:
+        return f"{self.backend}:{self.model}"
+
+    @property
+    def cache_key(self) -> str:
+        """Model name the embedding cache stores this provider's vectors under"""
+        return self.name
+
+    @property
+    @abstractmethod
+    def dimension(self) -> int:
+        """Size of the vectors this provider returns"""
+
+    @abstractmethod
+    def embed_batches(self, texts: List[str]) -> Iterator[Tuple[List[int], Optional[np.ndarray]]]:
+        """Embed texts, yielding (positions, vectors) per batch; vectors is None if the batch failed"""
+
+class OpenAIProvider(EmbeddingProvider):
+    """Embeddings from the OpenAI /v1/embeddings endpoint
+
+    A model written "text-embedding-3-small@512" requests 512-dimensional
+    vectors; each size is a separate embedding space.
+    """
+
+    backend = "openai"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        api_model, _, dimensions = model.partition("@")
+        self.api_model = api_model
+        self.dimensions = int(dimensions) if dimensions else None
+
+    @property
+    def cache_key(self) -> str:
+        # Bare model name, as cached before providers were pluggable
+        return self.model
+
+    @property
+    def dimension(self) -> int:
+        return self.dimensions or OPENAI_DIMENSIONS.get(self.api_model, EMBEDDING_DIM)
+
+    def embed_batches(self, texts: List[str]) -> Iterator[Tuple[List[int], Optional[np.ndarray]]]:
+        prepared = [_prepare_input(text) for text in texts]
+        batches = make_batches([num_tokens for _, num_tokens in prepared])
+        jobs = [([prepared[i][0] for i in batch], sum(prepared[i][1] for i in batch))
+                for batch in batches]
+
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(batches))) as executor:
+            results = executor.map(lambda job: _request_embeddings(job[0], self.api_model, job[1],
+                                                                   self.dimensions), jobs)
+            yield from zip(batches, results)
+
+class LocalProvider(EmbeddingProvider):
+    """Embeddings computed in-process with a sentence-transformers model
+
+    Inputs longer than the model's max_seq_length (256 word pieces for
+    MiniLM) are truncated by the model.
+    """
+
+    backend = "local"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self._model = None
+        # Loading and encoding are serialized; encoding already uses every core
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            logger.info(f"Loading local embedding model {self.model}")
+            self._model = SentenceTransformer(self.model, device=LOCAL_DEVICE)
+        return self._model
+
+    @property
+    def dimension(self) -> int:
+        with self._lock:
+            return self._load().get_sentence_embedding_dimension()
+
+    def embed_batches(self, texts: List[str]) -> Iterator[Tuple[List[int], Optional[np.ndarray]]]:
+        try:
+            with self._lock:
+                vectors = self._load().encode(texts, batch_size=LOCAL_BATCH_SIZE, show_progress_bar=False,
+                                              convert_to_numpy=True, normalize_embeddings=True)
+            yield list(range(len(texts))), np.asarray(vectors, dtype="float32")
+        except Exception as e:
+            logger.error(f"Failed to embed {len(texts)} inputs with {self.model}: {str(e)}")
+            yield list(range(len(texts))), None
+
+PROVIDERS = {
+    "openai": OpenAIProvider,
+    "local": LocalProvider
+}
+
+def get_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """Return the provider for a name such as "local:all-MiniLM-L6-v2"
+
+    A name without a backend prefix is an OpenAI model.
+    """
+    name = name or EMBEDDING_PROVIDER
+    backend, separator, model = name.partition(":")
+    if not separator:
+        backend, model = "openai", name
+    if backend not in PROVIDERS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    key = f"{backend}:{model}"
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = PROVIDERS[backend](model)
+        return _providers[key]
+
+def try_embed_texts(texts: List[str], provider: Optional[str] = None) -> Tuple[np.ndarray, List[int]]:
+    """Embed a list of texts in as few batches as possible, reporting failures
+
+    Cached embeddings are served from the embedding cache; only the
+    remaining texts are sent to the provider, and their results are cached.
+
+    Args:
+        texts: Texts to embed
+        provider: Provider name; defaults to MEDBOT_EMBEDDING_PROVIDER
+
+    Returns:
+        float32 array of shape (len(texts), dimension), in input order, and
+        the positions of texts that could not be embedded. Their rows are
+        zero and must not be used.
+    """
+    provider = get_provider(provider)
+    vectors = np.zeros((len(texts), provider.dimension), dtype="float32")
+    if not texts:
+        return vectors, []
+
+    cache = get_embedding_cache()
+    missing = []
+    for position, cached in enumerate(cache.get_many(provider.cache_key, texts)):
+        if cached is None:
+            missing.append(position)
+        else:
+            vectors[position] = cached
+    if not missing:
+        return vectors, []
+
+    failed = []
+    num_batches = 0
+    for batch, batch_vectors in provider.embed_batches([texts[position] for position in missing]):
+        num_batches += 1
+        positions = [missing[i] for i in batch]
+        if batch_vectors is None:
+            failed.extend(positions)
+            continue
+        vectors[positions] = batch_vectors
+        cache.put_many(provider.cache_key, [texts[p] for p in positions], batch_vectors)
+
+    logger.debug(f"Embedded {len(missing) - len(failed)} of {len(texts)} texts in {num_batches} batches "
+                 f"with {provider.name} ({len(failed)} failed)")
+    return vectors, sorted(failed)
+
+def embed_texts(texts: List[str], provider: Optional[str] = None) -> np.ndarray:
+    """Embed a list of texts; like try_embed_texts, but all must succeed
+
+    Returns:
+        float32 array of shape (len(texts), dimension), in input order
+
+    Raises:
+        EmbeddingError: If any text could not be embedded
+    """
+    vectors, failed = try_embed_texts(texts, provider)
+    if failed:
+        raise EmbeddingError(f"Failed to embed {len(failed)} of {len(texts)} texts", failed)
+    return vectors
+
+def embed_text(text: str, provider: Optional[str] = None) -> np.ndarray:
+    """Embed a single text
+
+    Returns:
+        float32 array of shape (dimension,)
+
+    Raises:
+        EmbeddingError: If the text could not be embedded
+    """
+    return embed_texts([text], provider=provider)[0]
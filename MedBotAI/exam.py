@@ -2,24 +2,18 @@ import os
 import logging
 import json
 import datetime
-import io
 from pathlib import Path
 import time
 
 import requests
-import numpy as np
-import faiss
-import fitz  # PyMuPDF
-import tiktoken
-import pytesseract
-from PIL import Image
-from rank_bm25 import BM25Okapi
 
 from flask import Flask, request, jsonify, render_template, Blueprint, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 
+from corpus import COLLECTIONS, CorpusView, get_corpus
+
 # -------------------------------------------------
 # Setup Logging
 # -------------------------------------------------
@@ -48,12 +42,11 @@ FEEDBACK_FILE = "feedback_history.json"
 STUDENT_DATA_FILE = "student_data.json"
 student_profiles = {}
 
-# The FAISS index and list of exam chunks from your PDFs
-exam_index = None
-practice_exams = []
+# View of the exam collection in the shared corpus
+exam_view = None
 
 # Where your exam PDFs are located
-EXAMS_FOLDER = "exams"
+EXAMS_FOLDER = COLLECTIONS["exams"]["directory"]
 
 # -------------------------------------------------
 # File Upload Configuration (Optional)
@@ -132,181 +125,33 @@ def get_student_difficulty(student_id):
         return student_profiles[student_id].get("difficulty_preference", "Medium")
     return "Medium"
 
-# -------------------------------------------------
-# PDF Text Extraction (with OCR fallback)
-# -------------------------------------------------
-def extract_text_with_ocr(pdf_path):
-    """
-    Extracts text from a PDF using PyMuPDF. If a page is effectively empty,
-    fallback to Tesseract OCR.
-    """
-    text_data = []
-    try:
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                page_text = page.get_text("text").strip()
-                if not page_text:
-                    # fallback to OCR
-                    pix = page.get_pixmap()
-                    img = Image.open(io.BytesIO(pix.tobytes()))
-                    page_text = pytesseract.image_to_string(img)
-                if len(page_text) > 50:
-                    text_data.append(page_text)
-    except Exception as e:
-        logger.error(f"Failed to read or OCR {pdf_path}: {str(e)}")
-    return "\n".join(text_data)
-
-# -------------------------------------------------
-# Chunking & Direct Embeddings (via requests)
-# -------------------------------------------------
-embedding_cache = {}
-
-def chunk_text(text, max_tokens=500):
-    """
-    Splits text into chunks, ensuring each chunk is <= max_tokens tokens,
-    based on the tiktoken 'cl100k_base' tokenizer.
-    """
-    encoding = tiktoken.get_encoding("cl100k_base")
-    words = text.split()
-    chunks = []
-    chunk = []
-    token_count = 0
-
-    for word in words:
-        word_tokens = len(encoding.encode(word))
-        if token_count + word_tokens > max_tokens:
-            chunks.append(" ".join(chunk))
-            chunk = []
-            token_count = 0
-        chunk.append(word)
-        token_count += word_tokens
-
-    if chunk:
-        chunks.append(" ".join(chunk))
-
-    return chunks
-
-def call_openai_embedding(text):
-    """
-    Calls the /v1/embeddings endpoint via requests, bypassing openai.Embedding.
-    """
-    if text in embedding_cache:
-        return embedding_cache[text]
-
-    url = "https://api.openai.com/v1/embeddings"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OPENAI_API_KEY}"
-    }
-    payload = {
-        "input": text,
-        "model": "text-embedding-ada-002"
-    }
-
-    try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
-        resp.raise_for_status()
-        data = resp.json()
-        emb = data["data"][0]["embedding"]
-        embedding_cache[text] = emb
-        return emb
-    except Exception as e:
-        logger.error(f"Failed to get embedding for text: {str(e)}")
-        # Return a dummy vector if there's an error
-        return [0.0]*1536
-
-# -------------------------------------------------
-# Build FAISS Index for Exam PDFs
-# -------------------------------------------------
-def store_exams_faiss(pdf_folder):
-    """
-    Extracts text from each PDF in pdf_folder, chunks it, calls embeddings,
-    and stores them in a FAISS index. Returns the index and the chunk list.
-    """
-    import faiss
-    d = 1536
-    index = faiss.IndexFlatL2(d)
-    exam_chunks = []
-
-    pdf_files = [os.path.join(pdf_folder, f) for f in os.listdir(pdf_folder)
-                 if f.lower().endswith(".pdf")]
-
-    # If no PDF files are found, create a dummy chunk
-    if not pdf_files:
-        logger.warning("No PDF files found in exams folder. Using a default template.")
-        dummy_text = """
-        Medical Exam
-        
-        Question 1: What is the primary function of the mitochondria?
-        A) Protein synthesis
-        B) Cellular respiration
-        C) DNA replication
-        D) Cell division
-        
-        Answer: B
-        Explanation: Mitochondria are known as the powerhouse of the cell and are responsible for cellular respiration, which produces ATP, the energy currency of the cell.
-        
-        Question 2: Which of the following is NOT a component of the limbic system?
-        A) Amygdala
-        B) Hippocampus
-        C) Cerebellum
-        D) Hypothalamus
-        
-        Answer: C
-        Explanation: The cerebellum is not part of the limbic system. It is responsible for motor control and coordination.
-        """
-        exam_chunks.append({
-            "file_name": "default_exam.pdf",
-            "chunk_text": dummy_text,
-            "full_text": dummy_text
-        })
-        
-        # Compute embedding for the dummy chunk
-        emb = call_openai_embedding(dummy_text)
-        index.add(np.array([emb]).astype("float32"))
-        return index, exam_chunks
-
-    all_embeddings = []
-    for pdf_path in pdf_files:
-        pdf_text = extract_text_with_ocr(pdf_path)
-        chunks = chunk_text(pdf_text)
-        for ch in chunks:
-            exam_chunks.append({
-                "file_name": os.path.basename(pdf_path),
-                "chunk_text": ch,
-                "full_text": pdf_text
-            })
-
-    # Compute embeddings for each chunk
-    for chunk_data in exam_chunks:
-        emb = call_openai_embedding(chunk_data["chunk_text"])
-        all_embeddings.append(emb)
-
-    index.add(np.array(all_embeddings).astype("float32"))
-    return index, exam_chunks
-
 # -------------------------------------------------
 # Retrieval
 # -------------------------------------------------
-def retrieve_practice_exam(query, exam_index, exam_chunks, top_k=1):
+def retrieve_practice_exam(query, view=None, top_k=1, mode=None, course=None):
     """
-    Searches the FAISS index for the chunk that best matches 'query',
-    then returns the 'full_text' from that chunk as the reference exam text.
+    Searches the exam collection (dense, BM25 or hybrid) for the chunk that
+    best matches 'query', then returns the full text of that chunk's
+    document as the reference exam text. With 'course', only that course's
+    exams are searched, falling back to every exam if it has none.
     """
-    if exam_index is None or not exam_chunks:
+    if view is None:
+        view = exam_view
+    if view is None or not len(view):
         logger.warning("No exam index or chunks available. Using an empty string.")
         return ""
 
     try:
-        query_emb = np.array([call_openai_embedding(query)]).astype("float32")
-        distances, indices = exam_index.search(query_emb, top_k)
+        snapshot = view.snapshot()
+        where = {"course": course} if course else None
+        positions = view.search(query, top_k, mode=mode, where=where, fallback=True, snapshot=snapshot)
 
-        if len(indices[0]) == 0:
+        if not positions:
             logger.warning("No matching chunks found. Using the first available chunk.")
-            return exam_chunks[0]["full_text"] if exam_chunks else ""
+            positions = view.positions(snapshot=snapshot)[:1]
 
-        top_chunk = exam_chunks[indices[0][0]]
-        return top_chunk["full_text"]
+        top_chunk = view.chunk(int(positions[0]), snapshot)
+        return snapshot.document_text(top_chunk["doc_id"])
     except Exception as e:
         logger.error(f"Error during exam retrieval: {str(e)}")
         return ""
@@ -352,7 +197,7 @@ def generate_practice_exam_realtime(course, exam_type, difficulty):
     global last_generated_exam
 
     # Retrieve the chunk that best matches the 'course'
-    exam_text = retrieve_practice_exam(course, exam_index, practice_exams)
+    exam_text = retrieve_practice_exam(course, course=course)
     
     # If no exam text is retrieved or it's too short, use a default template
     if not exam_text or len(exam_text) < 100:
@@ -460,17 +305,21 @@ def initialize_exam_materials():
     load_feedback()
     load_student_profiles()
 
-    # Build the FAISS index from exam PDFs
-    global exam_index, practice_exams
+    # Index the exam PDFs in the shared corpus
+    global exam_view
     
     # Create the exams folder if it doesn't exist
     if not os.path.exists(EXAMS_FOLDER):
         logger.warning(f"Exam folder not found: {EXAMS_FOLDER}. Creating it.")
         os.makedirs(EXAMS_FOLDER, exist_ok=True)
     
-    # Build the FAISS index
-    exam_index, practice_exams = store_exams_faiss(EXAMS_FOLDER)
-    logger.info(f"Exam index built with {len(practice_exams)} chunks.")
+    # Only exam files that changed since the corpus was last saved are re-processed
+    corpus = get_corpus()
+    corpus.ensure_synced("exams")
+    exam_view = CorpusView(corpus, ["exams"], name="exam")
+    if not len(exam_view):
+        logger.warning("No exam files found in exams folder. Using a default template.")
+    logger.info(f"Exam index built with {len(exam_view)} chunks.")
 
     logger.info("Initialization complete.")
     return True
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Document Text Extraction for MedBot AI
+- PDF text extraction with PyMuPDF
+- Tesseract OCR fallback for scanned pages, run on a thread pool with
+  configurable DPI, preprocessing and a per-page time budget
+- Plain text files
+- Files, and page ranges of large files, extracted on a process pool sized
+  to the available cores, with results streamed back in order
+- Page text and OCR output read through the persistent page cache, so an
+  unchanged document costs one hash pass and a cache read
+"""
+
+import io
+import os
+import hashlib
+import logging
+import time
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+
+from page_cache import PageText, file_sha256, get_page_cache
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+# Pages with less text than this are treated as noise and skipped
+MIN_PAGE_CHARS = 50
+
+# Bump whenever a change here would extract different text from the same
+# file; cached pages of other versions are then ignored
+EXTRACTOR_VERSION = 1
+EXTRACTOR = f"pymupdf-{fitz.VersionBind}/{EXTRACTOR_VERSION}"
+
+# Extraction processes; 1 extracts in the calling process
+EXTRACTION_WORKERS = int(os.getenv("MEDBOT_EXTRACTION_WORKERS", 0)) or os.cpu_count() or 1
+# Large PDFs are split into page ranges of this size so one file can use several cores
+PAGES_PER_TASK = int(os.getenv("MEDBOT_EXTRACTION_PAGES_PER_TASK", 8))
+# Page ranges submitted ahead of the consumer; bounds the extracted text held in memory
+MAX_PENDING_TASKS = int(os.getenv("MEDBOT_EXTRACTION_MAX_PENDING", 0)) or 2 * EXTRACTION_WORKERS
+
+# OCR runs Tesseract subprocesses from a thread pool in the main process
+OCR_WORKERS = int(os.getenv("MEDBOT_OCR_WORKERS", 0)) or os.cpu_count() or 1
+# Rendering resolution; Tesseract does best at around 300 DPI
+OCR_DPI = int(os.getenv("MEDBOT_OCR_DPI", 300))
+# "none", "grayscale" or "binarize" (grayscale, then a fixed threshold)
+OCR_PREPROCESS = os.getenv("MEDBOT_OCR_PREPROCESS", "grayscale")
+OCR_BINARIZE_THRESHOLD = int(os.getenv("MEDBOT_OCR_BINARIZE_THRESHOLD", 160))
+# Seconds Tesseract may spend on one page; timed-out pages are retried on a later run
+OCR_PAGE_TIMEOUT = float(os.getenv("MEDBOT_OCR_PAGE_TIMEOUT", 60))
+# A page is OCR'd only if its text layer has fewer characters than this and
+# it contains an image; pages without images have nothing to recognise.
+# Cached OCR text is kept until EXTRACTOR_VERSION changes, so changing the
+# OCR settings only affects pages that have not been OCR'd yet.
+OCR_MIN_TEXT_CHARS = int(os.getenv("MEDBOT_OCR_MIN_TEXT_CHARS", MIN_PAGE_CHARS))
+# OCR pages slower than this are logged as warnings
+OCR_SLOW_PAGE_SECONDS = float(os.getenv("MEDBOT_OCR_SLOW_PAGE_SECONDS", 10))
+
+if OCR_WORKERS > 1:
+    # Parallelism comes from the pool; stop each Tesseract from spawning threads too
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Global process and OCR pools
+_pool = None
+_ocr_pool = None
+_pool_lock = threading.Lock()
+
+# Recent per-page OCR timings, newest last
+_ocr_timings = deque(maxlen=1000)
+
+# ------------------------------------------------------------------------------
+# Page extraction (runs in the worker processes)
+# ------------------------------------------------------------------------------
+def _needs_ocr(page, text: str) -> bool:
+    """Cheap text-layer density check: little text, and at least one image to read it from"""
+    return len(text.strip()) < OCR_MIN_TEXT_CHARS and bool(page.get_images(full=False))
+
+def _render_page(page) -> bytes:
+    """Render a page for OCR at OCR_DPI with the configured preprocessing, as PNG"""
+    colorspace = fitz.csRGB if OCR_PREPROCESS == "none" else fitz.csGRAY
+    pix = page.get_pixmap(dpi=OCR_DPI, colorspace=colorspace)
+    if OCR_PREPROCESS != "binarize":
+        return pix.tobytes("png")
+    img = Image.open(io.BytesIO(pix.tobytes("png")))
+    img = img.point(lambda value: 255 if value > OCR_BINARIZE_THRESHOLD else 0).convert("1")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _extract_page_batch(pdf_path: str,
+                        page_numbers: List[int],
+                        ocr: bool) -> Tuple[Dict[int, PageText], Dict[int, bytes]]:
+    """Extract the text layer of some pages of a PDF
+
+    With ocr=True, pages that fail the density check are rendered for OCR;
+    the OCR itself runs in the main process.
+
+    Returns:
+        (pages, images): extracted pages, and rendered images of the pages to OCR
+    """
+    results = {}
+    images = {}
+    with fitz.open(pdf_path) as doc:
+        for page_number in page_numbers:
+            page = doc[page_number]
+            text = page.get_text("text")
+            ocr_text = None
+            if ocr:
+                if _needs_ocr(page, text):
+                    images[page_number] = _render_page(page)
+                else:
+                    # Nothing to recognise; record that so the page is not checked again
+                    ocr_text = ""
+            results[page_number] = PageText(text, ocr_text)
+    return results, images
+
+# ------------------------------------------------------------------------------
+# Process pool
+# ------------------------------------------------------------------------------
+def get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """Get the shared extraction pool, or None when extracting in-process"""
+    global _pool
+    if EXTRACTION_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # Forking this process would copy locks held by its other threads
+            # (Flask, faiss/OpenMP, SQLite) into workers, which can deadlock
+            # them. Workers come from a single-threaded fork server instead;
+            # it imports the main module and this one once, so each worker
+            # starts with them loaded.
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if context.get_start_method() == "forkserver":
+                context.set_forkserver_preload(["__main__", __name__])
+            _pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=context)
+            logger.info(f"Started extraction pool with {EXTRACTION_WORKERS} {context.get_start_method()} "
+                        f"processes")
+    return _pool
+
+def get_ocr_pool() -> ThreadPoolExecutor:
+    """Get the shared OCR thread pool"""
+    global _ocr_pool
+    with _pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix="ocr")
+    return _ocr_pool
+
+# ------------------------------------------------------------------------------
+# OCR
+# ------------------------------------------------------------------------------
+def _ocr_image(pdf_path: str, page_number: int, image: bytes) -> Optional[str]:
+    """OCR one rendered page within the time budget
+
+    Returns:
+        The recognised text, or None if Tesseract failed or ran out of time
+    """
+    started = time.perf_counter()
+    text = None
+    status = "ok"
+    try:
+        text = pytesseract.image_to_string(Image.open(io.BytesIO(image)), timeout=OCR_PAGE_TIMEOUT)
+    except RuntimeError as e:
+        # pytesseract raises RuntimeError when the timeout kills Tesseract
+        status = "timeout" if "timeout" in str(e).lower() else "error"
+        logger.warning(f"OCR {status} on page {page_number + 1} of {pdf_path}: {str(e)}")
+    except Exception as e:
+        status = "error"
+        logger.warning(f"OCR failed on page {page_number + 1} of {pdf_path}: {str(e)}")
+
+    seconds = time.perf_counter() - started
+    _ocr_timings.append({"file": pdf_path, "page": page_number + 1, "seconds": seconds,
+                         "status": status, "finished": time.time()})
+    if seconds > OCR_SLOW_PAGE_SECONDS:
+        logger.warning(f"Slow OCR: page {page_number + 1} of {pdf_path} took {seconds:.1f}s")
+    return text
+
+def ocr_timings(file_path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Return recent per-page OCR timings, optionally for one file, slowest first"""
+    timings = [t for t in list(_ocr_timings) if file_path is None or t["file"] == file_path]
+    return sorted(timings, key=lambda t: t["seconds"], reverse=True)
+
+def _ocr_batch(pdf_path: str, extracted: Future) -> Future:
+    """Chain OCR of a batch's rendered pages onto its extraction
+
+    Returns:
+        A future for the batch's pages, resolved once every page is OCR'd
+    """
+    done = Future()
+
+    def on_extracted(future):
+        try:
+            pages, images = future.result()
+        except BaseException as e:
+            done.set_exception(e)
+            return
+        if not images:
+            done.set_result(pages)
+            return
+
+        remaining = [len(images)]
+        lock = threading.Lock()
+
+        def on_recognised(page_number, ocr_future):
+            with lock:
+                # _ocr_image never raises; None leaves the page to be retried later
+                pages[page_number] = pages[page_number]._replace(ocr_text=ocr_future.result())
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                done.set_result(pages)
+
+        for page_number, image in images.items():
+            ocr_future = get_ocr_pool().submit(_ocr_image, pdf_path, page_number, image)
+            ocr_future.add_done_callback(lambda f, n=page_number: on_recognised(n, f))
+
+    extracted.add_done_callback(on_extracted)
+    return done
+
+def _submit(pool: Optional[ProcessPoolExecutor], task: Tuple[str, List[int], bool]) -> Future:
+    """Start extracting a batch on the pool (or in-process) and OCR it as soon as it is extracted"""
+    if pool is not None:
+        extracted = pool.submit(_extract_page_batch, *task)
+    else:
+        extracted = Future()
+        try:
+            extracted.set_result(_extract_page_batch(*task))
+        except Exception as e:
+            extracted.set_exception(e)
+    return _ocr_batch(task[0], extracted)
+
+def _stream_tasks(tasks: Iterable[Tuple[str, List[int], bool]]) -> Iterator[Dict[int, PageText]]:
+    """Run (pdf_path, page_numbers, ocr) tasks and yield their results in submission order
+
+    At most MAX_PENDING_TASKS tasks are in flight, so a slow consumer does
+    not let extracted text pile up in memory. OCR of one batch overlaps
+    with extraction of the next ones.
+    """
+    pool = get_extraction_pool()
+    pending = deque()
+    try:
+        for task in tasks:
+            if len(pending) >= MAX_PENDING_TASKS:
+                yield pending.popleft().result()
+            pending.append(_submit(pool, task))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+# ------------------------------------------------------------------------------
+# Cached extraction
+# ------------------------------------------------------------------------------
+def _needs_extraction(entry: Optional[PageText], ocr: bool) -> bool:
+    return entry is None or (ocr and entry.ocr_text is None and len(entry.text.strip()) < OCR_MIN_TEXT_CHARS)
+
+def page_text(entry: PageText, ocr: bool = False) -> str:
+    """Return the text of a cached page, preferring OCR output for sparse text layers"""
+    if ocr and entry.ocr_text:
+        return entry.ocr_text
+    return entry.text.strip()
+
+class _PdfPlan:
+    """The pages of one PDF still to be extracted after consulting the page cache"""
+
+    def __init__(self, pdf_path: str, ocr: bool, digest: Optional[str] = None):
+        self.pdf_path = pdf_path
+        self.ocr = ocr
+        self.digest = digest or file_sha256(pdf_path)
+        page_count, self.pages = get_page_cache().get_document(self.digest, EXTRACTOR)
+        if page_count is None:
+            with fitz.open(pdf_path) as doc:
+                page_count = doc.page_count
+        self.page_count = page_count
+        missing = [n for n in range(page_count) if _needs_extraction(self.pages.get(n), ocr)]
+        self.missing = set(missing)
+        self.batches = [missing[start:start + PAGES_PER_TASK]
+                        for start in range(0, len(missing), PAGES_PER_TASK)]
+
+    def tasks(self) -> Iterator[Tuple[str, List[int], bool]]:
+        return ((self.pdf_path, batch, self.ocr) for batch in self.batches)
+
+    def iter_texts(self, results: Iterator[Dict[int, PageText]]) -> Iterator[str]:
+        """Yield every page's text in order, taking this plan's batches from ``results``
+
+        Each batch is written to the page cache as soon as it arrives.
+        """
+        started = time.time()
+        fetched = set()
+        for page_number in range(self.page_count):
+            if page_number in self.missing and page_number not in fetched:
+                extracted = next(results)
+                get_page_cache().put_pages(self.digest, EXTRACTOR, self.page_count, extracted)
+                self.pages.update(extracted)
+                fetched.update(extracted)
+            yield page_text(self.pages[page_number], self.ocr)
+
+        if self.ocr and self.missing:
+            timings = [t for t in ocr_timings(self.pdf_path) if t["finished"] >= started]
+            if timings:
+                ocr_seconds = sum(t["seconds"] for t in timings)
+                slowest = timings[0]
+                failed = sum(1 for t in timings if t["status"] != "ok")
+                logger.info(f"OCR'd {len(timings)} of {self.page_count} pages of {self.pdf_path} "
+                            f"in {time.time() - started:.1f}s ({ocr_seconds:.1f}s of OCR, "
+                            f"slowest page {slowest['page']} at {slowest['seconds']:.1f}s, "
+                            f"{failed} failed or timed out)")
+
+# ------------------------------------------------------------------------------
+# Public API
+# ------------------------------------------------------------------------------
+def iter_pdf_pages(pdf_path: str, ocr: bool = False, digest: Optional[str] = None) -> Iterator[str]:
+    """
+    Yields the text of each page of a PDF in page order, whether or not it
+    is substantial. Uncached pages are extracted in parallel on the pool.
+    """
+    plan = _PdfPlan(pdf_path, ocr, digest)
+    yield from plan.iter_texts(_stream_tasks(plan.tasks()))
+
+def extract_pdf_pages(pdf_path, ocr=False, digest=None):
+    """
+    Extracts the text of each substantial page of a PDF using PyMuPDF.
+    With ocr=True, pages without a text layer fall back to Tesseract OCR.
+    """
+    # Only keep substantial chunks
+    return [text for text in iter_pdf_pages(pdf_path, ocr=ocr, digest=digest) if len(text) > MIN_PAGE_CHARS]
+
+def extract_pdf_bytes(data: bytes) -> List[str]:
+    """Returns the raw text layer of every page of an in-memory PDF, read through the page cache"""
+    digest = hashlib.sha256(data).hexdigest()
+    page_count, pages = get_page_cache().get_document(digest, EXTRACTOR)
+    if page_count is None or len(pages) < page_count:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            page_count = doc.page_count
+            extracted = {n: PageText(doc[n].get_text("text"))
+                         for n in range(page_count) if n not in pages}
+        get_page_cache().put_pages(digest, EXTRACTOR, page_count, extracted)
+        pages.update(extracted)
+    return [pages[n].text for n in range(page_count)]
+
+def _read_text_file(file_path):
+    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+def extract_pages(file_path, ocr=False, digest=None):
+    """Extracts the page texts of a .pdf file, or the whole of a .txt file as one page."""
+    file_ext = Path(file_path).suffix.lower()
+    if file_ext == ".txt":
+        return [_read_text_file(file_path)]
+    if file_ext == ".pdf":
+        return extract_pdf_pages(file_path, ocr=ocr, digest=digest)
+    raise ValueError(f"Unsupported file type: {file_ext}")
+
+def extract_many(file_paths: List[str],
+                 ocr: bool = False,
+                 digests: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, Optional[List[str]], Optional[Exception]]]:
+    """Extract several files in parallel, yielding results in input order
+
+    Uncached pages of every PDF share one bounded stream of pool tasks, so
+    small files run side by side and large files are split across cores.
+
+    Args:
+        file_paths: .pdf and .txt files to extract
+        ocr: Fall back to OCR for pages without a text layer
+        digests: Content hashes already computed, by file path
+
+    Yields:
+        (file_path, pages, error) tuples; pages is None when error is set
+    """
+    digests = digests or {}
+
+    # Plan each file up front; a file that cannot be opened is reported in order
+    plans = []
+    for file_path in file_paths:
+        file_ext = Path(file_path).suffix.lower()
+        try:
+            if file_ext == ".txt":
+                plans.append((file_path, None, None))
+            elif file_ext == ".pdf":
+                plans.append((file_path, _PdfPlan(file_path, ocr, digests.get(file_path)), None))
+            else:
+                raise ValueError(f"Unsupported file type: {file_ext}")
+        except Exception as e:
+            plans.append((file_path, None, e))
+
+    def tasks_from(first):
+        return (task for _, plan, _ in plans[first:] if plan is not None for task in plan.tasks())
+
+    results = _stream_tasks(tasks_from(0))
+    for position, (file_path, plan, error) in enumerate(plans):
+        if error is not None:
+            yield file_path, None, error
+            continue
+        if plan is None:
+            try:
+                pages = [_read_text_file(file_path)]
+            except Exception as e:
+                yield file_path, None, e
+                continue
+            yield file_path, pages, None
+            continue
+        try:
+            texts = list(plan.iter_texts(results))
+        except Exception as e:
+            # A failed task ends the stream; restart it from the next file
+            results = _stream_tasks(tasks_from(position + 1))
+            yield file_path, None, e
+            continue
+        yield file_path, [text for text in texts if len(text) > MIN_PAGE_CHARS], None
@@ -3,8 +3,8 @@
 
 """
 AI-Powered Flashcard Generator
-- Processes PDF course materials
-- Uses FAISS for semantic search
+- Retrieves course material from the shared document corpus
+- Uses hybrid FAISS + BM25 search
 - Generates AI-powered flashcards
 """
 
@@ -13,15 +13,14 @@ from flask_cors import CORS
 from dotenv import load_dotenv
 import openai
 import os
-import faiss
-import numpy as np
-import fitz  # PyMuPDF
 import json
 import logging
-import tiktoken
 from pathlib import Path
 from openai import OpenAI
 
+from context_packing import CONTEXT_BUDGETS, pack_context
+from corpus import CorpusView, get_corpus
+
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,96 +41,25 @@ client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("⚠️ ERROR: OPENAI_API_KEY not set in environment")
 
-# Global variables for FAISS index and course chunks
-faiss_index = None
-course_chunks = []
+# View of the course material collection in the shared corpus
+course_view = None
 
 # Create the blueprint
 flashcard_routes = Blueprint('flashcard', __name__)
 
-def extract_text_from_pdf(pdf_path):
-    """Extracts and cleans text from a PDF file."""
-    text_data = []
-    try:
-        with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text = page.get_text("text").strip()
-                if len(text) > 50:  # Only keep substantial chunks
-                    text_data.append(text)
-        return "\n".join(text_data)
-    except Exception as e:
-        logger.error(f"Error extracting text from PDF {pdf_path}: {str(e)}")
-        raise
-
-def chunk_text(text, max_tokens=300):
-    """Splits text into chunks while preserving meaning."""
-    encoding = tiktoken.get_encoding("cl100k_base")
-    words = text.split()
-    chunks = []
-    chunk = []
-    token_count = 0
-    
-    for word in words:
-        word_tokens = len(encoding.encode(word))
-        if token_count + word_tokens > max_tokens:
-            chunks.append(" ".join(chunk))
-            chunk = []
-            token_count = 0
-        chunk.append(word)
-        token_count += word_tokens
-    
-    if chunk:
-        chunks.append(" ".join(chunk))
-    return chunks
-
-def process_pdf_for_rag(pdf_path, university, course):
-    """Processes a PDF and returns structured text chunks."""
-    try:
-        raw_text = extract_text_from_pdf(pdf_path)
-        chunks = chunk_text(raw_text)
-        return [
-            {
-                "university": university,
-                "course": course,
-                "chunk_id": i,
-                "text": chunk
-            } for i, chunk in enumerate(chunks)
-        ]
-    except Exception as e:
-        logger.error(f"Error processing PDF for RAG: {str(e)}")
-        raise
-
-def generate_embedding(text):
-    """Generates an embedding for text using OpenAI's API."""
-    try:
-        response = client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
-        )
-        return response.data[0].embedding
-    except Exception as e:
-        logger.error(f"Error generating embedding: {str(e)}")
-        # Return a zero vector as fallback (dimensionality of text-embedding-ada-002 is 1536)
-        return [0.0] * 1536
-
-def store_embeddings_faiss(data):
-    """Stores embeddings in FAISS index for fast retrieval."""
-    try:
-        d = len(data[0]["embedding"])
-        index = faiss.IndexFlatL2(d)
-        embeddings = np.array([chunk["embedding"] for chunk in data]).astype("float32")
-        index.add(embeddings)
-        return index
-    except Exception as e:
-        logger.error(f"Error storing embeddings in FAISS: {str(e)}")
-        raise
+def search_relevant_chunks(query, top_k=3, mode=None, university=None, course=None, snapshot=None):
+    """Finds most relevant course chunks using dense, BM25 or hybrid search.
 
-def search_relevant_chunks(query, top_k=3):
-    """Finds most relevant course chunks using FAISS similarity search."""
+    Only the given university's and course's partition is searched; if no
+    material is filed under them the search widens to the course alone and
+    then to all course material. Pass the corpus snapshot the caller will
+    keep reading from, if any.
+    """
     try:
-        query_embedding = np.array([generate_embedding(query)]).astype("float32")
-        _, indices = faiss_index.search(query_embedding, top_k)
-        return [course_chunks[i] for i in indices[0]]
+        snapshot = snapshot or course_view.snapshot()
+        where = {field: value for field, value in (("university", university), ("course", course)) if value}
+        positions = course_view.search(query, top_k, mode=mode, where=where, fallback=True, snapshot=snapshot)
+        return [course_view.chunk(i, snapshot) for i in positions]
     except Exception as e:
         logger.error(f"Error searching relevant chunks: {str(e)}")
         raise
@@ -146,7 +74,7 @@ def generate_flashcards_with_context(context, num_cards=10, difficulty='intermed
         
         {context}
         
-        Based off of the academic material and content from {context}, generate {num_cards} high-quality {difficulty}-level flashcards in JSON format.
+        Based off of the academic material and content above, generate {num_cards} high-quality {difficulty}-level flashcards in JSON format.
         Each flashcard should:
         
         1. Focus on a key concept, definition, or relationship from the material
@@ -184,48 +112,20 @@ def generate_flashcards_with_context(context, num_cards=10, difficulty='intermed
 
 # Initialize course materials on startup
 def initialize_course_materials():
-    """Initialize course materials and FAISS index."""
-    global course_chunks, faiss_index
+    """Initialize course materials from the shared corpus."""
+    global course_view
     try:
-        # Get the coursematerial directory
-        coursematerial_dir = os.path.join(os.path.dirname(__file__), "coursematerial")
-        logger.info(f"Scanning directory: {coursematerial_dir}")
-        
-        # Initialize empty list for all chunks
-        course_chunks = []
+        # Only files that changed since the corpus was last saved are re-embedded,
+        # and course material already indexed for the chatbot is reused as is
+        corpus = get_corpus()
+        corpus.ensure_synced("coursematerial")
+        course_view = CorpusView(corpus, ["coursematerial"], name="flashcard")
         
-        # Get all PDF files from the directory
-        pdf_files = [f for f in os.listdir(coursematerial_dir) if f.lower().endswith('.pdf')]
-        
-        if not pdf_files:
-            logger.warning("No PDF files found in coursematerial directory")
+        if not len(course_view):
+            logger.warning("No course material chunks found in coursematerial directory")
             return
-            
-        logger.info(f"Found {len(pdf_files)} PDF files to process")
-        
-        # Process each PDF file
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(coursematerial_dir, pdf_file)
-            logger.info(f"Processing PDF: {pdf_file}")
-            
-            # Extract course info from filename (you might want to adjust this logic)
-            course_name = os.path.splitext(pdf_file)[0]
-            
-            # Process the PDF and add chunks to our collection
-            file_chunks = process_pdf_for_rag(pdf_path, "Computer Science", course_name)
-            course_chunks.extend(file_chunks)
-            logger.info(f"Added {len(file_chunks)} chunks from {pdf_file}")
-        
-        logger.info(f"Total chunks processed: {len(course_chunks)}")
-        
-        # Generate embeddings for all chunks
-        logger.info("Generating embeddings for chunks...")
-        for chunk in course_chunks:
-            chunk["embedding"] = generate_embedding(chunk["text"])
         
-        # Store in FAISS
-        logger.info("Storing embeddings in FAISS index...")
-        faiss_index = store_embeddings_faiss(course_chunks)
+        logger.info(f"Total chunks available: {len(course_view)}")
         logger.info("Course materials initialized successfully")
         
     except Exception as e:
@@ -253,14 +153,15 @@ def generate_flashcards():
             return jsonify({"error": "All fields are required"}), 400
 
         # Search for relevant chunks
-        logger.info(f"Searching for relevant chunks about: {topic}")
-        relevant_chunks = search_relevant_chunks(topic)
+        logger.info(f"Searching for relevant chunks about: {topic} ({university}, {course})")
+        snapshot = course_view.snapshot()
+        relevant_chunks = search_relevant_chunks(topic, university=university, course=course, snapshot=snapshot)
         
         if not relevant_chunks:
             return jsonify({"error": "No relevant content found for this topic"}), 404
             
-        # Extract and format context
-        context = "\n\n".join([chunk["text"] for chunk in relevant_chunks])
+        # Merge overlapping chunks and fit them to the flashcard context budget
+        context = pack_context(relevant_chunks, snapshot.document_text, CONTEXT_BUDGETS["flashcards"])
         
         # Generate flashcards with specified parameters
         logger.info(f"Generating {num_cards} {difficulty} flashcards from context")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Asynchronous Document Ingestion for MedBot AI
+- Bounded background worker pool for extraction, splitting and embedding
+- Job registry with per-job progress (pages, chunks, embedded)
+- Bounded backlog so a burst of uploads cannot queue unlimited work
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+INGESTION_WORKERS = int(os.getenv("MEDBOT_INGESTION_WORKERS", 2))
+# Jobs queued or running at once; further submissions are rejected
+MAX_PENDING_JOBS = int(os.getenv("MEDBOT_INGESTION_MAX_PENDING", 32))
+# Finished jobs stay queryable for this many seconds
+JOB_RETENTION_SECONDS = 3600
+
+# Global ingestion queue instance
+_ingestion_queue = None
+
+class QueueFullError(Exception):
+    """Raised when the ingestion backlog is at capacity"""
+
+class IngestionJob:
+    """Status and progress of one document ingestion"""
+
+    def __init__(self, filename: str, filepath: str):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.filepath = filepath
+        self.status = "queued"
+        self.pages = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def update(self, **counts: int) -> None:
+        """Record progress; used as the progress callback during ingestion"""
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "pages": self.pages,
+                "chunks": self.chunks,
+                "embedded": self.embedded,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at
+            }
+
+class IngestionQueue:
+    """Runs ingestion jobs on a bounded pool of background threads"""
+
+    def __init__(self, max_workers: int = INGESTION_WORKERS, max_pending: int = MAX_PENDING_JOBS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self.max_pending = max_pending
+        self.jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self,
+               filename: str,
+               filepath: str,
+               ingest_fn: Callable[[str, Callable[..., None]], None],
+               on_failure: Optional[Callable[[IngestionJob], None]] = None) -> IngestionJob:
+        """Queue a file for ingestion
+
+        Args:
+            filename: Original name of the uploaded file
+            filepath: Where the file was saved
+            ingest_fn: Callable(filepath, progress) that does the work and
+                reports progress by calling progress(pages=..., chunks=..., embedded=...)
+            on_failure: Optional cleanup called with the job if ingestion fails
+
+        Returns:
+            The queued job
+
+        Raises:
+            QueueFullError: If the backlog is at capacity
+        """
+        job = IngestionJob(filename, filepath)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"Ingestion queue is full ({self.max_pending} jobs pending)")
+            self._pending += 1
+            self._prune()
+            self.jobs[job.id] = job
+
+        self.executor.submit(self._run, job, ingest_fn, on_failure)
+        logger.info(f"Queued ingestion job {job.id} for {filename}")
+        return job
+
+    def _run(self, job: IngestionJob, ingest_fn, on_failure) -> None:
+        job.update(status="running", started_at=time.time())
+        try:
+            ingest_fn(job.filepath, job.update)
+            job.update(status="done", finished_at=time.time())
+            logger.info(f"Ingestion job {job.id} finished: {job.chunks} chunks from {job.filename}")
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed for {job.filename}: {str(e)}")
+            job.update(status="failed", error=str(e), finished_at=time.time())
+            if on_failure:
+                on_failure(job)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _prune(self) -> None:
+        """Forget finished jobs past their retention period (caller holds the lock)"""
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Get the process-wide ingestion queue, creating it on first use"""
+    global _ingestion_queue
+    if _ingestion_queue is None:
+        _ingestion_queue = IngestionQueue()
+    return _ingestion_queue
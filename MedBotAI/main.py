@@ -22,6 +22,8 @@ from study_calendar import initialize_calendar_materials, study_calendar_routes
 from chatbot import initialize_chatbot, chatbot_routes
 from flashcard import initialize_course_materials, flashcard_routes
 from exam import exam_routes, initialize_exam_materials, load_feedback, load_student_profiles
+from watcher import WATCH_ENABLED, start_watcher
+from corpus import get_corpus
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -127,6 +129,11 @@ def debug_info():
         'blueprints': list(app.blueprints.keys())
     })
 
+# Embedding space of each collection and progress of background re-embedding
+@app.route('/debug/embeddings')
+def embedding_status():
+    return jsonify(get_corpus().migration_status())
+
 # Catch-all route for SPA (React) routing
 @app.route('/<path:path>')
 def catch_all(path):
@@ -197,11 +204,19 @@ if __name__ == '__main__':
     # Initialize all components
     initialize_all()
     
+    # Re-index course material and exams as files change (MEDBOT_WATCH=1).
+    # In debug mode the reloader runs this block in two processes; only the
+    # one serving requests watches, so the saved corpus has a single writer.
+    debug = True
+    if WATCH_ENABLED and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        start_watcher()
+        logger.info("File watcher started")
+    
     # Start server
     port = int(os.environ.get('PORT', 8080))
     logger.info(f"Starting server on port {port}")
     try:
-        socketio.run(app, host='0.0.0.0', port=port, debug=True, allow_unsafe_werkzeug=True)
+        socketio.run(app, host='0.0.0.0', port=port, debug=debug, allow_unsafe_werkzeug=True)
     except Exception as e:
         logger.error(f"Failed to start server: {str(e)}")
         raise 
\ No newline at end of file
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Online Embedding Migration for MedBot AI
+- Every collection records the embedding space its index is in: provider
+  (model and dimensions), vector size and a version bumped on each switch
+- Changing a collection's embedding provider does not re-index it offline;
+  a background migration re-embeds its chunks into the new space while
+  queries keep using the published index in the old one
+- Chunks added or replaced during the migration are picked up before the
+  switch, and the switch happens only at 100% coverage, in one publish
+- Progress (coverage) and throughput are logged and available from status()
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from embeddings import get_provider, try_embed_texts
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+# Chunks embedded per call; progress is updated between calls
+MIGRATION_BATCH = int(os.getenv("MEDBOT_MIGRATION_BATCH", 512))
+# Seconds between progress log lines
+MIGRATION_LOG_INTERVAL = float(os.getenv("MEDBOT_MIGRATION_LOG_INTERVAL", 30))
+# Seconds to wait after a batch fails before trying again
+MIGRATION_RETRY_DELAY = float(os.getenv("MEDBOT_MIGRATION_RETRY_DELAY", 60))
+# Seconds to wait after the switch declines because new chunks arrived
+MIGRATION_SWITCH_DELAY = float(os.getenv("MEDBOT_MIGRATION_SWITCH_DELAY", 1))
+
+class EmbeddingMigration:
+    """Re-embeds one collection into a new embedding space in a background thread
+
+    Vectors are kept per document, keyed by the chunk's index within it,
+    so they stay valid when the chunk table is compacted and renumbered.
+    The corpus switches the collection over once every live chunk has one
+    (see Corpus.switch_embedding).
+    """
+
+    def __init__(self, corpus, collection: str, source: str, target: str):
+        """
+        Args:
+            corpus: Corpus holding the collection
+            collection: Collection to migrate
+            source: Provider of the space queries use until the switch
+            target: Provider of the space to migrate to
+        """
+        self.corpus = corpus
+        self.collection = collection
+        self.source = source
+        self.target = target
+        # doc_id -> {chunk index: vector in the target space}
+        self.vectors = {}
+        self.state = "running"
+        self.error = None
+        self.embedded = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self._covered = 0
+        self._total = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name=f"embedding-migration-{self.collection}",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def missing(self, snapshot) -> List[Tuple[str, int, str]]:
+        """Return (doc_id, chunk index, text) for the collection's live chunks without a target vector
+
+        Also updates coverage, and drops vectors of documents that have
+        been replaced or removed.
+        """
+        store = snapshot.store
+        doc_ids = {doc_id for doc_id, doc in store.documents.items() if doc.collection == self.collection}
+        for doc_id in set(self.vectors) - doc_ids:
+            del self.vectors[doc_id]
+
+        missing = []
+        total = 0
+        for doc_id in doc_ids:
+            ids = store.chunk_ids(doc_id)
+            done = self.vectors.get(doc_id, {})
+            total += len(ids)
+            for i, index in zip(ids.tolist(), store.chunk_index[ids].tolist()):
+                if index not in done:
+                    missing.append((doc_id, index, store.text(i)))
+        self._covered, self._total = total - len(missing), total
+        return missing
+
+    def vectors_for(self, doc_id: str, chunk_index: np.ndarray) -> np.ndarray:
+        """Return target vectors for chunks of a document, in the given order"""
+        done = self.vectors[doc_id]
+        return np.vstack([done[index] for index in chunk_index.tolist()])
+
+    def status(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        rate = self.embedded / elapsed if elapsed > 0 else 0.0
+        remaining = self._total - self._covered
+        return {
+            "collection": self.collection,
+            "source": self.source,
+            "target": self.target,
+            "state": self.state,
+            "error": self.error,
+            "covered": self._covered,
+            "total": self._total,
+            "coverage": round(self._covered / self._total, 4) if self._total else 1.0,
+            "embedded": self.embedded,
+            "failed": self.failed,
+            "chunks_per_second": round(rate, 1),
+            "eta_seconds": round(remaining / rate) if rate and self.state == "running" else None,
+            "elapsed_seconds": round(elapsed, 1)
+        }
+
+    def _run(self) -> None:
+        logger.info(f"Migrating '{self.collection}' from {self.source} to {self.target}")
+        last_log = time.time()
+        try:
+            dimension = get_provider(self.target).dimension
+            while not self._stop.is_set():
+                missing = self.missing(self.corpus.snapshot)
+                if not missing:
+                    # Chunks indexed since the last pass make the switch
+                    # decline; they are embedded on the next one, after a
+                    # pause so a writer that keeps indexing does not make
+                    # this thread spin on the write lock
+                    if self.corpus.switch_embedding(self.collection, self.target, dimension, self):
+                        self.state = "switched"
+                        break
+                    self._stop.wait(MIGRATION_SWITCH_DELAY)
+                    continue
+                for start in range(0, len(missing), MIGRATION_BATCH):
+                    if self._stop.is_set():
+                        break
+                    if not self._embed(missing[start:start + MIGRATION_BATCH]):
+                        self._stop.wait(MIGRATION_RETRY_DELAY)
+                        break
+                    if time.time() - last_log >= MIGRATION_LOG_INTERVAL:
+                        last_log = time.time()
+                        status = self.status()
+                        logger.info(f"Migrating '{self.collection}' to {self.target}: {status['covered']}/"
+                                    f"{status['total']} chunks ({status['coverage']:.0%}), "
+                                    f"{status['chunks_per_second']} chunks/s")
+            if self.state == "running":
+                self.state = "stopped"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"Error migrating '{self.collection}' to {self.target}: {str(e)}")
+        self.finished_at = time.time()
+        status = self.status()
+        logger.info(f"Migration of '{self.collection}' to {self.target} {self.state}: "
+                    f"{status['embedded']} chunks embedded in {status['elapsed_seconds']}s "
+                    f"({status['chunks_per_second']} chunks/s)")
+
+    def _embed(self, batch: List[Tuple[str, int, str]]) -> bool:
+        """Embed a batch of missing chunks
+
+        Returns:
+            bool: False if some failed and the migration should back off
+        """
+        vectors, failed = try_embed_texts([text for _, _, text in batch], self.target)
+        failed = set(failed)
+        for position, (doc_id, index, _) in enumerate(batch):
+            if position not in failed:
+                self.vectors.setdefault(doc_id, {})[index] = vectors[position]
+        self.embedded += len(batch) - len(failed)
+        self._covered += len(batch) - len(failed)
+        if failed:
+            self.failed += len(failed)
+            logger.warning(f"{len(failed)} chunks of '{self.collection}' could not be embedded "
+                           f"with {self.target}; retrying in {MIGRATION_RETRY_DELAY}s")
+        return not failed
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent Extracted-Text Cache for MedBot AI
+- Keyed by (SHA-256 of the file, extractor version, page number)
+- Stores each page's text layer and, once computed, its OCR text
+- Stored in SQLite so unchanged documents are never parsed or OCR'd twice
+- LRU eviction by document once the cache grows past a configurable size
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+CACHE_PATH = os.getenv(
+    "MEDBOT_PAGE_CACHE",
+    os.path.join(os.path.dirname(__file__), "cache", "pages.sqlite3")
+)
+MAX_DOCUMENTS = int(os.getenv("MEDBOT_PAGE_CACHE_DOCUMENTS", 5000))
+
+# Global cache instance
+_page_cache = None
+
+class PageText(NamedTuple):
+    """Cached extraction results for one page"""
+    text: str
+    # None until the page has been OCR'd
+    ocr_text: Optional[str] = None
+
+def file_sha256(file_path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PageTextCache:
+    """SQLite-backed cache of extracted page text"""
+
+    def __init__(self, path: str = CACHE_PATH, max_documents: int = MAX_DOCUMENTS):
+        """Open (or create) the cache
+
+        Args:
+            path: SQLite database file
+            max_documents: Number of documents kept before least recently used ones are evicted
+        """
+        self.path = path
+        self.max_documents = max_documents
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    sha256 TEXT NOT NULL,
+                    extractor TEXT NOT NULL,
+                    page_count INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (sha256, extractor)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    sha256 TEXT NOT NULL,
+                    extractor TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    ocr_text TEXT,
+                    PRIMARY KEY (sha256, extractor, page)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_last_used ON documents (last_used)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_document(self, sha256: str, extractor: str) -> Tuple[Optional[int], Dict[int, PageText]]:
+        """Look up the cached pages of a document
+
+        Returns:
+            (page_count, pages): page_count is None if the document was never
+            seen; pages maps page numbers to their cached text
+        """
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT page_count FROM documents WHERE sha256 = ? AND extractor = ?",
+            (sha256, extractor)
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None, {}
+
+        pages = {
+            page: PageText(text, ocr_text)
+            for page, text, ocr_text in conn.execute(
+                "SELECT page, text, ocr_text FROM pages WHERE sha256 = ? AND extractor = ?",
+                (sha256, extractor)
+            )
+        }
+        # Refresh recency for LRU eviction
+        with conn:
+            conn.execute(
+                "UPDATE documents SET last_used = ? WHERE sha256 = ? AND extractor = ?",
+                (time.time(), sha256, extractor)
+            )
+        with self._lock:
+            self.hits += 1
+        return row[0], pages
+
+    def put_pages(self, sha256: str, extractor: str, page_count: int, pages: Dict[int, PageText]) -> None:
+        """Store extracted pages of a document"""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (sha256, extractor, page_count, last_used) VALUES (?, ?, ?, ?)",
+                (sha256, extractor, page_count, time.time())
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (sha256, extractor, page, text, ocr_text) VALUES (?, ?, ?, ?, ?)",
+                [(sha256, extractor, page, entry.text, entry.ocr_text) for page, entry in pages.items()]
+            )
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used documents beyond ``max_documents``
+
+        Returns:
+            Number of documents evicted
+        """
+        conn = self._connection()
+        count = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        excess = count - self.max_documents
+        if excess <= 0:
+            return 0
+        with conn:
+            victims = conn.execute(
+                "SELECT sha256, extractor FROM documents ORDER BY last_used ASC LIMIT ?", (excess,)
+            ).fetchall()
+            conn.executemany("DELETE FROM pages WHERE sha256 = ? AND extractor = ?", victims)
+            conn.executemany("DELETE FROM documents WHERE sha256 = ? AND extractor = ?", victims)
+        with self._lock:
+            self.evictions += excess
+        logger.info(f"Evicted {excess} documents from page cache")
+        return excess
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size of the cache"""
+        conn = self._connection()
+        documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        pages, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(text) + COALESCE(LENGTH(ocr_text), 0)), 0) FROM pages"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "documents": documents,
+            "pages": pages,
+            "bytes": size,
+            "max_documents": self.max_documents
+        }
+
+def get_page_cache() -> PageTextCache:
+    """Get the process-wide page cache, opening it on first use"""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageTextCache()
+    return _page_cache
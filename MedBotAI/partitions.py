@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Partitioned Vector Index for MedBot AI
+- One partition per (collection, university, course), each a few
+  segments holding a FAISS index and a BM25 index
+- Queries go only to the partitions matching the requested metadata, so
+  search cost follows the size of the selected course, not the library
+- Queries spanning several partitions are scattered over a thread pool
+  (FAISS releases the GIL while searching) and the results merged by distance
+- Segments map local ids to stable chunk ids, so callers never see local ids
+- Adding a document appends a segment and removing one marks its chunks
+  dead; compaction merges segments and drops tombstones in the background
+  of a publish, so updates cost time in proportion to the changed document
+- Copy-on-write: a change replaces only the partitions it touches, so a
+  published PartitionedIndex is never modified and can be searched without
+  locks while the next version is built
+"""
+
+import os
+import re
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import faiss
+
+from chunk_store import ChunkStore
+from retrieval import LexicalIndex, shared_statistics
+from vector_index import create_index, load_index, reconstruct_all, search_subset
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+# Document metadata fields, after the collection, that select a partition
+PARTITION_FIELDS = tuple(field.strip() for field in
+                         os.getenv("MEDBOT_PARTITION_FIELDS", "university,course").split(",")
+                         if field.strip())
+# Threads used to search several partitions at once
+SEARCH_WORKERS = int(os.getenv("MEDBOT_PARTITION_SEARCH_WORKERS", min(8, os.cpu_count() or 1)))
+PARTITIONS_DIR = "partitions"
+# Segments a partition may have before compaction merges them
+MAX_SEGMENTS = int(os.getenv("MEDBOT_PARTITION_MAX_SEGMENTS", 4))
+# Fraction of dead chunks in a segment (or the chunk table) that triggers compaction
+TOMBSTONE_RATIO = float(os.getenv("MEDBOT_TOMBSTONE_RATIO", 0.25))
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+# Shared pool for scatter-gather searches
+_search_pool = None
+
+def normalize_value(value: Any) -> str:
+    """Normalise a metadata value for partition matching
+
+    "KINE 1P90", "kine-1p90" and "Kine_1P90" all map to "kine1p90".
+    """
+    return _NON_ALPHANUMERIC.sub("", str(value or "").casefold())
+
+def partition_key(collection: str, metadata: Dict[str, Any]) -> Tuple[str, ...]:
+    """Return the partition a document with this metadata belongs to"""
+    return (collection,) + tuple(normalize_value(metadata.get(field)) for field in PARTITION_FIELDS)
+
+def get_search_pool() -> ThreadPoolExecutor:
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="partition-search")
+    return _search_pool
+
+def _merge_hits(results: Sequence[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge (distances, ids) results into the k nearest"""
+    distances = np.concatenate([distances for distances, _ in results])
+    ids = np.concatenate([ids for _, ids in results])
+    order = np.argsort(distances, kind="stable")[:k]
+    return distances[order], ids[order]
+
+class Segment:
+    """Vectors of chunks indexed together, with the chunk id of each local id
+
+    ``ids`` maps FAISS local ids to stable chunk ids, the way an ID-mapped
+    index would, while subset search and rebuilds keep working on local
+    ids. Segments are immutable: removing chunks returns a copy with a
+    narrower live mask and leaves the FAISS index untouched.
+    """
+
+    __slots__ = ("name", "index", "ids", "live", "lexical_index")
+
+    def __init__(self, index: faiss.Index, ids: np.ndarray, live: Optional[np.ndarray] = None,
+                 name: Optional[str] = None, lexical_index: Optional[LexicalIndex] = None):
+        # Names the segment's files; a segment is written once
+        self.name = name or uuid.uuid4().hex
+        self.index = index
+        self.ids = ids
+        # Mask over local ids of chunks not removed; None when all are live
+        self.live = live
+        self.lexical_index = lexical_index
+
+    def __len__(self) -> int:
+        return len(self.ids) if self.live is None else int(np.count_nonzero(self.live))
+
+    @property
+    def num_dead(self) -> int:
+        return len(self.ids) - len(self)
+
+    def live_ids(self) -> np.ndarray:
+        return self.ids if self.live is None else self.ids[self.live]
+
+    def local(self, allowed: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Return the local ids a search may return, or None for all of them
+
+        Args:
+            allowed: Optional sorted chunk ids results must come from
+        """
+        if allowed is None:
+            return None if self.live is None else np.flatnonzero(self.live)
+        mask = np.isin(self.ids, allowed, assume_unique=True)
+        if self.live is not None:
+            mask &= self.live
+        return np.flatnonzero(mask)
+
+    def remove(self, ids: np.ndarray) -> "Segment":
+        """Return a copy with the given chunk ids marked dead"""
+        removed = np.isin(self.ids, ids)
+        if not removed.any():
+            return self
+        live = ~removed if self.live is None else self.live & ~removed
+        return Segment(self.index, self.ids, live, self.name, self.lexical_index)
+
+    def vectors(self) -> np.ndarray:
+        """Return the vectors of live chunks, in live_ids order"""
+        vectors = reconstruct_all(self.index)
+        return vectors if self.live is None else vectors[self.live]
+
+    def search(self, query_vector: np.ndarray, k: int,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distances, chunk ids) of the k nearest live chunks"""
+        local = self.local(allowed)
+        if local is None:
+            distances, found = self.index.search(query_vector, k)
+        elif not len(local):
+            return np.zeros(0, dtype="float32"), np.zeros(0, dtype="int64")
+        else:
+            distances, found = search_subset(self.index, query_vector, k, local)
+        hits = found[0] != -1
+        return distances[0][hits], self.ids[found[0][hits]]
+
+def merge_segments(segments: Sequence[Segment]) -> Segment:
+    """Build one segment holding the live chunks of several, dropping tombstones"""
+    vectors = np.vstack([segment.vectors() for segment in segments])
+    ids = np.concatenate([segment.live_ids() for segment in segments])
+    return Segment(create_index(vectors), ids)
+
+class Partition:
+    """The vectors and BM25 terms of one course's chunks
+
+    A partition is a tuple of segments, one per batch of added chunks until
+    compaction merges them. It is not modified once its PartitionedIndex is
+    published; add and remove return new partitions, and cost time in
+    proportion to the chunks they touch.
+    """
+
+    __slots__ = ("key", "segments")
+
+    def __init__(self, key: Tuple[str, ...], segments: Sequence[Segment] = ()):
+        self.key = key
+        self.segments = tuple(segments)
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments)
+
+    @property
+    def positions(self) -> np.ndarray:
+        """Sorted chunk ids of the live chunks"""
+        if not self.segments:
+            return np.zeros(0, dtype="int64")
+        return np.sort(np.concatenate([segment.live_ids() for segment in self.segments]))
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray) -> "Partition":
+        """Return a copy with the vectors of new chunks in a new segment"""
+        return Partition(self.key, self.segments + (Segment(create_index(vectors), ids.astype("int64")),))
+
+    def remove(self, ids: np.ndarray) -> Tuple["Partition", bool]:
+        """Return a copy with the given chunk ids marked dead
+
+        Returns:
+            (partition, True if it lost chunks)
+        """
+        segments = [segment.remove(ids) for segment in self.segments]
+        changed = any(new is not old for new, old in zip(segments, self.segments))
+        return Partition(self.key, [segment for segment in segments if len(segment)]), changed
+
+    def needs_compaction(self) -> bool:
+        return len(self.segments) > MAX_SEGMENTS or any(
+            segment.num_dead > TOMBSTONE_RATIO * len(segment.ids) for segment in self.segments)
+
+    def compact(self, full: bool = False) -> "Partition":
+        """Return a copy with tombstones dropped and small segments merged
+
+        Segments over TOMBSTONE_RATIO dead are rebuilt alone. Past
+        MAX_SEGMENTS, the segments after the first are merged, or all of
+        them once they outgrow it, so each chunk is re-indexed only a
+        logarithmic number of times.
+
+        Args:
+            full: Merge every segment into one, e.g. after a bulk sync
+        """
+        if full:
+            return Partition(self.key, [merge_segments(self.segments)] if len(self.segments) > 1
+                             else self.segments)
+        segments = [merge_segments([segment]) if segment.num_dead > TOMBSTONE_RATIO * len(segment.ids)
+                    else segment for segment in self.segments]
+        if len(segments) > MAX_SEGMENTS:
+            base, rest = segments[0], segments[1:]
+            if sum(len(segment) for segment in rest) >= len(base):
+                segments = [merge_segments(segments)]
+            else:
+                segments = [base, merge_segments(rest)]
+        return Partition(self.key, segments)
+
+    def renumber(self, renumber: np.ndarray) -> "Partition":
+        """Return a copy using the chunk ids after ChunkStore.compact"""
+        segments = []
+        for segment in self.segments:
+            if segment.num_dead:
+                segment = merge_segments([segment])
+            # New ids mean new files, so the segment gets a new name
+            segments.append(Segment(segment.index, renumber[segment.ids], None, None, segment.lexical_index))
+        return Partition(self.key, segments)
+
+    def search(self, query_vector: np.ndarray, k: int,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (distances, chunk ids) of the k nearest chunks
+
+        Args:
+            query_vector: Query embedding, shape (1, d)
+            k: Number of results
+            allowed: Optional sorted chunk ids results must come from
+        """
+        if not self.segments:
+            return np.zeros(0, dtype="float32"), np.zeros(0, dtype="int64")
+        if len(self.segments) == 1:
+            return self.segments[0].search(query_vector, k, allowed)
+        return _merge_hits([segment.search(query_vector, k, allowed) for segment in self.segments], k)
+
+class PartitionedLexicalIndex:
+    """BM25 search over several partitions, with the LexicalIndex interface
+
+    Partitions score with the term statistics of their whole collection,
+    so results from different courses merge on one scale.
+    """
+
+    def __init__(self, partitions: Sequence[Partition]):
+        self.segments = [segment for partition in partitions for segment in partition.segments
+                         if segment.lexical_index is not None]
+
+    def search(self, query: str, top_k: int,
+               positions: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        results = []
+        for segment in self.segments:
+            local = segment.local(positions)
+            if local is not None and not len(local):
+                continue
+            for i, score in segment.lexical_index.search(query, top_k, local):
+                results.append((int(segment.ids[i]), score))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:top_k]
+
+class PartitionedIndex:
+    """Vector and BM25 indexes of a corpus, split into partitions"""
+
+    def __init__(self):
+        # partition key -> Partition
+        self.partitions = {}
+        self._dirty = set()
+        # Collections whose BM25 statistics must be shared again at the next refresh
+        self._stale = set()
+
+    def copy(self) -> "PartitionedIndex":
+        """Return a draft to apply changes to; partitions are shared until replaced"""
+        draft = PartitionedIndex()
+        draft.partitions = dict(self.partitions)
+        draft._dirty = set(self._dirty)
+        draft._stale = set(self._stale)
+        return draft
+
+    @property
+    def ntotal(self) -> int:
+        return sum(len(partition) for partition in self.partitions.values())
+
+    # --------------------------------------------------------------------------
+    # Writes
+    # --------------------------------------------------------------------------
+    def add(self, key: Tuple[str, ...], vectors: np.ndarray, ids: np.ndarray) -> None:
+        """Add vectors for new chunks as a new segment of their partition"""
+        partition = self.partitions.get(key) or Partition(key)
+        self.partitions[key] = partition.add(vectors, ids)
+        self._dirty.add(key)
+
+    def remove(self, key: Tuple[str, ...], ids: np.ndarray) -> None:
+        """Mark chunks of one partition dead; vectors are dropped at compaction
+
+        Args:
+            key: Partition holding the chunks
+            ids: Chunk ids, as returned by ChunkStore.remove_documents
+        """
+        partition = self.partitions.get(key)
+        if partition is None or not len(ids):
+            return
+        partition, changed = partition.remove(ids)
+        if not len(partition):
+            del self.partitions[key]
+            self._dirty.discard(key)
+            self._stale.add(key[0])
+        elif changed:
+            self.partitions[key] = partition
+            self._dirty.add(key)
+
+    def merge(self, collection: str) -> None:
+        """Merge each partition of a collection into a single segment
+
+        Searches visit one FAISS and one BM25 index per partition again;
+        worth doing once a bulk sync has added many segments.
+        """
+        for key, partition in list(self.partitions.items()):
+            if key[0] == collection and len(partition.segments) > 1:
+                self.partitions[key] = partition.compact(full=True)
+                self._dirty.add(key)
+
+    def replace_collection(self, collection: str,
+                           groups: Dict[Tuple[str, ...], Tuple[np.ndarray, np.ndarray]]) -> None:
+        """Replace every partition of a collection, e.g. with vectors from another embedding space
+
+        Args:
+            collection: Collection whose partitions are replaced
+            groups: (vectors, chunk ids) by partition key; each becomes a
+                partition of one segment
+        """
+        for key in [key for key in self.partitions if key[0] == collection]:
+            del self.partitions[key]
+            self._dirty.discard(key)
+        for key, (vectors, ids) in groups.items():
+            if len(ids):
+                self.partitions[key] = Partition(key).add(vectors, ids)
+                self._dirty.add(key)
+        self._stale.add(collection)
+
+    def renumber(self, renumber: np.ndarray) -> None:
+        """Switch every partition to the chunk ids after ChunkStore.compact"""
+        for key, partition in list(self.partitions.items()):
+            self.partitions[key] = partition.renumber(renumber)
+            self._dirty.add(key)
+
+    def refresh(self, store: ChunkStore) -> None:
+        """Compact and index the partitions changed since the last refresh
+
+        Partitions with too many segments or tombstones are compacted, and
+        BM25 indexes are built for new segments only, then term statistics
+        are shared again across each changed collection. Must be called
+        before the index is published; a published index is never modified.
+        """
+        for key in self._dirty:
+            partition = self.partitions.get(key)
+            if partition is None:
+                continue
+            if partition.needs_compaction():
+                partition = self.partitions[key] = partition.compact()
+            for segment in partition.segments:
+                # Only segments created since the last publish, or loaded, lack
+                # one; chunks already dead by then are indexed as empty text
+                if segment.lexical_index is None:
+                    segment.lexical_index = LexicalIndex([store.text(i) if store.alive[i] else ""
+                                                          for i in segment.ids.tolist()])
+        self._stale.update(key[0] for key in self._dirty)
+        self._dirty = set()
+        self._share_statistics()
+
+    def _share_statistics(self) -> None:
+        """Reweight the BM25 indexes of stale collections with collection-wide term statistics"""
+        for collection in self._stale:
+            members = [partition for key, partition in self.partitions.items() if key[0] == collection]
+            idf, average_length = shared_statistics([segment.lexical_index for partition in members
+                                                     for segment in partition.segments
+                                                     if segment.lexical_index is not None])
+            # Partitions may be shared with published versions of the index,
+            # so reweighted copies replace them rather than being updated
+            for partition in members:
+                segments = []
+                for segment in partition.segments:
+                    lexical_index = segment.lexical_index
+                    if lexical_index is not None:
+                        lexical_index = lexical_index.with_statistics(idf, average_length)
+                    segments.append(Segment(segment.index, segment.ids, segment.live, segment.name,
+                                            lexical_index))
+                self.partitions[partition.key] = Partition(partition.key, segments)
+        self._stale = set()
+
+    # --------------------------------------------------------------------------
+    # Reads
+    # --------------------------------------------------------------------------
+    def select(self, collections: Iterable[str], where: Optional[Dict[str, Any]] = None,
+               fallback: bool = False) -> List[Partition]:
+        """Return the partitions of some collections matching partition metadata
+
+        Values are compared normalised, so "KINE 1P90" matches "kine-1p90".
+
+        Args:
+            collections: Collections to search
+            where: Metadata filter; only PARTITION_FIELDS are used here
+            fallback: If nothing matches, retry with only the most specific
+                field and then with no fields, rather than return nothing
+        """
+        collections = set(collections)
+        requested = {field: normalize_value(value) for field, value in (where or {}).items()
+                     if field in PARTITION_FIELDS and normalize_value(value)}
+        candidates = [partition for key, partition in self.partitions.items() if key[0] in collections]
+
+        attempts = [requested]
+        if fallback and len(requested) > 1:
+            specific = [field for field in PARTITION_FIELDS if field in requested][-1]
+            attempts.append({specific: requested[specific]})
+        if fallback and requested:
+            attempts.append({})
+
+        for attempt in attempts:
+            selected = [partition for partition in candidates
+                        if all(partition.key[1 + PARTITION_FIELDS.index(field)] == value
+                               for field, value in attempt.items())]
+            if selected or not attempt:
+                if attempt != requested:
+                    logger.info(f"No partition matches {requested}, searching {attempt or 'all'} instead")
+                return selected
+        return []
+
+    def dense_search(self, partitions: Sequence[Partition], query_vector: np.ndarray, k: int,
+                     allowed: Optional[np.ndarray] = None) -> List[int]:
+        """Search partitions in parallel and merge their results by distance
+
+        Args:
+            partitions: Partitions to search
+            query_vector: Query embedding, shape (1, d)
+            k: Number of chunk ids to return
+            allowed: Optional sorted chunk ids results must come from
+
+        Returns:
+            Up to k chunk ids, nearest first
+        """
+        partitions = [partition for partition in partitions if len(partition)]
+        if not partitions:
+            return []
+        if len(partitions) == 1:
+            results = [partitions[0].search(query_vector, k, allowed)]
+        else:
+            pool = get_search_pool()
+            results = list(pool.map(lambda partition: partition.search(query_vector, k, allowed), partitions))
+
+        _, ids = _merge_hits(results, k)
+        return [int(i) for i in ids]
+
+    def lexical(self, partitions: Sequence[Partition]) -> PartitionedLexicalIndex:
+        """Return a BM25 index over the given partitions"""
+        return PartitionedLexicalIndex(partitions)
+
+    # --------------------------------------------------------------------------
+    # Persistence
+    # --------------------------------------------------------------------------
+    def save(self, directory: str) -> List[Dict[str, Any]]:
+        """Write the FAISS index and chunk ids of each segment not saved yet
+
+        Segments never change once written, so only new ones cost anything.
+
+        Returns:
+            Manifest describing the partitions, to be stored with the corpus
+        """
+        path = os.path.join(directory, PARTITIONS_DIR)
+        os.makedirs(path, exist_ok=True)
+        manifest = []
+        for key, partition in self.partitions.items():
+            for segment in partition.segments:
+                index_path = os.path.join(path, segment.name + ".faiss")
+                ids_path = os.path.join(path, segment.name + ".ids.npy")
+                if os.path.exists(index_path) and os.path.exists(ids_path):
+                    continue
+                with open(ids_path + ".tmp", "wb") as f:
+                    np.save(f, segment.ids)
+                os.replace(ids_path + ".tmp", ids_path)
+                faiss.write_index(segment.index, index_path + ".tmp")
+                os.replace(index_path + ".tmp", index_path)
+            manifest.append({"key": list(key),
+                             "segments": [{"name": segment.name, "size": len(segment.ids)}
+                                          for segment in partition.segments]})
+        return manifest
+
+    @staticmethod
+    def remove_unused(directory: str, manifest: List[Dict[str, Any]]) -> None:
+        """Delete segment files no longer named in the saved manifest"""
+        path = os.path.join(directory, PARTITIONS_DIR)
+        used = {segment["name"] for entry in manifest for segment in entry.get("segments", [])}
+        for file_name in os.listdir(path) if os.path.isdir(path) else []:
+            if file_name.endswith((".faiss", ".npy")) and file_name.split(".")[0] not in used:
+                os.remove(os.path.join(path, file_name))
+
+    @classmethod
+    def load(cls, directory: str, manifest: List[Dict[str, Any]], store: ChunkStore,
+             lexical_indexes: Optional[Dict[str, LexicalIndex]] = None) -> "PartitionedIndex":
+        """Load partitions saved with save
+
+        Tombstones are read from the store, and every live chunk must be in
+        exactly one segment.
+
+        Args:
+            directory: Directory the partitions were saved to
+            manifest: Manifest returned by save
+            store: Chunk store the segments' ids refer to
+            lexical_indexes: Prebuilt BM25 indexes by segment name; other
+                segments have theirs built from the store
+        """
+        lexical_indexes = lexical_indexes or {}
+        partitioned = cls()
+        found = [np.zeros(0, dtype="int64")]
+        for entry in manifest:
+            if "segments" not in entry:
+                raise ValueError("partitions were saved without chunk ids")
+            key = tuple(entry["key"])
+            segments = []
+            for saved in entry["segments"]:
+                # Memory mapped (see load_index), so worker processes share
+                # one page-cache copy of each index
+                index = load_index(os.path.join(directory, PARTITIONS_DIR, saved["name"] + ".faiss"))
+                ids = np.load(os.path.join(directory, PARTITIONS_DIR, saved["name"] + ".ids.npy"))
+                if index.ntotal != len(ids) or (len(ids) and ids.max() >= len(store)):
+                    raise ValueError(f"segment {saved['name']} and chunk table are out of step")
+                live = store.alive[ids]
+                lexical_index = lexical_indexes.get(saved["name"])
+                if lexical_index is not None and lexical_index.size != len(ids):
+                    raise ValueError(f"BM25 index of segment {saved['name']} is out of step")
+                segment = Segment(index, ids, None if live.all() else live, saved["name"], lexical_index)
+                if len(segment):
+                    segments.append(segment)
+                    found.append(segment.live_ids())
+            if segments:
+                partitioned.partitions[key] = Partition(key, segments)
+                partitioned._dirty.add(key)
+
+        found = np.concatenate(found)
+        if len(found) != len(np.unique(found)) or len(found) != len(store) - store.num_dead:
+            raise ValueError("partitions and chunk table are out of step")
+        partitioned.refresh(store)
+        return partitioned
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Query Cache for MedBot AI
+- Level 1: (embedding provider, normalized query text) -> query embedding
+- Level 2: (index, query, index version, top_k, mode) -> retrieved chunk ids
+- Both levels use LRU eviction with a time-to-live
+- Result entries are keyed by index version and dropped when an index changes
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+EMBEDDING_CACHE_SIZE = int(os.getenv("MEDBOT_QUERY_EMBEDDING_CACHE_SIZE", 2048))
+EMBEDDING_CACHE_TTL = float(os.getenv("MEDBOT_QUERY_EMBEDDING_CACHE_TTL", 3600))
+RESULT_CACHE_SIZE = int(os.getenv("MEDBOT_QUERY_RESULT_CACHE_SIZE", 4096))
+RESULT_CACHE_TTL = float(os.getenv("MEDBOT_QUERY_RESULT_CACHE_TTL", 600))
+
+# Global query cache instance
+_query_cache = None
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share entries"""
+    return " ".join(query.split()).casefold()
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed time"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every entry whose key matches the predicate
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+class QueryCache:
+    """Two-level cache in front of query embedding and index search"""
+
+    def __init__(self):
+        self.embeddings = TTLCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL)
+        self.results = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+    def embed_query(self, query: str, embed_fn: Callable[[str], np.ndarray], provider: str = "") -> np.ndarray:
+        """Return the query's embedding, calling embed_fn only on a miss
+
+        Args:
+            query: Query text
+            embed_fn: Callable embedding one text
+            provider: Name of the embedding provider embed_fn uses
+        """
+        key = (provider, normalize_query(query))
+        vector = self.embeddings.get(key)
+        if vector is None:
+            vector = embed_fn(query)
+            self.embeddings.put(key, vector)
+        return vector
+
+    def search(self,
+               index_name: str,
+               index_version: int,
+               query: str,
+               top_k: int,
+               mode: str,
+               search_fn: Callable[[], List[Any]]) -> List[Any]:
+        """Return cached chunk ids for a query, calling search_fn only on a miss
+
+        Args:
+            index_name: Name of the index being searched
+            index_version: Current version of that index; bump it on every change
+            query: Query text
+            top_k: Number of results requested
+            mode: Retrieval mode
+            search_fn: Callable returning the chunk ids for this query
+        """
+        key = (index_name, index_version, normalize_query(query), top_k, mode)
+        ids = self.results.get(key)
+        if ids is None:
+            ids = search_fn()
+            self.results.put(key, list(ids))
+        return list(ids)
+
+    def invalidate(self, index_version: int) -> None:
+        """Drop cached results of index versions older than the one just published
+
+        Results are keyed by version, so old entries are never served; this
+        frees their room in the LRU for live ones.
+        """
+        removed = self.results.discard_where(lambda key: key[1] < index_version)
+        if removed:
+            logger.debug(f"Dropped {removed} cached results older than index version {index_version}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats()
+        }
+
+def get_query_cache() -> QueryCache:
+    """Get the process-wide query cache, creating it on first use"""
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryCache()
+    return _query_cache
@@ -3,23 +3,19 @@
 
 """
 RAG (Retrieval Augmented Generation) Module for MedBot AI
-- Loads and processes course materials
-- Creates and manages vector database
+- Serves the chatbot from the shared document corpus
+- Indexes uploaded documents into the corpus
 - Provides retrieval functionality for the chatbot
+- Descends summary trees where a collection has them, and answers broad
+  questions from summaries instead of chunks
 """
 
 import os
 import logging
-from pathlib import Path
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from typing import Optional, Callable
 
-# LangChain imports
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.document_loaders import TextLoader, PyPDFLoader, DirectoryLoader
-from langchain.docstore.document import Document
+from context_packing import CONTEXT_BUDGETS, pack_context
+from corpus import Corpus, CorpusView, get_corpus
 
 # Initialize logger
 logging.basicConfig(level=logging.INFO)
@@ -28,166 +24,135 @@ logger = logging.getLogger(__name__)
 # Global RAG pipeline instance
 _rag_pipeline = None
 
+# Collections the chatbot retrieves from
+RAG_COLLECTIONS = ["coursematerial", "uploads"]
+
 class RAGPipeline:
     """RAG Pipeline for MedBot AI"""
     
-    def __init__(self, course_material_dir: str = None):
+    def __init__(self, corpus: Optional[Corpus] = None):
         """Initialize the RAG Pipeline
         
-        Args:
-            course_material_dir: Directory containing course materials
-        """
-        self.course_material_dir = course_material_dir or os.path.join(os.path.dirname(__file__), "coursematerial")
-        self.client = OpenAI()
-        self.embeddings = OpenAIEmbeddings()
-        self.vector_store = None
-        self.documents = []
-        
-        # Create course material directory if it doesn't exist
-        os.makedirs(self.course_material_dir, exist_ok=True)
-        
-        # Initialize the pipeline
-        self.load_documents()
-        self.create_vector_store()
-    
-    def load_documents(self) -> None:
-        """Load documents from the course material directory"""
-        try:
-            # Configure loaders for different file types
-            loaders = {
-                ".txt": (TextLoader, {}),
-                ".pdf": (PyPDFLoader, {})
-            }
-            
-            # Load all documents from the directory
-            for file_path in Path(self.course_material_dir).rglob("*"):
-                if file_path.suffix.lower() in loaders:
-                    logger.info(f"Loading {file_path}")
-                    loader_class, loader_args = loaders[file_path.suffix.lower()]
-                    loader = loader_class(str(file_path), **loader_args)
-                    self.documents.extend(loader.load())
-            
-            logger.info(f"Loaded {len(self.documents)} documents")
-            
-        except Exception as e:
-            logger.error(f"Error loading documents: {str(e)}")
-            raise
-    
-    def process_file(self, file_path: str) -> List[Document]:
-        """Process a single file and return its documents
+        Course materials and uploads live in the shared corpus, which is
+        persisted and only re-embeds files that changed since the last run.
         
         Args:
-            file_path: Path to the file to process
-            
-        Returns:
-            List of processed documents
+            corpus: Shared corpus; defaults to the process-wide instance
         """
-        try:
-            # Get file extension
-            file_ext = Path(file_path).suffix.lower()
-            
-            # Configure loader based on file type
-            if file_ext == ".txt":
-                loader = TextLoader(file_path)
-            elif file_ext == ".pdf":
-                loader = PyPDFLoader(file_path)
-            else:
-                raise ValueError(f"Unsupported file type: {file_ext}")
-            
-            # Load and process the document
-            documents = loader.load()
-            
-            # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
-            
-            return text_splitter.split_documents(documents)
-            
-        except Exception as e:
-            logger.error(f"Error processing file {file_path}: {str(e)}")
-            raise
-    
-    def create_vector_store(self) -> None:
-        """Create the vector store from loaded documents"""
-        try:
-            if not self.documents:
-                logger.warning("No documents to create vector store from")
-                return
-            
-            # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
-            
-            splits = text_splitter.split_documents(self.documents)
-            
-            # Create vector store
-            self.vector_store = FAISS.from_documents(splits, self.embeddings)
-            logger.info("Vector store created successfully")
-            
-        except Exception as e:
-            logger.error(f"Error creating vector store: {str(e)}")
-            raise
+        self.corpus = corpus or get_corpus()
+        for collection in RAG_COLLECTIONS:
+            self.corpus.ensure_synced(collection)
+        self.view = CorpusView(self.corpus, RAG_COLLECTIONS, name="rag")
     
-    def add_document(self, file_path: str) -> None:
+    def add_document(self,
+                     file_path: str,
+                     progress: Optional[Callable[..., None]] = None,
+                     replaces: Optional[str] = None) -> None:
         """Add a new document to the vector store
         
+        Safe to call from several threads at once.
+        
         Args:
             file_path: Path to the file to add
+            progress: Optional callback, called with pages=, chunks= and
+                embedded= counts as ingestion proceeds
+            replaces: Path of an earlier upload this file supersedes; its
+                chunks are removed when the new ones are indexed
         """
         try:
-            # Process the file
-            new_documents = self.process_file(file_path)
-            
-            if not new_documents:
-                logger.warning(f"No content extracted from {file_path}")
-                return
-            
-            # Add to vector store
-            if self.vector_store is None:
-                self.vector_store = FAISS.from_documents(new_documents, self.embeddings)
-            else:
-                self.vector_store.add_documents(new_documents)
-            
-            # Add to documents list
-            self.documents.extend(new_documents)
-            logger.info(f"Added {len(new_documents)} chunks from {file_path}")
-            
+            num_chunks = self.corpus.add_file("uploads", os.path.abspath(file_path), progress=progress,
+                                              replaces=os.path.abspath(replaces) if replaces else None)
+            if num_chunks:
+                logger.info(f"Added {num_chunks} chunks from {file_path}")
+            self.corpus.save()
+        
         except Exception as e:
             logger.error(f"Error adding document {file_path}: {str(e)}")
             raise
     
-    def get_relevant_context(self, query: str, top_k: int = 5) -> str:
+    def remove_document(self, file_path: str) -> bool:
+        """Remove an uploaded document from the vector store
+        
+        Returns:
+            bool: True if the document was indexed
+        """
+        removed = self.corpus.remove_file("uploads", os.path.abspath(file_path))
+        if removed:
+            logger.info(f"Removed {file_path}")
+            self.corpus.save()
+        return removed
+    
+    def get_relevant_context(self,
+                             query: str,
+                             top_k: int = 5,
+                             mode: Optional[str] = None,
+                             max_tokens: int = CONTEXT_BUDGETS["chat"]) -> str:
         """Get relevant context for a query
         
         Args:
             query: The query to find context for
-            top_k: Number of most relevant chunks to return
-            
+            top_k: Number of most relevant chunks to retrieve
+            mode: "dense", "lexical" or "hybrid" retrieval; lexical mode
+                does not embed the query
+            max_tokens: Token budget for the returned context
+        
         Returns:
-            String containing the relevant context
+            String containing the relevant context, with overlapping chunks
+            merged and near-duplicates removed
         """
         try:
-            if not self.vector_store:
+            if not len(self.view):
                 logger.warning("No vector store available")
                 return ""
             
-            # Get relevant documents
-            relevant_docs = self.vector_store.similarity_search(query, k=top_k)
+            # Read one snapshot throughout, so re-indexing cannot move chunks mid-request
+            snapshot = self.view.snapshot()
             
-            # Combine the content from relevant documents
-            context = "\n\n".join(doc.page_content for doc in relevant_docs)
+            # Get relevant documents; repeated queries are served from the query cache
+            positions = self.view.search_tree(query, top_k, mode=mode, snapshot=snapshot)
+            relevant_chunks = [self.view.chunk(position, snapshot) for position in positions]
             
-            return context
+            # Combine the content from relevant documents within the token budget
+            context = pack_context(relevant_chunks, snapshot.document_text, max_tokens)
             
+            return context
+        
         except Exception as e:
             logger.error(f"Error getting relevant context: {str(e)}")
             return ""
+    
+    def get_overview_context(self,
+                             query: str,
+                             max_tokens: int = CONTEXT_BUDGETS["chat"]) -> str:
+        """Get context for a broad question from document and section summaries
+        
+        Falls back to get_relevant_context when no matching document has
+        been summarised.
+        
+        Args:
+            query: The query to find context for
+            max_tokens: Token budget for the returned context
+        
+        Returns:
+            String containing the best-matching summaries
+        """
+        try:
+            snapshot = self.view.snapshot()
+            records = self.view.summaries(query, snapshot=snapshot)
+            if not records:
+                return self.get_relevant_context(query, max_tokens=max_tokens)
+            
+            # Each summary is packed as a document of its own
+            texts = {}
+            for record in records:
+                key = f"{record['doc_id']}#{record['section']}"
+                texts[key] = record["text"]
+            spans = [{"doc_id": key, "start": 0, "end": len(text)} for key, text in texts.items()]
+            return pack_context(spans, texts.get, max_tokens)
+        
+        except Exception as e:
+            logger.error(f"Error getting overview context: {str(e)}")
+            return ""
 
 def initialize_rag() -> bool:
     """Initialize the RAG pipeline
@@ -209,4 +174,4 @@ def get_rag_pipeline() -> Optional[RAGPipeline]:
     Returns:
         Optional[RAGPipeline]: The RAG pipeline instance or None if not initialized
     """
-    return _rag_pipeline 
\ No newline at end of file
+    return _rag_pipeline
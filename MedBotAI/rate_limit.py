@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Client-side Rate Limiting for MedBot AI
+- Token buckets for requests per minute and tokens per minute, shared by
+  every thread calling the same model
+- Callers block until both buckets can pay for a request, so bulk work
+  runs at the provider's sustainable rate instead of bursting into 429s
+- A rate-limit response pauses every caller for its Retry-After delay
+"""
+
+import time
+import threading
+from typing import Dict
+
+# Global limiters by name
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+class TokenBucket:
+    """Refills continuously up to ``capacity``; not thread-safe on its own"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` can be taken"""
+        self._refill(now)
+        # A request larger than the bucket waits for a full bucket, then overdraws it
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one model"""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, num_tokens: int = 0) -> float:
+        """Block until one request of ``num_tokens`` tokens may be sent
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = max(self.paused_until - now,
+                            self.requests.wait_time(1, now),
+                            self.tokens.wait_time(num_tokens, now))
+                if delay <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(num_tokens)
+                    return waited
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for ``seconds``, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level, 1),
+                "paused_for": round(max(0.0, self.paused_until - now), 3)
+            }
+
+def get_rate_limiter(name: str, requests_per_minute: float, tokens_per_minute: float) -> RateLimiter:
+    """Return the process-wide limiter for ``name``, creating it on first use"""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiters[name]
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Hybrid Retrieval for MedBot AI
+- BM25 lexical index built alongside each FAISS index
+- Reciprocal rank fusion of dense and lexical rankings
+- Lexical-only mode that skips the query-embedding round-trip
+"""
+
+import os
+import re
+import copy
+import math
+import logging
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+RETRIEVAL_MODE = os.getenv("MEDBOT_RETRIEVAL_MODE", "hybrid")
+DENSE_WEIGHT = float(os.getenv("MEDBOT_DENSE_WEIGHT", 1.0))
+LEXICAL_WEIGHT = float(os.getenv("MEDBOT_LEXICAL_WEIGHT", 1.0))
+# Standard RRF damping constant; larger values flatten the rank curve
+RRF_K = 60
+# Each ranking contributes this many times top_k candidates to the fusion
+CANDIDATE_MULTIPLIER = 4
+# Floor for terms in over half the chunks, as a fraction of the average idf
+BM25_EPSILON = 0.25
+
+# Keeps terms such as "KINE-1P90", "5-HT" or "2.5" in one token
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into lexical terms"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+class LexicalIndex:
+    """BM25 index over a list of chunk texts, addressed by position"""
+
+    def __init__(self, texts: Sequence[str]):
+        """Build the index
+
+        Args:
+            texts: Chunk texts; positions match the companion FAISS index
+        """
+        self.size = len(texts)
+        tokenized = [tokenize(text) for text in texts]
+        # BM25Okapi cannot be built over an empty corpus
+        self.bm25 = BM25Okapi(tokenized, epsilon=BM25_EPSILON) if self.size else None
+        # Chunks containing each term and total terms, for shared_statistics
+        self.document_frequency = Counter(term for terms in tokenized for term in set(terms))
+        self.num_terms = sum(len(terms) for terms in tokenized)
+
+    def search(self, query: str, top_k: int,
+               positions: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Return up to top_k (position, score) pairs with a positive score
+
+        Args:
+            query: Query text
+            top_k: Maximum number of results
+            positions: Optional subset of positions to rank; others are ignored
+        """
+        terms = tokenize(query)
+        if self.bm25 is None or not terms:
+            return []
+        scores = self.bm25.get_scores(terms)
+        if positions is None:
+            positions = np.arange(self.size)
+        subset_scores = scores[positions]
+        ranked = np.argsort(-subset_scores, kind="stable")[:top_k]
+        return [(int(positions[i]), float(subset_scores[i])) for i in ranked if subset_scores[i] > 0]
+
+    def with_statistics(self, idf: Dict[str, float], average_length: float) -> "LexicalIndex":
+        """Return a copy scoring with term weights from a larger corpus this index is part of
+
+        The copy shares the tokenized chunks; this index is left unchanged.
+        """
+        index = copy.copy(self)
+        if self.bm25 is not None:
+            index.bm25 = copy.copy(self.bm25)
+            index.bm25.idf = {term: idf[term] for term in self.document_frequency}
+            index.bm25.avgdl = average_length
+        return index
+
+def shared_statistics(indexes: Sequence[LexicalIndex]) -> Tuple[Dict[str, float], float]:
+    """Compute BM25Okapi term weights over several indexes taken as one corpus
+
+    Indexes scored separately weigh a term by how rare it is in each one,
+    so a term in every chunk of a one-document index is worth nothing
+    there. Sharing the statistics ranks every index on the same scale.
+
+    Returns:
+        (idf per term, average chunk length in terms)
+    """
+    document_frequency = Counter()
+    num_chunks = num_terms = 0
+    for index in indexes:
+        document_frequency.update(index.document_frequency)
+        num_chunks += index.size
+        num_terms += index.num_terms
+    if not num_chunks:
+        return {}, 0.0
+
+    # Same weighting as BM25Okapi, including its floor for very common terms
+    idf = {term: math.log(num_chunks - freq + 0.5) - math.log(freq + 0.5)
+           for term, freq in document_frequency.items()}
+    floor = BM25_EPSILON * sum(idf.values()) / len(idf)
+    idf = {term: value if value >= 0 else floor for term, value in idf.items()}
+    return idf, num_terms / num_chunks
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]],
+                           weights: Optional[Sequence[float]] = None,
+                           k: int = RRF_K) -> List[int]:
+    """Fuse several rankings of positions into one
+
+    Each position scores sum(weight / (k + rank)) over the rankings it
+    appears in, with ranks starting at 1.
+
+    Returns:
+        Positions ordered by fused score
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, position in enumerate(ranking, start=1):
+            scores[position] = scores.get(position, 0.0) + weight / (k + rank)
+    return sorted(scores, key=lambda position: scores[position], reverse=True)
+
+def hybrid_rank(query: str,
+                top_k: int,
+                dense_search: Callable[[str, int], List[int]],
+                lexical_index: Optional[LexicalIndex],
+                mode: Optional[str] = None,
+                dense_weight: float = None,
+                lexical_weight: float = None,
+                positions: Optional[np.ndarray] = None) -> List[int]:
+    """Rank chunk positions for a query with dense, lexical or hybrid retrieval
+
+    Args:
+        query: Query text
+        top_k: Number of positions to return
+        dense_search: Callable(query, k) returning positions from the vector index;
+            only called in dense and hybrid mode
+        lexical_index: BM25 index over the same positions
+        mode: "dense", "lexical" or "hybrid"; defaults to MEDBOT_RETRIEVAL_MODE
+        dense_weight: Weight of the dense ranking in hybrid mode
+        lexical_weight: Weight of the lexical ranking in hybrid mode
+        positions: Optional subset of positions the lexical search is limited to;
+            dense_search is expected to apply the same restriction
+
+    Returns:
+        Up to top_k positions, best first
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    if mode != "dense" and lexical_index is None:
+        mode = "dense"
+
+    if mode == "lexical":
+        return [position for position, _ in lexical_index.search(query, top_k, positions)]
+    if mode == "dense":
+        return dense_search(query, top_k)
+
+    num_candidates = top_k * CANDIDATE_MULTIPLIER
+    dense_ranking = dense_search(query, num_candidates)
+    lexical_ranking = [position for position, _ in lexical_index.search(query, num_candidates, positions)]
+    weights = [
+        DENSE_WEIGHT if dense_weight is None else dense_weight,
+        LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+    ]
+    return reciprocal_rank_fusion([dense_ranking, lexical_ranking], weights)[:top_k]
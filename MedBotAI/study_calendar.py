@@ -4,7 +4,6 @@ import json
 import pandas as pd
 import nltk
 import torch
-import fitz  # PyMuPDF
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, render_template, session, redirect, url_for
 from flask_cors import CORS
@@ -17,6 +16,8 @@ from googleapiclient.discovery import build
 import pickle
 from flask import Blueprint
 
+from extraction import extract_pdf_bytes
+
 # Import OpenAI using the newer style
 from openai import OpenAI
 
@@ -58,14 +59,8 @@ study_calendar_routes = Blueprint('study_calendar', __name__)
 # --- Step 1: Extract the full text from the PDF ---
 def extract_pdf_text(pdf_file):
     try:
-        doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        raw_text = []
-        for page in doc:
-            try:
-                text = page.get_text("text")
-                raw_text.append(text)
-            except Exception as e:
-                logger.error(f"Failed to extract text from a page: {e}")
+        # Read through the page cache, so re-uploading a syllabus skips parsing
+        raw_text = extract_pdf_bytes(pdf_file.read())
         return " ".join(raw_text)
     except Exception as e:
         logger.error(f"Failed to open PDF: {e}")
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Hierarchical Summary Index for MedBot AI
+- Optional per collection: at ingestion, a long document's chunks are
+  grouped into sections of consecutive chunks, each section is summarised,
+  and the section summaries are summarised into a document summary
+- Summaries are cached in SQLite by content hash, prompt version and
+  model, so re-ingesting unchanged text never calls the model again
+- Retrieval descends document -> section -> chunk (see
+  CorpusView.search_tree): chunk search runs only over the sections whose
+  summaries best match the query
+- Broad questions can be answered from the section summaries themselves
+  (see CorpusView.summaries), which are far shorter than the chunks
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from embedding_cache import text_key
+from embeddings import RETRYABLE_STATUS
+from rate_limit import get_rate_limiter
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+CHAT_URL = "https://api.openai.com/v1/chat/completions"
+SUMMARY_MODEL = os.getenv("MEDBOT_SUMMARY_MODEL", "gpt-3.5-turbo")
+# Bump when the prompts change so cached summaries are regenerated
+SUMMARIZER_VERSION = 1
+
+# Consecutive chunks summarised together as one section
+SECTION_CHUNKS = int(os.getenv("MEDBOT_SECTION_CHUNKS", 8))
+# Documents with fewer chunks are searched flat; a tree would not narrow much
+MIN_TREE_CHUNKS = int(os.getenv("MEDBOT_SUMMARY_MIN_CHUNKS", 16))
+SECTION_SUMMARY_TOKENS = 150
+DOCUMENT_SUMMARY_TOKENS = 300
+SUMMARY_WORKERS = int(os.getenv("MEDBOT_SUMMARY_WORKERS", 4))
+SUMMARY_MAX_RETRIES = 3
+REQUEST_TIMEOUT = 120
+REQUESTS_PER_MINUTE = int(os.getenv("MEDBOT_SUMMARY_RPM", 500))
+TOKENS_PER_MINUTE = int(os.getenv("MEDBOT_SUMMARY_TPM", 200000))
+
+# Descent breadth: documents kept at the first level, sections at the second
+TREE_DOCUMENTS = int(os.getenv("MEDBOT_TREE_DOCUMENTS", 3))
+TREE_SECTIONS = int(os.getenv("MEDBOT_TREE_SECTIONS", 4))
+
+CACHE_PATH = os.getenv(
+    "MEDBOT_SUMMARY_CACHE",
+    os.path.join(os.path.dirname(__file__), "cache", "summaries.sqlite3")
+)
+
+PROMPTS = {
+    "section": ("Summarise this excerpt of medical course material in at most {words} words. "
+                "Keep the key terms, definitions and relationships a student would search for."),
+    "document": ("These are summaries of consecutive sections of one document of medical course "
+                 "material. Summarise the whole document in at most {words} words, naming its main topics.")
+}
+
+# Global cache instance
+_summary_cache = None
+
+class SummaryCache:
+    """SQLite-backed summaries keyed by model, prompt version, kind and text hash"""
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(kind: str, text: str) -> str:
+        return f"{SUMMARY_MODEL}:{SUMMARIZER_VERSION}:{kind}:{text_key(text)}"
+
+    def get(self, kind: str, text: str) -> Optional[str]:
+        row = self._connection().execute("SELECT summary FROM summaries WHERE key = ?",
+                                         (self.key(kind, text),)).fetchone()
+        return row[0] if row else None
+
+    def put(self, kind: str, text: str, summary: str) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO summaries (key, summary, created) VALUES (?, ?, ?)",
+                         (self.key(kind, text), summary, time.time()))
+
+def get_summary_cache() -> SummaryCache:
+    """Get the process-wide summary cache, opening it on first use"""
+    global _summary_cache
+    if _summary_cache is None:
+        _summary_cache = SummaryCache()
+    return _summary_cache
+
+def _request_summary(text: str, kind: str, max_tokens: int) -> Optional[str]:
+    """Ask the chat model for one summary, retrying rate limits and server errors
+
+    Returns:
+        The summary, or None if the request failed
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}"
+    }
+    payload = {
+        "model": SUMMARY_MODEL,
+        "messages": [
+            {"role": "system", "content": PROMPTS[kind].format(words=int(max_tokens * 0.75))},
+            {"role": "user", "content": text}
+        ],
+        "temperature": 0,
+        "max_tokens": max_tokens
+    }
+    limiter = get_rate_limiter(SUMMARY_MODEL, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+    for attempt in range(SUMMARY_MAX_RETRIES + 1):
+        # Roughly four characters per token, plus the completion
+        limiter.acquire(len(text) // 4 + max_tokens)
+        try:
+            resp = requests.post(CHAT_URL, headers=headers, json=payload, timeout=REQUEST_TIMEOUT)
+            if resp.status_code == 200:
+                return resp.json()["choices"][0]["message"]["content"].strip()
+            error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+            if resp.status_code not in RETRYABLE_STATUS:
+                break
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+        if attempt < SUMMARY_MAX_RETRIES:
+            time.sleep(2 ** attempt)
+
+    logger.error(f"Failed to summarise a {kind} of {len(text)} characters: {error}")
+    return None
+
+def summarize(text: str, kind: str, max_tokens: int) -> Optional[str]:
+    """Return a cached or freshly generated summary of a section or document"""
+    cache = get_summary_cache()
+    summary = cache.get(kind, text)
+    if summary is None:
+        summary = _request_summary(text, kind, max_tokens)
+        if summary:
+            cache.put(kind, text, summary)
+    return summary
+
+def build_tree(text: str, spans: List[Tuple[int, int]]) -> Tuple[Optional[str], List[List]]:
+    """Summarise a document's sections and the document as a whole
+
+    Args:
+        text: Document text
+        spans: (start, end) offsets of its chunks, in order
+
+    Returns:
+        (document summary, sections as [first chunk index, end chunk index,
+        summary]), or (None, []) for short documents and when any summary
+        could not be generated; such documents are searched flat
+    """
+    if len(spans) < MIN_TREE_CHUNKS:
+        return None, []
+    bounds = [(first, min(first + SECTION_CHUNKS, len(spans))) for first in range(0, len(spans), SECTION_CHUNKS)]
+    section_texts = [text[spans[first][0]:spans[end - 1][1]] for first, end in bounds]
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        section_summaries = list(executor.map(
+            lambda section: summarize(section, "section", SECTION_SUMMARY_TOKENS), section_texts))
+    if not all(section_summaries):
+        return None, []
+
+    summary = summarize("\n\n".join(section_summaries), "document", DOCUMENT_SUMMARY_TOKENS)
+    if not summary:
+        return None, []
+    return summary, [[first, end, section_summary]
+                     for (first, end), section_summary in zip(bounds, section_summaries)]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks for embedding spaces and online migration in the shared corpus
+- Runs offline: vectors come from a deterministic in-process provider
+  registered under the "test" backend, so no tokenizer or API is needed
+- Covers chunks that all go pending and are drained later, the space
+  they record, and a provider change migrated and switched online
+
+Run with pytest, or directly: python test_embedding_spaces.py
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+# Keep the embedding cache out of the working tree
+_tmp = tempfile.mkdtemp(prefix="medbot-test-")
+os.environ.setdefault("MEDBOT_EMBEDDING_CACHE", os.path.join(_tmp, "embeddings.sqlite3"))
+
+import numpy as np
+
+from embeddings import PROVIDERS, EmbeddingProvider, get_provider
+from chunk_store import Document
+from corpus import COLLECTIONS, STORE_FILE, Corpus, CorpusView, _chunking_params
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLLECTION = "coursematerial"
+SOURCE_PROVIDER = "test:words@16"
+TARGET_PROVIDER = "test:words@32"
+SECTIONS = ["mitral valve stenosis murmur", "nephron glomerulus filtration",
+            "alveoli surfactant compliance", "osteoblast bone remodelling"]
+
+class WordHashProvider(EmbeddingProvider):
+    """Bag-of-words vectors hashed into "test:<name>@<dimension>" dimensions"""
+
+    backend = "test"
+
+    def __init__(self, model: str):
+        super().__init__(model)
+        self.failing = False
+
+    @property
+    def dimension(self) -> int:
+        return int(self.model.partition("@")[2])
+
+    def embed_batches(self, texts):
+        if self.failing:
+            yield list(range(len(texts))), None
+            return
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimension] += 1.0
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        yield list(range(len(texts))), vectors
+
+PROVIDERS["test"] = WordHashProvider
+
+def _pending_document(corpus_dir: str) -> Document:
+    """A document whose every chunk failed to embed, as after a burst of 429s"""
+    text = "\n\n".join(" ".join([section] * 5) for section in SECTIONS)
+    pending = []
+    start = 0
+    for index, section in enumerate(text.split("\n\n")):
+        pending.append([start, start + len(section), index])
+        start += len(section) + 2
+    params = _chunking_params(COLLECTION)
+    return Document(doc_id="manual", collection=COLLECTION, source=os.path.join(corpus_dir, "manual.txt"),
+                    sha256="0" * 64, params=params, metadata={"university": "Uni", "course": "Cardio"},
+                    text=text, pending=pending)
+
+def _build_drained_corpus(corpus_dir: str) -> Corpus:
+    """Index a document with every chunk pending, then drain it with embed_pending"""
+    corpus = Corpus(corpus_dir)
+    provider = get_provider(SOURCE_PROVIDER)
+    provider.failing = True
+    try:
+        document = _pending_document(corpus_dir)
+        with corpus._write_lock:
+            corpus._commit_file((document, [], np.zeros((0, provider.dimension), dtype="float32"), []))
+            corpus._on_changed()
+    finally:
+        provider.failing = False
+    assert corpus.pending_count() == len(SECTIONS)
+    assert corpus.snapshot.spaces == {}
+
+    published = corpus.snapshot
+    assert corpus.embed_pending() == len(SECTIONS)
+    assert corpus.pending_count() == 0
+    # Snapshots already published are never modified
+    assert len(published.store.documents["manual"].pending) == len(SECTIONS)
+    return corpus
+
+def _top_text(corpus: Corpus, query: str) -> str:
+    view = CorpusView(corpus, [COLLECTION], name="test")
+    positions = view.search(query, 1, mode="dense")
+    assert positions, query
+    return view.chunk(positions[0])["text"]
+
+def test_drained_pending_chunks_record_space():
+    original = COLLECTIONS[COLLECTION]["embedding"]
+    COLLECTIONS[COLLECTION]["embedding"] = SOURCE_PROVIDER
+    try:
+        corpus_dir = tempfile.mkdtemp(dir=_tmp)
+        corpus = _build_drained_corpus(corpus_dir)
+        expected = {"provider": SOURCE_PROVIDER, "dimension": 16, "version": 1}
+        assert corpus.snapshot.spaces == {COLLECTION: expected}
+
+        corpus.save()
+        reloaded = Corpus(corpus_dir)
+        reloaded.load()
+        assert reloaded.snapshot.spaces == {COLLECTION: expected}
+
+        # A store saved without the space gets it back from the index
+        store_path = os.path.join(corpus_dir, STORE_FILE)
+        with open(store_path) as f:
+            documents = json.load(f)
+        documents["spaces"] = {}
+        with open(store_path, "w") as f:
+            json.dump(documents, f)
+        reloaded = Corpus(corpus_dir)
+        reloaded.load()
+        assert reloaded.snapshot.spaces == {COLLECTION: expected}
+    finally:
+        COLLECTIONS[COLLECTION]["embedding"] = original
+
+def test_provider_change_migrates_and_switches():
+    original = COLLECTIONS[COLLECTION]["embedding"]
+    COLLECTIONS[COLLECTION]["embedding"] = SOURCE_PROVIDER
+    try:
+        corpus = _build_drained_corpus(tempfile.mkdtemp(dir=_tmp))
+        assert "nephron" in _top_text(corpus, "glomerulus filtration")
+
+        COLLECTIONS[COLLECTION]["embedding"] = TARGET_PROVIDER
+        migration = corpus.start_migration(COLLECTION)
+        assert migration is not None
+        migration._thread.join(timeout=60)
+        assert migration.state == "switched", migration.status()
+
+        space = corpus.snapshot.spaces[COLLECTION]
+        assert space == {"provider": TARGET_PROVIDER, "dimension": 32, "version": 2}
+        assert corpus.snapshot.embedding(COLLECTION) == TARGET_PROVIDER
+        assert all(doc.params["embedding"] == TARGET_PROVIDER for doc in corpus.store.documents.values())
+        # Queries are embedded in the new space and searched against the new index
+        assert "alveoli" in _top_text(corpus, "surfactant compliance")
+        assert corpus.start_migration(COLLECTION) is None
+    finally:
+        COLLECTIONS[COLLECTION]["embedding"] = original
+
+if __name__ == "__main__":
+    test_drained_pending_chunks_record_space()
+    test_provider_change_migrates_and_switches()
+    logger.info("Embedding space checks passed")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks for loading saved FAISS indexes
+- A saved index loaded with memory mapping must be backed by its file, so
+  worker processes share one page-cache copy instead of each reading it
+  into their heap
+
+Run with pytest, or directly: python test_vector_index.py
+"""
+
+import os
+import logging
+import tempfile
+
+import numpy as np
+import faiss
+
+from vector_index import create_index, load_index
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAPS_PATH = "/proc/self/maps"
+
+def _saved_index(kind: str, directory: str, encoding: str = "float32") -> str:
+    vectors = np.random.default_rng(0).random((2000, 32), dtype="float32")
+    path = os.path.join(directory, f"{kind}-{encoding}.faiss")
+    faiss.write_index(create_index(vectors, kind=kind, encoding=encoding), path)
+    return path
+
+def _is_mapped(path: str) -> bool:
+    with open(MAPS_PATH) as f:
+        return any(line.rstrip().endswith(path) for line in f)
+
+def test_flat_index_is_memory_mapped():
+    if not os.path.exists(MAPS_PATH):
+        logger.info(f"{MAPS_PATH} not available; skipping")
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        # The default index, a graph index, and compressed codes with a
+        # full-precision rescoring store
+        for kind, encoding in [("flat", "float32"), ("hnsw", "float32"), ("flat", "int8")]:
+            path = _saved_index(kind, directory, encoding)
+            index = load_index(path, mmap=True)
+            assert _is_mapped(path), f"{path} was read into memory instead of mapped"
+            assert index.search(np.zeros((1, 32), dtype="float32"), 3)[1].shape == (1, 3)
+            del index
+
+def test_index_read_without_mmap_is_not_mapped():
+    if not os.path.exists(MAPS_PATH):
+        logger.info(f"{MAPS_PATH} not available; skipping")
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        path = _saved_index("flat", directory)
+        index = load_index(path, mmap=False)
+        assert not _is_mapped(path)
+        del index
+
+if __name__ == "__main__":
+    test_flat_index_is_memory_mapped()
+    test_index_read_without_mmap_is_not_mapped()
+    logger.info("Vector index checks passed")
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+FAISS Index Factory for MedBot AI
+- Flat (exact), HNSW and IVF (trained on the corpus) index types
+- Search parameters (efSearch, nprobe) applied per index
+- Index type selected per corpus with MEDBOT_INDEX_TYPE or per call
+- Search restricted to a subset of positions (used for filtered views)
+- Optional compressed encodings (float16, int8, product quantization, PCA)
+  with exact rescoring of a shortlist against the full-precision vectors
+- Indexes loaded through memory mapping (flat, HNSW, scalar and product
+  quantized codes and IVF lists), so worker processes share one page-cache
+  copy
+"""
+
+import os
+import math
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import faiss
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+INDEX_TYPE = os.getenv("MEDBOT_INDEX_TYPE", "flat")
+
+# HNSW graph parameters
+HNSW_M = int(os.getenv("MEDBOT_HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("MEDBOT_HNSW_EF_CONSTRUCTION", 200))
+HNSW_EF_SEARCH = int(os.getenv("MEDBOT_HNSW_EF_SEARCH", 64))
+
+# IVF parameters; nlist defaults to about 4 * sqrt(corpus size)
+IVF_NLIST = int(os.getenv("MEDBOT_IVF_NLIST", 0)) or None
+IVF_NPROBE = int(os.getenv("MEDBOT_IVF_NPROBE", 8))
+# FAISS wants roughly 39 training points per list; smaller corpora use a flat index
+IVF_MIN_POINTS_PER_LIST = 39
+IVF_MIN_TRAINING_POINTS = 1000
+
+# Vector encodings. Compressed encodings keep the full-precision vectors in
+# a separate refine index used only to rescore a shortlist; when the index is
+# memory mapped those vectors stay on disk and only shortlisted rows are read.
+ENCODINGS = ("float32", "float16", "int8", "pq", "pca")
+INDEX_ENCODING = os.getenv("MEDBOT_INDEX_ENCODING", "float32")
+# Shortlist size is k * RESCORE_FACTOR; 0 disables rescoring and drops the
+# full-precision vectors entirely (smallest, but rebuilds lose precision)
+RESCORE_FACTOR = int(os.getenv("MEDBOT_RESCORE_FACTOR", 4))
+# Product quantization sub-vectors; defaults to one per 16 dimensions
+PQ_M = int(os.getenv("MEDBOT_PQ_M", 0)) or None
+# PCA output dimension
+PCA_DIM = int(os.getenv("MEDBOT_PCA_DIM", 256))
+# Below these corpus sizes the codebooks cannot be trained well; full
+# precision is used instead. PQ wants about 39 points per centroid.
+PQ_MIN_TRAINING_POINTS = 39 * 256
+PCA_MIN_TRAINING_POINTS = 1000
+
+# Load saved indexes with mmap instead of reading them into memory
+INDEX_MMAP = os.getenv("MEDBOT_INDEX_MMAP", "1") == "1"
+# IO_FLAG_MMAP maps only IVF inverted lists; IO_FLAG_MMAP_IFC also maps the
+# codes of flat, HNSW and quantized indexes. Older FAISS builds lack it.
+MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+if INDEX_MMAP and MMAP_FLAG == faiss.IO_FLAG_MMAP:
+    logger.warning(f"FAISS {faiss.__version__} cannot memory map flat, HNSW or quantized indexes; "
+                   f"only IVF lists will be shared between processes")
+
+def default_nlist(num_vectors: int) -> int:
+    """Pick an IVF list count for a corpus size"""
+    nlist = int(4 * math.sqrt(num_vectors))
+    return max(1, min(nlist, num_vectors // IVF_MIN_POINTS_PER_LIST))
+
+def default_pq_m(d: int) -> int:
+    """Pick a PQ sub-vector count that divides the dimension, about one per 16 dimensions"""
+    m = max(1, d // 16)
+    while d % m:
+        m -= 1
+    return m
+
+def _storage_key(encoding: str, pq_m: int) -> str:
+    """index_factory code storage for an encoding"""
+    return {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8",
+            "pq": f"PQ{pq_m}x8", "pca": "Flat"}[encoding]
+
+def create_index(vectors: np.ndarray,
+                 kind: Optional[str] = None,
+                 m: int = HNSW_M,
+                 ef_construction: int = HNSW_EF_CONSTRUCTION,
+                 ef_search: int = HNSW_EF_SEARCH,
+                 nlist: Optional[int] = IVF_NLIST,
+                 nprobe: int = IVF_NPROBE,
+                 encoding: Optional[str] = None,
+                 rescore_factor: int = RESCORE_FACTOR,
+                 pq_m: Optional[int] = PQ_M,
+                 pca_dim: int = PCA_DIM) -> faiss.Index:
+    """Build an L2 index of the requested type over a set of vectors
+
+    Args:
+        vectors: float32 array of shape (n, d)
+        kind: "flat", "hnsw" or "ivf"; defaults to MEDBOT_INDEX_TYPE
+        m: HNSW neighbours per node
+        ef_construction: HNSW candidate list size while building
+        ef_search: HNSW candidate list size while searching
+        nlist: Number of IVF lists; defaults to default_nlist(n)
+        nprobe: Number of IVF lists visited per query
+        encoding: "float32", "float16", "int8", "pq" or "pca"; defaults to
+            MEDBOT_INDEX_ENCODING
+        rescore_factor: For compressed encodings, rescore k * rescore_factor
+            candidates against full-precision vectors; 0 disables rescoring
+        pq_m: PQ sub-vectors; defaults to default_pq_m(d)
+        pca_dim: PCA output dimension
+
+    Returns:
+        A populated FAISS index
+    """
+    kind = kind or INDEX_TYPE
+    encoding = encoding or INDEX_ENCODING
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}")
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown index encoding: {encoding}")
+
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    num_vectors, d = vectors.shape
+
+    if kind == "ivf" and num_vectors < IVF_MIN_TRAINING_POINTS:
+        logger.info(f"Only {num_vectors} vectors, using a flat index instead of IVF")
+        kind = "flat"
+    if (encoding == "pq" and num_vectors < PQ_MIN_TRAINING_POINTS) \
+            or (encoding == "pca" and (num_vectors < PCA_MIN_TRAINING_POINTS or pca_dim >= d)):
+        logger.info(f"Only {num_vectors} vectors of dimension {d}, storing them at full precision instead of {encoding}")
+        encoding = "float32"
+
+    storage = _storage_key(encoding, pq_m or default_pq_m(d))
+    prefix = f"PCA{pca_dim}," if encoding == "pca" else ""
+    if kind == "flat" and encoding == "float32":
+        index = faiss.IndexFlatL2(d)
+    elif kind == "flat":
+        index = faiss.index_factory(d, prefix + storage)
+    elif kind == "hnsw":
+        key = f"HNSW{m}" if storage == "Flat" else f"HNSW{m},{storage}"
+        index = faiss.IndexHNSWFlat(d, m) if encoding == "float32" else faiss.index_factory(d, prefix + key)
+        _innermost(index).hnsw.efConstruction = ef_construction
+    else:
+        nlist = nlist or default_nlist(num_vectors)
+        index = faiss.index_factory(d, f"{prefix}IVF{nlist},{storage}")
+        # Lets vectors be reconstructed when the index is rebuilt
+        faiss.extract_index_ivf(index).make_direct_map()
+
+    if encoding != "float32" and rescore_factor > 0:
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = rescore_factor
+
+    if not index.is_trained:
+        index.train(vectors)
+    if num_vectors:
+        index.add(vectors)
+    set_search_params(index, ef_search=ef_search, nprobe=nprobe)
+    logger.info(f"Built {kind}/{encoding} index over {num_vectors} vectors")
+    return index
+
+def _innermost(index: faiss.Index) -> faiss.Index:
+    """Strip rescoring and PCA wrappers to reach the index doing the search"""
+    index = faiss.downcast_index(index)
+    while True:
+        if isinstance(index, faiss.IndexRefine):
+            index = faiss.downcast_index(index.base_index)
+        elif isinstance(index, faiss.IndexPreTransform):
+            index = faiss.downcast_index(index.index)
+        else:
+            return index
+
+def load_index(path: str, mmap: bool = INDEX_MMAP) -> faiss.Index:
+    """Read a saved index, memory mapping it when enabled
+
+    A memory-mapped index is shared through the page cache by every process
+    that loads it, and is read-only. FAISS builds without IO_FLAG_MMAP_IFC
+    map only IVF lists and read other indexes into memory.
+    """
+    if mmap:
+        try:
+            return faiss.read_index(path, MMAP_FLAG)
+        except RuntimeError as e:
+            logger.warning(f"Could not memory map {path}, reading it instead: {str(e)}")
+    return faiss.read_index(path)
+
+def index_memory(index: faiss.Index) -> Dict[str, int]:
+    """Bytes needed by an index for searching, and for rescoring
+
+    Search bytes are the compressed codes and graph or list structures that
+    every query touches. Rescoring bytes are the full-precision vectors,
+    which are only read for shortlisted candidates and stay on disk when the
+    index is memory mapped.
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexRefine):
+        return {"search_bytes": len(faiss.serialize_index(index.base_index)),
+                "rescore_bytes": len(faiss.serialize_index(index.refine_index))}
+    return {"search_bytes": len(faiss.serialize_index(index)), "rescore_bytes": 0}
+
+def set_search_params(index: faiss.Index,
+                      ef_search: Optional[int] = None,
+                      nprobe: Optional[int] = None,
+                      rescore_factor: Optional[int] = None) -> None:
+    """Apply query-time parameters to whichever index type is given"""
+    if rescore_factor is not None and isinstance(faiss.downcast_index(index), faiss.IndexRefine):
+        faiss.downcast_index(index).k_factor = rescore_factor
+    if ef_search is not None and hasattr(_innermost(index), "hnsw"):
+        _innermost(index).hnsw.efSearch = ef_search
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            # Not an IVF index
+            pass
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Return every vector stored in an index, in position order"""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    return index.reconstruct_n(0, index.ntotal)
+
+def _selector_params(index: faiss.Index, selector: faiss.IDSelector, k: int):
+    """Build search parameters of the type the index expects, carrying a selector"""
+    outer = faiss.downcast_index(index)
+    if isinstance(outer, faiss.IndexRefine):
+        inner_k = k * int(outer.k_factor)
+        return faiss.IndexRefineSearchParameters(
+            k_factor=outer.k_factor,
+            base_index_params=_selector_params(outer.base_index, selector, inner_k)
+        )
+
+    inner = _innermost(index)
+    if hasattr(inner, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(inner.hnsw.efSearch, k))
+    try:
+        ivf = faiss.extract_index_ivf(index)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    except RuntimeError:
+        return faiss.SearchParameters(sel=selector)
+
+def search_subset(index: faiss.Index,
+                  queries: np.ndarray,
+                  k: int,
+                  positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Search only among the given positions
+
+    Approximate indexes can return fewer than k hits when the allowed set
+    is small; in that case the allowed vectors are scanned exactly.
+
+    Args:
+        index: Index to search
+        queries: float32 array of shape (nq, d)
+        k: Neighbours per query
+        positions: Allowed positions (int64)
+
+    Returns:
+        (distances, positions) arrays of shape (nq, k), padded with -1
+    """
+    positions = np.asarray(positions, dtype="int64")
+    if len(positions) == index.ntotal:
+        return index.search(queries, k)
+    if len(positions) == 0:
+        return (np.full((len(queries), k), np.inf, dtype="float32"),
+                np.full((len(queries), k), -1, dtype="int64"))
+
+    selector = faiss.IDSelectorBatch(positions)
+    try:
+        distances, found = index.search(queries, k, params=_selector_params(index, selector, k))
+        if isinstance(index, faiss.IndexFlat) or (found != -1).sum(axis=1).min() >= min(k, len(positions)):
+            return distances, found
+    except RuntimeError:
+        # Some encodings (plain PQ) do not support selectors
+        pass
+
+    # Exact scan over the allowed vectors; rescoring indexes reconstruct at full precision
+    vectors = np.vstack([index.reconstruct(int(p)) for p in positions])
+    all_distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    order = np.argsort(all_distances, axis=1)[:, :k]
+    distances = np.full((len(queries), k), np.inf, dtype="float32")
+    found = np.full((len(queries), k), -1, dtype="int64")
+    distances[:, :order.shape[1]] = np.take_along_axis(all_distances, order, axis=1)
+    found[:, :order.shape[1]] = positions[order]
+    return distances, found
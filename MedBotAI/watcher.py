@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Live Re-indexing for MedBot AI
+- Optionally watches the coursematerial/ and exams/ directories while the
+  server runs (MEDBOT_WATCH=1)
+- Uses watchfiles for native filesystem events when it is installed and
+  falls back to polling file sizes and modification times otherwise
+- Bursts of events are debounced, so a file being copied in is indexed once,
+  after it stops changing
+- Only the affected files go through incremental ingestion; queries keep
+  using the published snapshot until the whole batch is indexed
+"""
+
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from corpus import COLLECTIONS, SUPPORTED_EXTENSIONS, Corpus, get_corpus
+
+# Initialize logger
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+# Configuration
+# ------------------------------------------------------------------------------
+WATCH_ENABLED = os.getenv("MEDBOT_WATCH", "0") == "1"
+# Seconds without new changes before a batch is indexed
+WATCH_DEBOUNCE = float(os.getenv("MEDBOT_WATCH_DEBOUNCE", 2.0))
+# Seconds between directory scans when watchfiles is not installed
+WATCH_POLL_INTERVAL = float(os.getenv("MEDBOT_WATCH_POLL_INTERVAL", 5.0))
+# "auto", "watchfiles" or "poll"
+WATCH_BACKEND = os.getenv("MEDBOT_WATCH_BACKEND", "auto")
+
+WATCHED_COLLECTIONS = ["coursematerial", "exams"]
+
+# Global watcher instance
+_watcher = None
+_watcher_lock = threading.Lock()
+
+class CorpusWatcher:
+    """Background thread that re-indexes files of watched collections as they change"""
+
+    def __init__(self,
+                 corpus: Corpus,
+                 collections: Iterable[str] = WATCHED_COLLECTIONS,
+                 debounce: float = WATCH_DEBOUNCE,
+                 poll_interval: float = WATCH_POLL_INTERVAL,
+                 backend: str = WATCH_BACKEND):
+        """
+        Args:
+            corpus: Corpus to keep in step with the directories
+            collections: Collections whose directories are watched
+            debounce: Seconds without new changes before a batch is indexed
+            poll_interval: Seconds between scans when polling
+            backend: "watchfiles", "poll", or "auto" to use watchfiles when
+                it is installed
+        """
+        self.corpus = corpus
+        # collection -> directory, in the form the corpus records sources
+        self.directories = {collection: COLLECTIONS[collection]["directory"] for collection in collections
+                            if COLLECTIONS[collection]["directory"]}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend = backend
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="corpus-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + self.debounce)
+
+    def _run(self) -> None:
+        watchfiles = None
+        if self.backend in ("auto", "watchfiles"):
+            try:
+                import watchfiles
+            except ImportError:
+                if self.backend == "watchfiles":
+                    logger.warning("watchfiles is not installed, polling for changes instead")
+        while not self._stop.is_set():
+            try:
+                if watchfiles is not None:
+                    logger.info(f"Watching {sorted(self.directories.values())} with watchfiles")
+                    self._watch_events(watchfiles)
+                else:
+                    logger.info(f"Polling {sorted(self.directories.values())} every {self.poll_interval}s")
+                    self._poll()
+            except Exception as e:
+                # A watched directory may not exist yet; try again later
+                logger.error(f"Error watching course files: {str(e)}")
+                self._stop.wait(self.poll_interval)
+
+    # --------------------------------------------------------------------------
+    # Backends
+    # --------------------------------------------------------------------------
+    def _watch_events(self, watchfiles) -> None:
+        """Index batches of filesystem events as watchfiles yields them"""
+        directories = [directory for directory in self.directories.values() if os.path.isdir(directory)]
+        if not directories:
+            raise FileNotFoundError("no watched directory exists")
+        # step is the quiet period that ends a batch; debounce caps how long
+        # a steady stream of events can hold one back
+        for changes in watchfiles.watch(*directories,
+                                        step=int(self.debounce * 1000),
+                                        debounce=int(self.debounce * 10000),
+                                        stop_event=self._stop):
+            self.apply(path for _, path in changes)
+
+    def _poll(self) -> None:
+        """Index files whose size or modification time changed, once they settle"""
+        state = self._scan()
+        changed = set()
+        last_change = 0.0
+        while not self._stop.wait(min(self.poll_interval, self.debounce) if changed else self.poll_interval):
+            current = self._scan()
+            new = {path for path in state.keys() | current.keys() if state.get(path) != current.get(path)}
+            state = current
+            if new:
+                changed |= new
+                last_change = time.monotonic()
+            elif changed and time.monotonic() - last_change >= self.debounce:
+                self.apply(changed)
+                changed = set()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """Map every supported file under the watched directories to its (mtime, size)"""
+        files = {}
+        for directory in self.directories.values():
+            if not os.path.isdir(directory):
+                continue
+            for file_path in Path(directory).rglob("*"):
+                if file_path.suffix.lower() not in SUPPORTED_EXTENSIONS:
+                    continue
+                try:
+                    stat = file_path.stat()
+                except OSError:
+                    continue
+                files[str(file_path)] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    # --------------------------------------------------------------------------
+    # Indexing
+    # --------------------------------------------------------------------------
+    def _collection_for(self, path: str) -> Optional[Tuple[str, str]]:
+        """Return the collection a changed path belongs to and its source form"""
+        for collection, directory in self.directories.items():
+            relative = os.path.relpath(os.path.abspath(path), os.path.abspath(directory))
+            if relative != os.curdir and relative.split(os.sep)[0] != os.pardir:
+                return collection, os.path.join(directory, relative)
+        return None
+
+    def apply(self, paths: Iterable[str]) -> None:
+        """Re-index a batch of changed paths, one corpus update per collection"""
+        by_collection = {}
+        for path in paths:
+            found = self._collection_for(path)
+            if found is None:
+                continue
+            # Directories are kept: a moved folder can arrive as a single event
+            collection, source = found
+            by_collection.setdefault(collection, set()).add(source)
+
+        for collection, sources in by_collection.items():
+            start = time.time()
+            try:
+                if self.corpus.apply_changes(collection, sources):
+                    self.corpus.save()
+                    logger.info(f"Re-indexed {len(sources)} changed paths in '{collection}' "
+                                f"in {time.time() - start:.1f}s")
+            except Exception as e:
+                logger.error(f"Error re-indexing '{collection}': {str(e)}")
+
+def start_watcher(corpus: Optional[Corpus] = None) -> CorpusWatcher:
+    """Start the process-wide watcher over coursematerial/ and exams/"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = CorpusWatcher(corpus or get_corpus())
+            _watcher.start()
+    return _watcher
+
+def get_watcher() -> Optional[CorpusWatcher]:
+    """Get the watcher instance, or None if it was not started"""
+    return _watcher